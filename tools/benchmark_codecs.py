@@ -0,0 +1,117 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compares the size and the speed of the frame encodings
+
+Usage: python tools/benchmark_codecs.py [--series N] [--samples N]
+
+Each frame holds ``--samples`` samples of ``--series`` series pulled every
+second (with some jitter), as a sender flushing its outbox would build it.
+"""
+
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import random
+import timeit
+
+from watcher_metering.protocol.frame import pack_compressed_frame
+from watcher_metering.protocol.frame import pack_frame
+from watcher_metering.protocol.frame import pack_record
+from watcher_metering.protocol.frame import pack_series_frame
+from watcher_metering.protocol.frame import pack_static
+from watcher_metering.protocol.frame import unpack_frame
+from watcher_metering.protocol.series import SeriesRegistry
+from watcher_metering.protocol.series import SeriesSessions
+
+START = 1438701345703542000
+SECOND = 10 ** 9
+
+
+def build_samples(series_count, samples_per_series, jitter):
+    statics = [
+        pack_static(
+            "compute.node.metric_%d" % index, "%", "gauge",
+            "node-01.example.com", "node-01.example.com",
+            {"host": "node-01.example.com", "ttl": 60, "state": "ok",
+             "title": "compute.node.metric_%d" % index})
+        for index in range(series_count)
+    ]
+    levels = [random.uniform(0, 100) for _ in range(series_count)]
+
+    samples = []
+    for tick in range(samples_per_series):
+        timestamp = START + tick * SECOND
+        for packed_static, level in zip(statics, levels):
+            samples.append((
+                packed_static,
+                timestamp + random.randint(-jitter, jitter),
+                round(level + random.uniform(-1, 1), 2),
+            ))
+    return samples
+
+
+def benchmark(name, encode, decode, sample_count, repeat):
+    frame = encode()
+    encode_time = min(timeit.repeat(encode, number=1, repeat=repeat))
+    decode_time = min(timeit.repeat(lambda: decode(frame), number=1,
+                                    repeat=repeat))
+    print("%-20s %10d %12.1f %12.2f %12.2f" % (
+        name, len(frame), len(frame) / float(sample_count),
+        encode_time * 1e6 / sample_count, decode_time * 1e6 / sample_count))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--series", type=int, default=50)
+    parser.add_argument("--samples", type=int, default=10,
+                        help="Number of samples per series and per frame")
+    parser.add_argument("--jitter", type=int, default=10 ** 6,
+                        help="Timestamp jitter (in nanoseconds)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(42)
+    samples = build_samples(args.series, args.samples, args.jitter)
+    registry = SeriesRegistry()
+    registrations, series_samples = registry.encode(samples)
+    session_id = registry.session_id
+
+    sessions = SeriesSessions()
+    print("%-20s %10s %12s %12s %12s" % (
+        "encoding", "bytes", "bytes/sample", "enc us/smp", "dec us/smp"))
+    benchmark(
+        "records (v2)",
+        lambda: pack_frame([pack_record(*sample) for sample in samples]),
+        unpack_frame, len(samples), args.repeat)
+    # The first frame of a session registers the series, not the next ones
+    for label, registered in (("new", registrations), ("known", [])):
+        benchmark(
+            "msgpack (v3, %s)" % label,
+            lambda: pack_series_frame(session_id, registered, series_samples),
+            lambda frame: unpack_frame(frame, sessions),
+            len(samples), args.repeat)
+        benchmark(
+            "gorilla (v4, %s)" % label,
+            lambda: pack_compressed_frame(session_id, registered,
+                                          series_samples),
+            lambda frame: unpack_frame(frame, sessions),
+            len(samples), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
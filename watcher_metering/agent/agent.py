@@ -18,10 +18,11 @@
 
 import os
 
-import msgpack
 import nanomsg
 from oslo_log import log
 from watcher_metering.agent.manager import MetricManager
+from watcher_metering.agent.sender import MeasurementSender
+from watcher_metering.protocol.series import SeriesRegistry
 
 LOG = log.getLogger(__name__)
 
@@ -30,7 +31,13 @@ class Agent(MetricManager):
 
     def __init__(self, conf, driver_names, use_nanoconfig_service,
                  publisher_endpoint, nanoconfig_service_endpoint,
-                 nanoconfig_update_endpoint, nanoconfig_profile):
+                 nanoconfig_update_endpoint, nanoconfig_profile,
+                 outbox_size=10000, outbox_overflow_policy="drop_oldest",
+                 frame_max_measurements=500, frame_max_delay=.5,
+                 series_registration=True, series_registration_interval=60,
+                 frame_codec="msgpack", max_pull_workers=4,
+                 max_async_pulls=100, pull_alignment=True,
+                 pull_phase_spread=1.):
         """
         :param conf: Configuration obtained from a configuration file
         :type conf: oslo_config.cfg.ConfigOpts instance
@@ -47,8 +54,41 @@ class Agent(MetricManager):
         :type nanoconfig_update_endpoint: str
         :param nanoconfig_profile: Nanoconfig profile URI
         :type nanoconfig_profile: str
+        :param outbox_size: Max number of measurements waiting to be sent
+        :type outbox_size: int
+        :param outbox_overflow_policy: Which measurements are discarded
+            when the outbox is full ('drop_oldest' or 'drop_newest')
+        :type outbox_overflow_policy: str
+        :param frame_max_measurements: Max number of measurements per frame
+        :type frame_max_measurements: int
+        :param frame_max_delay: Max time (in seconds) a measurement waits in
+            the outbox before being sent
+        :type frame_max_delay: float
+        :param series_registration: Whether the static attributes of each
+            series are registered once instead of being sent every time
+        :type series_registration: bool
+        :param series_registration_interval: Time (in seconds) after which
+            all the series are registered again
+        :type series_registration_interval: float
+        :param frame_codec: How the samples are encoded, either 'msgpack'
+            or 'gorilla' (requires the series registration)
+        :type frame_codec: str
+        :param max_pull_workers: Maximum number of drivers pulled at the
+            same time
+        :type max_pull_workers: int
+        :param max_async_pulls: Maximum number of coroutine drivers pulled
+            at the same time
+        :type max_async_pulls: int
+        :param pull_alignment: Whether the pulls are aligned on the interval
+            boundaries of the wall clock
+        :type pull_alignment: bool
+        :param pull_phase_spread: Fraction of the interval over which the
+            pulls of the different hosts are spread
+        :type pull_phase_spread: float
         """
-        super(Agent, self).__init__(conf, driver_names)
+        super(Agent, self).__init__(conf, driver_names, max_pull_workers,
+                                    max_async_pulls, pull_alignment,
+                                    pull_phase_spread)
         self.socket = nanomsg.Socket(nanomsg.PUSH)
         self.use_nanoconfig_service = use_nanoconfig_service
         self.publisher_endpoint = publisher_endpoint
@@ -56,6 +96,23 @@ class Agent(MetricManager):
         self.nanoconfig_update_endpoint = nanoconfig_update_endpoint
         self.nanoconfig_profile = nanoconfig_profile
 
+        registry = None
+        if series_registration:
+            registry = SeriesRegistry(series_registration_interval)
+        elif frame_codec != "msgpack":
+            LOG.warning("[Agent] The `%s` codec requires the series "
+                        "registration: ignored", frame_codec)
+
+        self.sender = MeasurementSender(
+            send_frame=self.send_frame,
+            outbox_size=outbox_size,
+            overflow_policy=outbox_overflow_policy,
+            frame_max_measurements=frame_max_measurements,
+            frame_max_delay=frame_max_delay,
+            registry=registry,
+            codec=frame_codec,
+        )
+
     @property
     def namespace(self):
         return "watcher_metering.drivers"
@@ -105,23 +162,46 @@ class Agent(MetricManager):
 
     def run(self):
         self.setup_socket()
+        self.sender.start()
         super(Agent, self).run()
 
     def stop(self):
-        self.socket.close()
         super(Agent, self).stop()
-        LOG.debug("[Agent] Stopped")
+        # Drivers are stopped so we can flush what they left in the outbox
+        self.sender.stop()
+        self.socket.close()
+        LOG.debug("[Agent] Stopped (sender stats: %r, pull stats: %r, "
+                  "snapshot cache: %d hit(s) and %d miss(es))",
+                  self.sender.stats.as_dict(), self.get_pull_stats(),
+                  self.snapshot_cache.hits, self.snapshot_cache.misses)
+
+    def on_tick_done(self, tick):
+        # The drivers of this tick are done: no need to wait any longer for
+        # more measurements to fill the frame
+        self.sender.kick()
 
     def update(self, notifier, data):
         LOG.debug("[Agent] Updated by: %s", notifier)
-        LOG.debug("[Agent] Preparing to send message %s", msgpack.loads(data))
+        # Only buffers the measurements: the sender thread sends them over
+        # so the drivers never have to wait for the publisher
+        self.sender.put(data)
+
+    def send_frame(self, frame):
+        """Sends a frame to the publisher without blocking
+
+        :param frame: The encoded frame
+        :type frame: bytes
+        :return: False if the socket is not ready to send (e.g. no
+            publisher is listening yet), True otherwise
+        :rtype: bool
+        """
         try:
-            LOG.debug("[Agent] Sending message...")
-            # The agent will wait for the publisher server to be listening on
-            # the related publisher_endpoint before continuing
-            # In which case, you should start the publisher to make it work!
-            self.socket.send(data)
-            LOG.debug("[Agent] Message sent successfully!")
-        except nanomsg.NanoMsgError as exc:
+            self.socket.send(frame, nanomsg.DONTWAIT)
+        except nanomsg.NanoMsgAPIError as exc:
+            if exc.errno == nanomsg.EAGAIN:
+                return False
             LOG.error("Exception during sending the message to controller %s",
                       exc.args[0])
+            raise
+        LOG.debug("[Agent] Frame of %d bytes sent successfully!", len(frame))
+        return True
@@ -0,0 +1,205 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Folds the measurements of each series into windowed statistics"""
+
+from __future__ import unicode_literals
+
+from array import array
+from threading import Lock
+
+import six
+from watcher_metering.agent.measurement import MeasurementTemplate
+
+MIN = "min"
+MAX = "max"
+MEAN = "mean"
+COUNT = "count"
+LAST = "last"
+FUNCTIONS = (MIN, MAX, MEAN, COUNT, LAST)
+
+
+class WindowAggregator(object):
+    """Emits one summary measurement per series, function and window
+
+    Windows are aligned on the epoch (e.g. on the minute for 60 seconds
+    windows) and a window is emitted as soon as a measurement of a later
+    window comes in. The summary measurements are named after the series
+    and the function (e.g. ``compute.node.cpu.percent.mean``) and are
+    timestamped with the end of their window.
+
+    The state of each series lives in a slot of flat arrays rather than in
+    objects of its own, so that thousands of series cost little memory.
+    The slot of a series which got no measurement during a window is freed
+    once this window is emitted and reused by the next new series, so that
+    the churn of the series (e.g. short-lived processes) does not grow the
+    arrays. Measurements which cannot be aggregated (non-numerical values or
+    legacy timestamps) are passed through.
+    """
+
+    def __init__(self, window, functions=(MEAN,)):
+        """
+        :param window: Duration (in seconds) of the windows
+        :type window: float
+        :param functions: The statistics to emit for each window
+        :type functions: list of str
+        """
+        unknown = set(functions) - set(FUNCTIONS)
+        if unknown:
+            raise ValueError("Unknown aggregation function(s): %s" %
+                             ", ".join(sorted(unknown)))
+        if window <= 0:
+            raise ValueError("Invalid aggregation window `%s`" % window)
+
+        self.window_ns = int(window * 10 ** 9)
+        self.functions = list(functions)
+
+        self._window_start = None
+        self._slots = {}  # packed_static -> slot
+        self._templates = []  # slot -> templates (one per function)
+        self._free_slots = []  # Freed slots, reused first
+        self._counts = array(str("l"))
+        self._mins = array(str("d"))
+        self._maxs = array(str("d"))
+        self._sums = array(str("d"))
+        self._lasts = array(str("d"))
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._slots)
+
+    def aggregate(self, measurements):
+        """Folds measurements into the current window
+
+        :param measurements: The measurements pulled by the driver
+        :type measurements: list of :class:`Measurement` instances
+        :return: The summaries of the windows which are over, followed by
+            the measurements which could not be aggregated
+        :rtype: list of :class:`Measurement` instances
+        """
+        emitted = []
+        passed_through = []
+        with self._lock:
+            for measurement in measurements:
+                timestamp = measurement.timestamp
+                value = measurement.value
+                if not self._can_aggregate(timestamp, value):
+                    passed_through.append(measurement)
+                    continue
+
+                window_start = timestamp - timestamp % self.window_ns
+                if self._window_start is None:
+                    self._window_start = window_start
+                elif window_start > self._window_start:
+                    emitted.extend(self._emit())
+                    self._window_start = window_start
+                # Late measurements are folded into the current window
+
+                self._add(self._get_slot(measurement), float(value))
+
+        return emitted + passed_through
+
+    def flush(self):
+        """Emits the current window even though it is not over
+
+        :rtype: list of :class:`Measurement` instances
+        """
+        with self._lock:
+            emitted = self._emit()
+            # The next measurement opens a window of its own
+            self._window_start = None
+            return emitted
+
+    @staticmethod
+    def _can_aggregate(timestamp, value):
+        if isinstance(value, bool) or isinstance(timestamp, bool):
+            return False
+        numerical = isinstance(value, six.integer_types + (float,))
+        return numerical and isinstance(timestamp, six.integer_types)
+
+    def _get_slot(self, measurement):
+        packed_static = measurement.packed_static
+        slot = self._slots.get(packed_static)
+        if slot is not None:
+            return slot
+
+        templates = [
+            MeasurementTemplate(
+                "%s.%s" % (measurement.name, function),
+                "" if function == COUNT else measurement.unit,
+                "gauge" if function == COUNT else measurement.type,
+                measurement.resource_id, measurement.host,
+                measurement.resource_metadata)
+            for function in self.functions
+        ]
+        if self._free_slots:
+            # The arrays of a freed slot are reset by _add on its first value
+            slot = self._free_slots.pop()
+            self._templates[slot] = templates
+        else:
+            slot = len(self._templates)
+            self._templates.append(templates)
+            self._counts.append(0)
+            self._mins.append(0.)
+            self._maxs.append(0.)
+            self._sums.append(0.)
+            self._lasts.append(0.)
+        self._slots[packed_static] = slot
+        return slot
+
+    def _add(self, slot, value):
+        if self._counts[slot]:
+            self._mins[slot] = min(self._mins[slot], value)
+            self._maxs[slot] = max(self._maxs[slot], value)
+            self._sums[slot] += value
+        else:
+            self._mins[slot] = self._maxs[slot] = self._sums[slot] = value
+        self._counts[slot] += 1
+        self._lasts[slot] = value
+
+    def _get_value(self, function, slot):
+        if function == MIN:
+            return self._mins[slot]
+        elif function == MAX:
+            return self._maxs[slot]
+        elif function == MEAN:
+            return self._sums[slot] / self._counts[slot]
+        elif function == COUNT:
+            return self._counts[slot]
+        return self._lasts[slot]
+
+    def _emit(self):
+        if self._window_start is None:
+            return []
+
+        timestamp = self._window_start + self.window_ns
+        emitted = []
+        idle = []
+        for packed_static, slot in six.iteritems(self._slots):
+            if not self._counts[slot]:
+                idle.append(packed_static)
+                continue
+            templates = self._templates[slot]
+            for function, template in zip(self.functions, templates):
+                emitted.append(template.create(
+                    self._get_value(function, slot), timestamp))
+            self._counts[slot] = 0
+        # Frees the slots of the series which got nothing in this window
+        for packed_static in idle:
+            slot = self._slots.pop(packed_static)
+            self._templates[slot] = None
+            self._free_slots.append(slot)
+        return emitted
@@ -0,0 +1,140 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Only lets through the measurements whose value changed"""
+
+from __future__ import unicode_literals
+
+from array import array
+from threading import Lock
+
+import six
+
+
+class ChangeFilter(object):
+    """Suppresses the measurements of a series which did not change
+
+    A numerical value is deemed unchanged as long as it stays within the
+    deadband of the last value sent for its series, that is to say within
+    ``deadband`` (absolute) or ``relative_deadband`` times the last value
+    (relative), whichever is the widest. Other values are compared as is.
+
+    Whatever its value, at least one measurement out of
+    ``heartbeat_intervals`` is let through as a heartbeat, so that the
+    consumers can tell an unchanged series from a dead one.
+
+    A series absent from more than ``heartbeat_intervals`` calls in a row
+    is forgotten (its next measurement, if any, is sent as a new one) and
+    its slot reused, so that the churn of the series does not grow the
+    state of the filter.
+    """
+
+    def __init__(self, deadband=0, relative_deadband=0,
+                 heartbeat_intervals=10):
+        """
+        :param deadband: Absolute deadband
+        :type deadband: float
+        :param relative_deadband: Relative deadband (e.g. 0.01 for 1%)
+        :type relative_deadband: float
+        :param heartbeat_intervals: A measurement of each series is sent at
+            least every this many measurements
+        :type heartbeat_intervals: int
+        """
+        self.deadband = deadband
+        self.relative_deadband = relative_deadband
+        self.heartbeat_intervals = heartbeat_intervals
+
+        self.suppressed_count = 0
+        self._call_count = 0
+        self._slots = {}  # packed_static -> slot
+        self._last_values = []  # slot -> last value sent
+        self._suppressed = array(str("l"))  # slot -> suppressed in a row
+        self._last_seen = array(str("l"))  # slot -> call it was last seen
+        self._free_slots = []  # Slots of the forgotten series, reused first
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._slots)
+
+    def filter(self, measurements):
+        """
+        :param measurements: The measurements about to be sent
+        :type measurements: list of :class:`Measurement` instances
+        :return: The measurements to be sent indeed
+        :rtype: list of :class:`Measurement` instances
+        """
+        changed = []
+        with self._lock:
+            self._call_count += 1
+            for measurement in measurements:
+                slot = self._slots.get(measurement.packed_static)
+                if slot is None:
+                    slot = self._slots[measurement.packed_static] = (
+                        self._new_slot(measurement.value))
+                else:
+                    self._last_seen[slot] = self._call_count
+                    unchanged = self._is_unchanged(self._last_values[slot],
+                                                   measurement.value)
+                    suppressed = self._suppressed[slot] + 1
+                    heartbeat = suppressed >= self.heartbeat_intervals
+                    if unchanged and not heartbeat:
+                        self._suppressed[slot] = suppressed
+                        self.suppressed_count += 1
+                        continue
+                    self._last_values[slot] = measurement.value
+
+                self._suppressed[slot] = 0
+                changed.append(measurement)
+
+            # Sweeps the forgotten series once in a while only
+            if not self._call_count % max(self.heartbeat_intervals, 1):
+                self._forget_absent()
+        return changed
+
+    def _new_slot(self, value):
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self._last_values[slot] = value
+            self._last_seen[slot] = self._call_count
+            return slot
+
+        self._last_values.append(value)
+        self._suppressed.append(0)
+        self._last_seen.append(self._call_count)
+        return len(self._last_values) - 1
+
+    def _forget_absent(self):
+        oldest = self._call_count - self.heartbeat_intervals
+        absent = [packed_static
+                  for packed_static, slot in six.iteritems(self._slots)
+                  if self._last_seen[slot] < oldest]
+        for packed_static in absent:
+            slot = self._slots.pop(packed_static)
+            self._last_values[slot] = None
+            self._free_slots.append(slot)
+
+    def _is_unchanged(self, last_value, value):
+        numerical_types = six.integer_types + (float,)
+        numerical = isinstance(value, numerical_types)
+        if not numerical or not isinstance(last_value, numerical_types):
+            return value == last_value
+        if isinstance(value, bool) or isinstance(last_value, bool):
+            # True == 1 but the measurement did change
+            return value is last_value
+
+        deadband = max(self.deadband,
+                       self.relative_deadband * abs(last_value))
+        return abs(value - last_value) <= deadband
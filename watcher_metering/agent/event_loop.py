@@ -0,0 +1,162 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Runs the pulls of the coroutine drivers on a single asyncio event loop
+
+Only callbacks are used here (no ``async``/``await``) so that this module can
+still be imported by Python versions which do not support them.
+"""
+
+from __future__ import unicode_literals
+
+from collections import deque
+import functools
+from threading import Thread
+
+from oslo_log import log
+
+try:
+    import asyncio
+except ImportError:  # Python 2.7
+    asyncio = None
+
+LOG = log.getLogger(__name__)
+
+
+def is_coroutine_function(func):
+    return asyncio is not None and asyncio.iscoroutinefunction(func)
+
+
+class PullTimeout(Exception):
+    pass
+
+
+class EventLoop(Thread):
+    """Thread running the asyncio event loop shared by all the drivers
+
+    At most ``max_pulls`` coroutines run at the same time, the other ones
+    wait for their turn in submission order.
+    """
+
+    def __init__(self, max_pulls=100):
+        """
+        :param max_pulls: Maximum number of coroutines running at the same
+            time
+        :type max_pulls: int
+        """
+        if asyncio is None:
+            raise RuntimeError("Coroutine drivers require asyncio")
+        super(EventLoop, self).__init__()
+        self.daemon = True
+        self.max_pulls = max_pulls
+        self.loop = asyncio.new_event_loop()
+
+        # Only ever used from within the loop thread
+        self._tasks = set()
+        self._waiting = deque()
+
+    @property
+    def running_count(self):
+        return len(self._tasks)
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+            if self._tasks:
+                # Lets the cancelled coroutines clean up after themselves
+                self.loop.run_until_complete(asyncio.wait(list(self._tasks)))
+        finally:
+            self.loop.close()
+
+    def stop(self):
+        """Cancels the coroutines in progress and stops the loop"""
+        if self.is_alive():
+            self.loop.call_soon_threadsafe(self._shutdown)
+            self.join()
+
+    def submit(self, coroutine_function, timeout, callback):
+        """Runs a coroutine on the loop (thread-safe)
+
+        :param coroutine_function: Called without arguments from the loop
+            thread to get the coroutine to run
+        :type coroutine_function: callable
+        :param timeout: Time (in seconds) after which the coroutine is
+            cancelled (None for no timeout)
+        :type timeout: float
+        :param callback: Called from the loop thread with either the result
+            of the coroutine and None, or None and the exception it raised
+            (:class:`PullTimeout` if it timed out)
+        :type callback: callable
+        """
+        self.loop.call_soon_threadsafe(
+            self._submit, coroutine_function, timeout, callback)
+
+    def _shutdown(self):
+        self._waiting.clear()
+        for task in self._tasks:
+            task.cancel()
+        self.loop.stop()
+
+    def _submit(self, coroutine_function, timeout, callback):
+        if len(self._tasks) >= self.max_pulls:
+            self._waiting.append((coroutine_function, timeout, callback))
+            return
+        self._start(coroutine_function, timeout, callback)
+
+    def _start(self, coroutine_function, timeout, callback):
+        try:
+            task = self.loop.create_task(coroutine_function())
+        except Exception as exc:
+            self._call(callback, None, exc)
+            return
+
+        self._tasks.add(task)
+        timed_out = []
+        timer = None
+        if timeout:
+            timer = self.loop.call_later(
+                timeout, self._time_out, task, timeout, timed_out)
+        task.add_done_callback(
+            functools.partial(self._done, callback, timer, timed_out))
+
+    def _time_out(self, task, timeout, timed_out):
+        timed_out.append(PullTimeout("Timed out after %ss" % timeout))
+        task.cancel()
+
+    def _done(self, callback, timer, timed_out, task):
+        self._tasks.discard(task)
+        if timer is not None:
+            timer.cancel()
+
+        if timed_out:
+            self._call(callback, None, timed_out[0])
+        elif task.cancelled():
+            pass  # The loop is shutting down
+        elif task.exception() is not None:
+            self._call(callback, None, task.exception())
+        else:
+            self._call(callback, task.result(), None)
+
+        while self._waiting and len(self._tasks) < self.max_pulls:
+            self._start(*self._waiting.popleft())
+
+    @staticmethod
+    def _call(callback, result, exc):
+        try:
+            callback(result, exc)
+        except Exception as exc:
+            LOG.exception(exc)
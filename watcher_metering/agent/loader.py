@@ -29,3 +29,9 @@ class MetricsDriverLoader(DriverLoader):
             namespace=self.namespace,
             name=driver_name,
         )
+
+    def _create(self, driver_cls, opts):
+        driver = super(MetricsDriverLoader, self)._create(driver_cls, opts)
+        # Lets a driver process create its own instance of the driver
+        driver.options = opts
+        return driver
@@ -25,6 +25,8 @@ import time
 from oslo_log import log
 import six
 from watcher_metering.agent.loader import MetricsDriverLoader
+from watcher_metering.agent.scheduler import Scheduler
+from watcher_metering.agent.snapshot import SnapshotCache
 
 LOG = log.getLogger(__name__)
 
@@ -37,10 +39,38 @@ class MetricManager(Thread):
 
     TICK_INTERVAL = 5  # In seconds
 
-    def __init__(self, conf, driver_names):
+    def __init__(self, conf, driver_names, max_pull_workers=4,
+                 max_async_pulls=100, pull_alignment=True,
+                 pull_phase_spread=1.):
+        """
+        :param conf: Configuration obtained from a configuration file
+        :type conf: oslo_config.cfg.ConfigOpts instance
+        :param driver_names: The list of driver names to register
+        :type driver_names: list of str
+        :param max_pull_workers: Maximum number of drivers pulled at the
+            same time
+        :type max_pull_workers: int
+        :param max_async_pulls: Maximum number of coroutine drivers pulled
+            at the same time
+        :type max_async_pulls: int
+        :param pull_alignment: Whether the pulls are aligned on the interval
+            boundaries of the wall clock
+        :type pull_alignment: bool
+        :param pull_phase_spread: Fraction of the interval over which the
+            pulls of the different hosts are spread
+        :type pull_phase_spread: float
+        """
         super(MetricManager, self).__init__()
         self.conf = conf
         self.driver_names = driver_names
+        self.max_pull_workers = max_pull_workers
+        self.max_async_pulls = max_async_pulls
+        self.pull_alignment = pull_alignment
+        self.pull_phase_spread = pull_phase_spread
+        # Shared by all the drivers, expired by the scheduler on each tick
+        self.snapshot_cache = SnapshotCache()
+        self.scheduler = self._create_scheduler()
+        self._reported_pull_stats = {}
         self._terminated = False
         self.daemon = True
 
@@ -56,6 +86,21 @@ class MetricManager(Thread):
     def namespace(self):
         raise NotImplementedError  # pragma: no cover
 
+    def _create_scheduler(self):
+        return Scheduler(self.max_pull_workers,
+                         on_tick_done=self.on_tick_done,
+                         max_async_pulls=self.max_async_pulls,
+                         align=self.pull_alignment,
+                         phase_spread=self.pull_phase_spread,
+                         snapshot_cache=self.snapshot_cache)
+
+    def on_tick_done(self, tick):
+        """Called once all the drivers pulled within a tick are done
+
+        :param tick: The tick which is over
+        :type tick: :class:`watcher_metering.agent.scheduler.Tick` instance
+        """
+
     def register_drivers(self):
         self.lock.acquire()
         for driver_name in self.driver_names:
@@ -72,50 +117,76 @@ class MetricManager(Thread):
         driver = driver_manager.load()
 
         self.drivers[driver.key] = driver
+        driver.snapshot_cache = self.snapshot_cache
         driver.register_observer(self)
 
     def unregister_driver(self, key):
+        self.scheduler.unschedule(key)
         driver = self.drivers.pop(key)
         driver.unregister_observer(self)
 
     def run(self):
+        self.scheduler.start()
         while not self.terminated:
             self.check_drivers_alive()
             time.sleep(self.TICK_INTERVAL)
 
     def check_drivers_alive(self):
         if self.lock.acquire(False):
-            # Because we can edit the drivers in this loop, we create a copy
-            # --> We could therwise loop onto a restarted driver...
-            driver_items = [item for item in self.drivers.items()]
-            for driver_name, driver_thread in driver_items:
-                if not driver_thread.is_alive():
-                    LOG.debug("Starting driver %s", driver_thread.key)
-                    try:
-                        driver_thread.start()
-                    except RuntimeError as exc:
-                        LOG.exception(exc)
-                        # Case where the driver "died"
-                        # -> we need to spawn a new one
-                        #    because thread can only be started once
-                        self.unregister_driver(driver_name)
-                        self._register_driver(driver_thread.get_name())
-                        reloaded_driver_thread = self.drivers[driver_name]
-                        reloaded_driver_thread.start()
-
+            started = self.scheduler.ident is not None
+            if started and not self.scheduler.is_alive():
+                # Case where the scheduler "died"
+                # -> we need to spawn a new one
+                #    because thread can only be started once
+                LOG.error("Scheduler died: restarting it")
+                self.scheduler = self._create_scheduler()
+                self._reported_pull_stats = {}
+                self.scheduler.start()
+
+            for key, driver in list(self.drivers.items()):
+                if not self.scheduler.is_scheduled(key):
+                    LOG.debug("Scheduling driver %s", key)
+                    self.scheduler.schedule(driver)
+
+            self._report_pull_stats()
             self.lock.release()
 
+    def get_pull_stats(self):
+        """
+        :return: The pull statistics of each driver
+        :rtype: dict of driver key -> dict
+        """
+        pull_stats = {}
+        for key, task in self.scheduler.tasks.items():
+            stats = pull_stats[key] = task.stats.as_dict()
+            process = getattr(task.driver, "process", None)
+            if process is not None:
+                stats["process_restarts"] = process.restart_count
+        return pull_stats
+
+    def _report_pull_stats(self):
+        """Warns about the drivers which eat up the collection budget"""
+        for key, task in self.scheduler.tasks.items():
+            stats = task.stats
+            counters = (stats.overruns, stats.timeouts, stats.skipped_ticks)
+            reported = self._reported_pull_stats.get(key, (0, 0, 0))
+            if counters == reported:
+                continue
+            LOG.warning(
+                "[%s] %d overrun(s), %d timeout(s) and %d skipped tick(s) "
+                "since the last check (mean duration: %.3fs, max: %.3fs)",
+                key, counters[0] - reported[0], counters[1] - reported[1],
+                counters[2] - reported[2], stats.mean_duration,
+                stats.max_duration)
+            self._reported_pull_stats[key] = counters
+
     def stop(self):
         self.terminated = True
         self.lock.acquire()
 
-        join_threads = []
-        for key in self.drivers:
-            t = Thread(target=self.drivers.get(key).join)
-            t.start()
-            join_threads.append(t)
-
-        for join_thread in join_threads:
-            join_thread.join()
+        # Waits for the pulls in progress before stopping the drivers
+        self.scheduler.stop()
+        for driver in self.drivers.values():
+            driver.stop()
 
         self.lock.release()
@@ -16,17 +16,30 @@
 
 from __future__ import unicode_literals
 
-import datetime
 import platform
+import time
 
-from dateutil.tz import tzlocal
-import pytz
+from watcher_metering.protocol.frame import pack_record
+from watcher_metering.protocol.frame import pack_static
+
+# Resolved once as it is the default host of every single measurement
+HOSTNAME = platform.node()
+
+try:
+    epoch_ns = time.time_ns
+except AttributeError:  # Python < 3.7
+    def epoch_ns():
+        """Returns the current time as integer nanoseconds since the epoch"""
+        return int(time.time() * 10 ** 9)
 
 
 class Measurement(object):
 
+    __slots__ = ("name", "unit", "type", "value", "resource_id", "host",
+                 "timestamp", "resource_metadata", "template")
+
     def __init__(self, name, unit, type_, value, resource_id, host=None,
-                 timestamp=None, resource_metadata=None):
+                 timestamp=None, resource_metadata=None, template=None):
         """
         :param name: The name of the measurement (Should the Probe ID)
         :type name: str
@@ -41,34 +54,31 @@ class Measurement(object):
         :param host: The IP address / FQDN of the host from which the
             measurement was obtained (By default, takes the current hostname)
         :type host: str
-        :param timestamp: The datetime at which the measurement was realized,
-            generated by default with the current datetime (Should be UTC)
-        :type timestamp: str (ISO 8601)
+        :param timestamp: The time at which the measurement was realized as
+            nanoseconds since the epoch, generated by default with the
+            current time
+        :type timestamp: int
         :param resource_metadata: A mapping of metadata values
         :type resource_metadata: dict which may contain 'host', 'ttl', 'state'
             as well as some other custom values
+        :param template: The template this measurement was created from
+        :type template: :class:`MeasurementTemplate` instance
         """
         self.name = name
         self.unit = unit
         self.type = type_
         self.value = value
         self.resource_id = resource_id
-        self.host = host or platform.node()
-        self.timestamp = timestamp or Measurement.utc_now().isoformat()
+        self.host = host or HOSTNAME
+        self.timestamp = timestamp or epoch_ns()
         self.resource_metadata = resource_metadata or {}
-
-    @classmethod
-    def utc_now(cls):
-        """Gets current datetime and converts it as UTC-based datetime"""
-        local_now = datetime.datetime.now(tzlocal())
-        utc_now = pytz.utc.normalize(local_now)
-        return utc_now
+        self.template = template
 
     def as_dict(self):
 
         return {
             "name": self.name,  # self.probe_id
-            "timestamp": self.timestamp,  # datetime.datetime.now().isoformat()
+            "timestamp": self.timestamp,  # epoch_ns()
             "unit": self.unit,  # self.unit,
             "type": self.type,  # "gauge"
             "value": self.value,  # value
@@ -76,3 +86,84 @@ class Measurement(object):
             "host": self.host,  # platform.node()
             "resource_metadata": self.resource_metadata,  # resource_metadata
         }
+
+    @property
+    def packed_static(self):
+        """The encoded static part of this measurement (see `as_record()`)"""
+        if self.template is not None:
+            return self.template.packed_static
+        return pack_static(self.name, self.unit, self.type, self.resource_id,
+                           self.host, self.resource_metadata)
+
+    def as_record(self):
+        """Encodes this measurement using the positional wire format
+
+        :return: The msgpack encoded record
+        :rtype: bytes
+        """
+        return pack_record(self.packed_static, self.timestamp, self.value)
+
+    def as_sample(self):
+        """Returns this measurement as a sample of its (encoded) series
+
+        The timestamp and the value are encoded later on, when building the
+        frame, as it depends on the codec in use.
+
+        :return: The encoded static part, the timestamp and the value
+        :rtype: tuple
+        """
+        return self.packed_static, self.timestamp, self.value
+
+
+class MeasurementTemplate(object):
+    """Fixes the static attributes shared by all the measurements of a series
+
+    Drivers emitting many measurements should create their templates once
+    and then call :meth:`create` on each pull, so that only the value and the
+    timestamp have to be filled in and encoded.
+    """
+
+    __slots__ = ("name", "unit", "type", "resource_id", "host",
+                 "resource_metadata", "packed_static")
+
+    def __init__(self, name, unit, type_, resource_id, host=None,
+                 resource_metadata=None):
+        """
+        :param name: The name of the measurements (Should the Probe ID)
+        :type name: str
+        :param unit: The measurement unit sign (International System of Units)
+        :type unit: str
+        :param type_: Should be either 'gauge', 'cumulative', 'delta' or ''
+        :type type_: str
+        :param resource_id: The ID of the resource
+        :type resource_id: str
+        :param host: The IP address / FQDN of the host from which the
+            measurements are obtained (By default, the current hostname)
+        :type host: str
+        :param resource_metadata: A mapping of metadata values which must not
+            be modified once the template is created
+        :type resource_metadata: dict
+        """
+        self.name = name
+        self.unit = unit
+        self.type = type_
+        self.resource_id = resource_id
+        self.host = host or HOSTNAME
+        self.resource_metadata = resource_metadata or {}
+        self.packed_static = pack_static(
+            self.name, self.unit, self.type, self.resource_id, self.host,
+            self.resource_metadata)
+
+    def create(self, value, timestamp=None):
+        """Creates a new measurement out of this template
+
+        :param value: The value of the measurement
+        :type value: int, float or long
+        :param timestamp: The time at which the measurement was realized as
+            nanoseconds since the epoch (By default, the current time)
+        :type timestamp: int
+        :rtype: :class:`Measurement` instance
+        """
+        return Measurement(self.name, self.unit, self.type, value,
+                           self.resource_id, self.host, timestamp,
+                           self.resource_metadata, self)
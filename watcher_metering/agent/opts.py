@@ -60,9 +60,90 @@ AGENT_OPTS = (
         'driver_names',
         default=[],
         required=True,
-        sample_default='cpu_count,disk_free',
+        sample_default='cpu,memory,load,disk_io,filesystem,network',
         help='Driver names the agent will dynamically spin up.'
     ),
+    cfg.IntOpt(
+        'outbox_size',
+        default=10000,
+        min=1,
+        help='Maximum number of measurements buffered by the agent while '
+             'waiting to be sent to the publisher.',
+    ),
+    cfg.StrOpt(
+        'outbox_overflow_policy',
+        default='drop_oldest',
+        choices=['drop_oldest', 'drop_newest'],
+        help='Which measurements are discarded when the outbox is full.',
+    ),
+    cfg.IntOpt(
+        'frame_max_measurements',
+        default=500,
+        min=1,
+        help='Maximum number of measurements sent within a single frame.',
+    ),
+    cfg.FloatOpt(
+        'frame_max_delay',
+        default=.5,
+        help='Maximum time (in seconds) a measurement may wait in the outbox '
+             'before being sent to the publisher.',
+    ),
+    cfg.BoolOpt(
+        'series_registration',
+        default=True,
+        help='Whether the static attributes of each series are only sent '
+             'once in a while rather than with every measurement. Disable '
+             'it to push to publishers which do not support it.',
+    ),
+    cfg.FloatOpt(
+        'series_registration_interval',
+        default=60,
+        min=1,
+        help='Time (in seconds) after which the agent registers all of its '
+             'series again, e.g. in case the publisher restarted. Samples '
+             'of a series the publisher does not know about are discarded '
+             'in the meantime.',
+    ),
+    cfg.StrOpt(
+        'frame_codec',
+        default='msgpack',
+        choices=['msgpack', 'gorilla'],
+        help='How the samples are encoded. The gorilla codec compresses the '
+             'timestamps and numerical values of each series, at the expense '
+             'of some CPU time. Requires the series registration.',
+    ),
+    cfg.IntOpt(
+        'max_pull_workers',
+        default=4,
+        min=1,
+        help='Maximum number of drivers pulled at the same time. The '
+             'drivers are all scheduled from a single thread and pulled by '
+             'this many worker threads.',
+    ),
+    cfg.IntOpt(
+        'max_async_pulls',
+        default=100,
+        min=1,
+        help='Maximum number of coroutine drivers pulled at the same time. '
+             'Their pulls all run on a single event loop and do not use up '
+             'a worker thread each.',
+    ),
+    cfg.BoolOpt(
+        'pull_alignment',
+        default=True,
+        help='Whether the pulls are aligned on the interval boundaries of '
+             'the wall clock (shifted by a phase specific to each host), '
+             'rather than starting as soon as the agent does.',
+    ),
+    cfg.FloatOpt(
+        'pull_phase_spread',
+        default=1.,
+        min=0,
+        max=1,
+        help='Fraction of the pulling interval over which the pulls of the '
+             'different hosts are spread when aligned. 0 means that all '
+             'the hosts pull at the very same time.',
+    ),
 )
 
 AGENT_GROUP_NAME = "agent"
@@ -0,0 +1,295 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Runs the pulls of a driver in a process of its own"""
+
+from __future__ import unicode_literals
+
+import importlib
+import multiprocessing
+import os
+import resource
+import signal
+from threading import Lock
+
+from oslo_log import log
+from watcher_metering.agent.event_loop import asyncio
+from watcher_metering.agent.event_loop import is_coroutine_function
+from watcher_metering.agent.event_loop import PullTimeout
+
+LOG = log.getLogger(__name__)
+
+THREAD = "thread"
+PROCESS = "process"
+EXECUTION_MODES = (THREAD, PROCESS)
+
+# Time (in seconds) given to a child process to create its driver
+STARTUP_TIMEOUT = 60
+
+# Forking the agent itself would copy the locks held by its other threads
+# (logging, sender, scheduler...) into the child process, where they would
+# never get released: the child process rather creates its own instance of
+# the driver from a fresh interpreter (or from the single-threaded fork
+# server)
+if hasattr(multiprocessing, "get_context"):
+    _context = multiprocessing.get_context(
+        "forkserver" if "forkserver" in
+        multiprocessing.get_all_start_methods() else "spawn")
+else:  # Python 2.7, which can only fork
+    _context = multiprocessing
+
+
+class DriverProcessError(Exception):
+    pass
+
+
+class PackedSamples(list):
+    """Chunks of samples already packed by a driver process
+
+    Each chunk is a list of ``Measurement.as_sample()`` tuples, ready to be
+    framed by the observers of the driver.
+    """
+
+
+class _Collector(object):
+    """Observer standing in for the agent within the driver process"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def update(self, observable, data):
+        self.chunks.append(data)
+
+
+def _get_peak_memory():
+    """Peak resident memory (in kB on Linux) of the current process"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _pull(driver, timestamp):
+    measurements = driver.pull_data(timestamp)
+    if is_coroutine_function(driver.do_pull):
+        loop = asyncio.new_event_loop()
+        try:
+            measurements = loop.run_until_complete(measurements)
+        finally:
+            loop.close()
+    driver.process_pulled_data(measurements)
+
+
+def get_class_path(cls):
+    """
+    :return: The path of the class, e.g. `my.module:MyClass`
+    :rtype: str
+    """
+    return "%s:%s" % (cls.__module__, cls.__name__)
+
+
+def _create_driver(class_path, options):
+    module_name, class_name = class_path.split(":")
+    driver_cls = getattr(importlib.import_module(module_name), class_name)
+    options = dict(options, execution_mode=THREAD)  # Pulls from within
+    return driver_cls(**options)
+
+
+def _serve(class_path, options, connection):
+    """Main loop of the driver process: one pull per request"""
+    try:
+        driver = _create_driver(class_path, options)
+    except Exception as exc:
+        connection.send(exc.args[0] if exc.args else repr(exc))
+        connection.close()
+        return
+    connection.send(None)  # Ready
+
+    collector = _Collector()
+    driver._observers = [collector]
+    while True:
+        try:
+            request = connection.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if request is None:
+            break
+
+        collector.chunks = []
+        error = None
+        try:
+            _pull(driver, request["timestamp"])
+        except Exception as exc:
+            error = exc.args[0] if exc.args else repr(exc)
+        connection.send((collector.chunks, error, _get_peak_memory()))
+    driver.stop()
+    connection.close()
+
+
+class DriverProcess(object):
+    """Pulls a driver from a child process, restarted whenever needed
+
+    The child process is started on the first pull. It creates its own
+    instance of the driver, out of the options the driver was loaded with
+    (see :attr:`MetricPuller.options`), and pulls it whenever the parent
+    asks for it. It sends back the samples already
+    packed, so that the parent only has to frame them. The child process
+    gets replaced if it crashes, if a pull times out, after ``max_pulls``
+    pulls or once its peak resident memory exceeds ``max_memory``, which
+    contains the leaks of the driver without touching the rest of the agent.
+
+    The state of the driver (e.g. its aggregation windows) lives in the
+    child process and is therefore lost whenever it gets replaced.
+    """
+
+    def __init__(self, driver, max_pulls=0, max_memory=0):
+        """
+        :param driver: The driver to pull
+        :type driver: :class:`MetricPuller` instance
+        :param max_pulls: Number of pulls after which the child process is
+            replaced (0 for no limit)
+        :type max_pulls: int
+        :param max_memory: Peak resident memory (in MB) above which the
+            child process is replaced (0 for no limit)
+        :type max_memory: int
+        """
+        self.driver = driver
+        self.max_pulls = max_pulls
+        self.max_memory = max_memory
+        self.restart_count = 0
+
+        self._process = None
+        self._connection = None
+        self._pull_count = 0
+        self._lock = Lock()
+
+    @property
+    def pid(self):
+        return self._process.pid if self._process is not None else None
+
+    def is_alive(self):
+        return self._process is not None and self._process.is_alive()
+
+    def pull(self, timeout=None, timestamp=None):
+        """Pulls the driver once from the child process
+
+        :param timeout: Time (in seconds) after which the pull is abandoned
+            and the child process killed (None for no timeout)
+        :type timeout: float
+        :param timestamp: Timestamp of the tick, handed over to the driver
+            (nanoseconds since the epoch)
+        :type timestamp: int
+        :return: The chunks of packed samples sent by the driver
+        :rtype: :class:`PackedSamples` instance
+        """
+        with self._lock:
+            if not self.is_alive():
+                if self._process is not None:
+                    LOG.error("[%s] Driver process died (exit code %s): "
+                              "restarting it", self.driver.key,
+                              self._process.exitcode)
+                    self._kill()
+                    self.restart_count += 1
+                self._start()
+
+            try:
+                self._connection.send({"timestamp": timestamp})
+                if not self._connection.poll(timeout):
+                    self._kill()
+                    self.restart_count += 1
+                    raise PullTimeout("Timed out after %ss" % timeout)
+                chunks, error, peak_memory = self._connection.recv()
+            except (EOFError, IOError, OSError):
+                exit_code = self._kill()
+                self.restart_count += 1
+                raise DriverProcessError(
+                    "Driver process died (exit code %s)" % exit_code)
+
+            self._pull_count += 1
+            if self._should_recycle(peak_memory):
+                LOG.info("[%s] Replacing the driver process after %d "
+                         "pull(s) (peak memory: %dkB)", self.driver.key,
+                         self._pull_count, peak_memory)
+                self._stop()
+                self.restart_count += 1
+
+            if error is not None:
+                raise DriverProcessError(error)
+            return PackedSamples(chunks)
+
+    def stop(self):
+        with self._lock:
+            self._stop()
+
+    def _should_recycle(self, peak_memory):
+        if self.max_pulls and self._pull_count >= self.max_pulls:
+            return True
+        return bool(self.max_memory) and peak_memory > self.max_memory * 1024
+
+    def _start(self):
+        if self.driver.options is None:
+            raise DriverProcessError(
+                "Only the drivers created by the loader can be run in a "
+                "process of their own")
+        parent_connection, child_connection = _context.Pipe()
+        process = _context.Process(
+            target=_serve,
+            args=(get_class_path(type(self.driver)), self.driver.options,
+                  child_connection),
+            name="driver-%s" % self.driver.key)
+        process.daemon = True
+        process.start()
+        child_connection.close()
+
+        self._process = process
+        self._connection = parent_connection
+        self._pull_count = 0
+
+        try:
+            if not parent_connection.poll(STARTUP_TIMEOUT):
+                raise DriverProcessError("Timed out while starting")
+            error = parent_connection.recv()
+        except (EOFError, IOError, OSError):
+            error = "Died while starting"
+        except DriverProcessError as exc:
+            error = exc.args[0]
+        if error is not None:
+            exit_code = self._kill()
+            raise DriverProcessError(
+                "Could not start the driver process (exit code %s): %s" % (
+                    exit_code, error))
+        LOG.info("[%s] Driver process started (pid %d)",
+                 self.driver.key, process.pid)
+
+    def _stop(self):
+        """Lets the child process exit on its own, or kills it"""
+        if self._process is None:
+            return
+        try:
+            self._connection.send(None)
+        except (IOError, OSError):
+            pass
+        self._process.join(1)
+        self._kill()
+
+    def _kill(self):
+        process, self._process = self._process, None
+        if process.is_alive():
+            process.terminate()
+            process.join(1)
+        if process.is_alive():
+            os.kill(process.pid, signal.SIGKILL)
+        process.join()
+        self._connection.close()
+        self._connection = None
+        return process.exitcode
@@ -17,16 +17,25 @@
 from __future__ import unicode_literals
 
 import abc
-import datetime
+import itertools
 from threading import Lock
-from threading import Thread
-import time
 
-import msgpack
 from oslo_config import cfg
 from oslo_log import log
 import six
+from watcher_metering.agent.aggregation import FUNCTIONS
+from watcher_metering.agent.aggregation import MEAN
+from watcher_metering.agent.aggregation import WindowAggregator
+from watcher_metering.agent.change_filter import ChangeFilter
+from watcher_metering.agent.event_loop import is_coroutine_function
+from watcher_metering.agent.measurement import epoch_ns
 from watcher_metering.agent.measurement import Measurement
+from watcher_metering.agent.measurement import MeasurementTemplate
+from watcher_metering.agent.process import DriverProcess
+from watcher_metering.agent.process import EXECUTION_MODES
+from watcher_metering.agent.process import PackedSamples
+from watcher_metering.agent.process import PROCESS
+from watcher_metering.agent.process import THREAD
 from watcher_metering.agent.utils.observable import Observable
 from watcher_metering.load.loadable import Loadable
 
@@ -34,19 +43,60 @@ LOG = log.getLogger(__name__)
 
 
 @six.add_metaclass(abc.ABCMeta)
-class MetricPuller(Observable, Thread, Loadable):
+class MetricPuller(Observable, Loadable):
+    """Base class of the drivers
+
+    Drivers do not run on their own: the agent scheduler calls
+    :meth:`pull_once` every ``interval`` seconds.
+
+    I/O bound drivers may rather implement :meth:`do_pull` as a coroutine
+    (``async def``): its pulls then run on the event loop shared by all the
+    drivers of the agent instead of using up a worker thread each.
+
+    CPU bound or leaky drivers may rather be run in a process of their own
+    (see the ``execution_mode`` option and :class:`DriverProcess`).
+    """
 
     lock = Lock()
 
+    # Maximum number of measurements buffered when do_pull is a generator
+    STREAM_CHUNK_SIZE = 500
+
     # the title will be display on the dashboard via logstash
     # the probe_id is used in internal for ceilometer
-    def __init__(self, title, probe_id, interval):
+    def __init__(self, title, probe_id, interval, pull_timeout=0,
+                 aggregation_window=0, aggregation_functions=None,
+                 send_on_change=False, change_deadband=0,
+                 change_relative_deadband=0, heartbeat_intervals=10,
+                 execution_mode=THREAD, process_max_pulls=0,
+                 process_max_memory=0):
         super(MetricPuller, self).__init__()
         self.title = title
         self.probe_id = probe_id
         self.interval = interval
-        self.setDaemon(True)
+        self.pull_timeout = pull_timeout or interval
+        self.aggregator = None
+        if aggregation_window:
+            self.aggregator = WindowAggregator(
+                aggregation_window, aggregation_functions or [MEAN])
+        self.change_filter = None
+        if send_on_change:
+            self.change_filter = ChangeFilter(
+                change_deadband, change_relative_deadband,
+                heartbeat_intervals)
+        # Set by the manager the driver is registered against
+        self.snapshot_cache = None
+        # Set by the scheduler for the duration of each pull
+        self.pull_timestamp = None
+        # Set by the loader: the options the driver was created with, out of
+        # which a driver process creates its own instance
+        self.options = None
+        self.process = None
+        if execution_mode == PROCESS:
+            self.process = DriverProcess(self, process_max_pulls,
+                                         process_max_memory)
         self._terminated = False
+        self._templates = {}
 
     @classmethod
     def get_base_opts(cls):
@@ -62,6 +112,62 @@ class MetricPuller(Observable, Thread, Loadable):
                 help="Time interval (in seconds) between each data pulling",
 
                 default=cls.get_default_interval(), required=True),
+            cfg.FloatOpt(
+                'pull_timeout',
+                help="Time (in seconds) after which a pull is abandoned and "
+                     "what it returns discarded (0 meaning the pulling "
+                     "interval)",
+                default=0, min=0),
+            cfg.FloatOpt(
+                'aggregation_window',
+                help="Duration (in seconds) of the windows the measurements "
+                     "of each series are summarized over before being sent "
+                     "(0 to send every measurement)",
+                default=0, min=0),
+            cfg.ListOpt(
+                'aggregation_functions',
+                help="Statistics sent for each series and window, among: %s"
+                     % ", ".join(FUNCTIONS),
+                default=[MEAN]),
+            cfg.BoolOpt(
+                'send_on_change',
+                help="Whether the measurements of a series are only sent "
+                     "when their value changes (or as heartbeats)",
+                default=False),
+            cfg.FloatOpt(
+                'change_deadband',
+                help="Absolute difference with the last value sent under "
+                     "which a value is deemed unchanged",
+                default=0, min=0),
+            cfg.FloatOpt(
+                'change_relative_deadband',
+                help="Difference with the last value sent, relative to it "
+                     "(e.g. 0.01 for 1%), under which a value is deemed "
+                     "unchanged",
+                default=0, min=0),
+            cfg.IntOpt(
+                'heartbeat_intervals',
+                help="With send_on_change, a measurement of each series is "
+                     "sent at least every this many pulls, even unchanged",
+                default=10, min=1),
+            cfg.StrOpt(
+                'execution_mode',
+                help="Whether the driver is pulled from a worker thread of "
+                     "the agent or from a process of its own, restarted "
+                     "whenever it crashes",
+                default=THREAD, choices=EXECUTION_MODES),
+            cfg.IntOpt(
+                'process_max_pulls',
+                help="With the process execution mode, number of pulls "
+                     "after which the driver process is replaced (0 for no "
+                     "limit)",
+                default=0, min=0),
+            cfg.IntOpt(
+                'process_max_memory',
+                help="With the process execution mode, peak resident memory "
+                     "(in MB) above which the driver process is replaced (0 "
+                     "for no limit)",
+                default=0, min=0),
         ]
 
     @classmethod
@@ -112,9 +218,48 @@ class MetricPuller(Observable, Thread, Loadable):
     def key(self):
         return "%s_%s" % (self.title, self.probe_id)
 
-    def join(self, timeout=None):
-        self.stop()
-        super(MetricPuller, self).join(timeout)
+    @property
+    def is_coroutine(self):
+        """Whether :meth:`do_pull` is a coroutine function run by the agent
+
+        Driver processes run their coroutines on their own.
+        """
+        return self.process is None and is_coroutine_function(self.do_pull)
+
+    def get_template(self, name, unit, type_, resource_id, host=None,
+                     resource_metadata=None):
+        """Returns the template of the given series, created on first use
+
+        Templates are kept for the whole lifetime of the driver, so drivers
+        whose resources come and go should rather manage their own
+        :class:`MeasurementTemplate` instances.
+
+        :rtype: :class:`MeasurementTemplate` instance
+        """
+        key = (name, unit, type_, resource_id, host)
+        template = self._templates.get(key)
+        metadata = resource_metadata or {}
+        if template is None or template.resource_metadata != metadata:
+            template = MeasurementTemplate(name, unit, type_, resource_id,
+                                           host, resource_metadata)
+            self._templates[key] = template
+        return template
+
+    def get_snapshot(self, key, load):
+        """Reads a source shared with the other drivers of the agent
+
+        Within a tick, the source is only read by the first driver asking
+        for it: the other ones get the same snapshot, which they must not
+        modify.
+
+        :param key: Identifies the source (e.g. the path of a file)
+        :param load: Called without arguments to read the source
+        :type load: callable
+        :return: What ``load`` returned, possibly for another driver
+        """
+        if self.snapshot_cache is None:
+            return load()
+        return self.snapshot_cache.get(key, load)
 
     def send_measurements(self, measurements):
         """
@@ -124,50 +269,142 @@ class MetricPuller(Observable, Thread, Loadable):
         :type measurements: list of :class:`Measurement` instances
         """
         if not self.terminated:
-            LOG.debug("[%s] Sending measurements", self.key)
-            for measurement in measurements:
-                try:
-                    encoded_msg = msgpack.dumps(measurement.as_dict())
-                    self.notify(encoded_msg)
-                except Exception as exc:
-                    LOG.error("==>[Exception] %s", exc.args[0])
-                LOG.debug("[%s] Measurement sent!", self.key)
+            if self.aggregator is not None:
+                measurements = self.aggregator.aggregate(measurements)
+            self._notify_measurements(measurements)
+
+    def _notify_measurements(self, measurements):
+        if self.change_filter is not None:
+            measurements = self.change_filter.filter(measurements)
+        LOG.debug("[%s] Sending measurements", self.key)
+        packed_measurements = []
+        for measurement in measurements:
+            try:
+                packed_measurements.append(measurement.as_sample())
+            except Exception as exc:
+                LOG.error("==>[Exception] %s", exc.args[0])
+
+        if not packed_measurements:
+            return
+
+        # The observers are in charge of framing the measurements
+        try:
+            self.notify(packed_measurements)
+        except Exception as exc:
+            LOG.error("==>[Exception] %s", exc.args[0])
+        LOG.debug("[%s] %d measurement(s) sent!",
+                  self.key, len(packed_measurements))
 
     def stop(self):
+        if self.aggregator is not None and not self.terminated:
+            # Sends the window in progress rather than losing it
+            self._notify_measurements(self.aggregator.flush())
+        if self.process is not None:
+            self.process.stop()
         self.terminated = True
 
-    def run(self):
-        while not self.terminated:
-            exec_start_time = datetime.datetime.now()
-            try:
-                # Maybe we can use 'yield' to pull our metrics
-                # without having to buffer them
-                measurements = self.pull_data()
-                if isinstance(measurements, Measurement):
-                    # If sending a single measure at a time
-                    # -> handles the missing brackets
-                    measurements = [measurements]
+    def pull_once(self):
+        """Pulls the data once and sends the measurements over
+
+        Called by the agent scheduler every ``interval`` seconds.
+        """
+        if self.terminated:
+            return
+        try:
+            self.process_pulled_data(self.pull_data())
+        except Exception as exc:
+            self.log_pull_error(exc)
+
+    def process_pulled_data(self, measurements, is_abandoned=None):
+        """Sends over what :meth:`do_pull` returned
+
+        Measurements yielded by a generator are sent in chunks of
+        ``STREAM_CHUNK_SIZE`` as they come, so that they never all have to
+        be held in memory at once. The generator is closed as soon as the
+        pull gets abandoned, so that no chunk is sent past its timeout.
+
+        :param measurements: A measurement, a list of measurements, any
+            iterable of measurements (e.g. a generator) or the samples packed
+            by the driver process
+        :param is_abandoned: Tells whether the pull was abandoned in the
+            meantime, checked before sending each chunk
+        :type is_abandoned: callable
+        """
+        is_abandoned = is_abandoned or (lambda: False)
+        if isinstance(measurements, PackedSamples):
+            self._notify_packed(measurements, is_abandoned)
+            return
+        if isinstance(measurements, Measurement):
+            # If sending a single measure at a time
+            # -> handles the missing brackets
+            measurements = [measurements]
+        if isinstance(measurements, (list, tuple)):
+            if not is_abandoned():
                 self.send_measurements(measurements)
+            return
+
+        measurements = iter(measurements)
+        try:
+            while not self.terminated and not is_abandoned():
+                chunk = list(itertools.islice(measurements,
+                                              self.STREAM_CHUNK_SIZE))
+                if not chunk:
+                    break
+                if is_abandoned():
+                    LOG.warning("[%s] Pull abandoned: the rest of its "
+                                "measurements is discarded", self.key)
+                    break
+                self.send_measurements(chunk)
+        finally:
+            close = getattr(measurements, "close", None)
+            if close is not None:
+                close()  # Runs the cleanup of the generator, if any
+
+    def _notify_packed(self, chunks, is_abandoned):
+        for packed_measurements in chunks:
+            if self.terminated or is_abandoned():
+                break
+            try:
+                self.notify(packed_measurements)
             except Exception as exc:
-                LOG.error("[%s] Unexpected error during pulling: %s",
-                          unicode(self),
-                          exc.args[0])
-            time.sleep(self._adjust_sleep_interval(exec_start_time))
+                LOG.error("==>[Exception] %s", exc.args[0])
 
-    def _adjust_sleep_interval(self, start_time):
-        td = datetime.datetime.now() - start_time
-        duration_to_sleep = self.interval - td.total_seconds()
-        return 0 if duration_to_sleep < 0 else duration_to_sleep
+    def log_pull_error(self, exc):
+        LOG.error("[%s] Unexpected error during pulling: %s",
+                  self.key,
+                  exc.args[0] if exc.args else repr(exc))
 
-    def pull_data(self):
+    def pull_data(self, timestamp=None):
         """do_pull proxy:
-        Left there in case we need to add an execution timeout
+        The agent scheduler enforces the ``pull_timeout`` of the driver.
+
+        For coroutine drivers, this returns the coroutine to be run by the
+        event loop of the agent. For drivers run in a process of their own,
+        this returns the samples packed by the driver process.
+
+        :param timestamp: Grid point of the tick the pull belongs to
+            (nanoseconds since the epoch), see :meth:`get_pull_timestamp`
+        :type timestamp: int
         """
+        self.pull_timestamp = timestamp
+        if self.process is not None:
+            return self.process.pull(self.pull_timeout, timestamp)
         return self.do_pull()
 
+    def get_pull_timestamp(self):
+        """Timestamp which the measurements of the current pull should share
+
+        :return: The grid point of the tick being pulled, or the current time
+            when pulled outside of the scheduler (nanoseconds since the epoch)
+        :rtype: int
+        """
+        return self.pull_timestamp or epoch_ns()
+
     @abc.abstractmethod
     def do_pull(self):
         """This method is responsible for pulling/collecting the data
+        May be implemented as a coroutine function, or as a generator
+        yielding the measurements one at a time.
         :returns: The list of measurements to be pushed to the manager
         :rtype: list of Measurement objects
         """
@@ -0,0 +1,600 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Runs the pulls of all the drivers from a single scheduler thread"""
+
+from __future__ import unicode_literals
+
+import bisect
+from collections import OrderedDict
+import functools
+import hashlib
+import heapq
+import itertools
+import math
+from threading import Condition
+from threading import current_thread
+from threading import Lock
+from threading import Thread
+import time
+
+from oslo_log import log
+from six.moves.queue import Queue
+from watcher_metering.agent.event_loop import EventLoop
+from watcher_metering.agent.event_loop import PullTimeout
+from watcher_metering.agent.measurement import HOSTNAME
+
+LOG = log.getLogger(__name__)
+
+_now = getattr(time, "monotonic", time.time)
+_epoch = time.time
+
+
+def get_host_phase(host):
+    """Deterministic phase of a host, as a fraction of the pulling interval
+
+    :param host: The host name
+    :type host: str
+    :rtype: float in [0, 1)
+    """
+    digest = hashlib.md5(host.encode("utf-8")).hexdigest()
+    return int(digest[:8], 16) / float(1 << 32)
+
+
+class PullStats(object):
+    """Counters and pull duration histogram of a driver"""
+
+    # Upper bounds (in seconds) of the buckets of the duration histogram
+    DURATION_BUCKETS = (.01, .05, .1, .5, 1, 5, 10, 30, 60)
+
+    def __init__(self):
+        self.pulls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.overruns = 0  # Pulls which lasted longer than the interval
+        self.skipped_ticks = 0
+        self.total_duration = 0.
+        self.max_duration = 0.
+        self.duration_histogram = [0] * (len(self.DURATION_BUCKETS) + 1)
+
+    def record(self, duration, interval):
+        self.pulls += 1
+        self.total_duration += duration
+        self.max_duration = max(self.max_duration, duration)
+        if duration > interval:
+            self.overruns += 1
+        bucket = bisect.bisect_left(self.DURATION_BUCKETS, duration)
+        self.duration_histogram[bucket] += 1
+
+    @property
+    def mean_duration(self):
+        return self.total_duration / self.pulls if self.pulls else 0.
+
+    def as_dict(self):
+        stats = dict(vars(self))
+        bounds = ["%g" % bound for bound in self.DURATION_BUCKETS] + ["+Inf"]
+        stats["duration_histogram"] = OrderedDict(
+            zip(bounds, self.duration_histogram))
+        stats["mean_duration"] = self.mean_duration
+        return stats
+
+
+class ScheduledTask(object):
+    """The periodic pulls of a given driver
+
+    Each pull gets its own generation number: a pull which timed out is
+    abandoned by moving on to the next generation, so that whatever it
+    returns afterwards is discarded.
+
+    The worker stuck on an abandoned pull is kept track of: the driver is
+    not pulled again until it returns, so that a driver hung for good costs
+    a single thread rather than one per interval.
+    """
+
+    def __init__(self, driver):
+        """
+        :param driver: The driver to pull from
+        :type driver: :class:`MetricPuller` instance
+        """
+        self.driver = driver
+        self.stats = PullStats()
+        self.running = False
+        self.last_started_at = None
+        self.last_duration = None
+        self.tick = None
+        self.worker = None  # Thread running the pull in progress, if any
+        self.stuck_worker = None  # Thread still running an abandoned pull
+        self.generation = 0
+
+    @property
+    def key(self):
+        return self.driver.key
+
+    @property
+    def interval(self):
+        return self.driver.interval
+
+    @property
+    def pull_timeout(self):
+        return self.driver.pull_timeout
+
+    @property
+    def deadline(self):
+        if not self.running or not self.pull_timeout:
+            return None
+        return self.last_started_at + self.pull_timeout
+
+    def start(self, tick):
+        self.generation += 1
+        self.running = True
+        self.tick = tick
+        self.worker = None
+        self.last_started_at = _now()
+        return self.generation
+
+    def finish(self, generation):
+        """Records the end of a pull
+
+        :return: False if the pull was abandoned in the meantime
+        :rtype: bool
+        """
+        if generation != self.generation:
+            return False
+        self.last_duration = _now() - self.last_started_at
+        self.stats.record(self.last_duration, self.interval)
+        self.running = False
+        self.worker = None
+        return True
+
+    @property
+    def is_stuck(self):
+        return self.stuck_worker is not None
+
+    def abandon(self):
+        """Gives up on the pull in progress"""
+        self.stuck_worker = self.worker
+        self.worker = None
+        self.generation += 1
+        self.last_duration = _now() - self.last_started_at
+        self.stats.record(self.last_duration, self.interval)
+        self.stats.timeouts += 1
+        self.running = False
+
+
+class Tick(object):
+    """The tasks of a same interval which are due at the same time"""
+
+    def __init__(self, interval, tasks, on_done=None, timestamp=None):
+        """
+        :param interval: The interval (in seconds) of the tasks
+        :type interval: float
+        :param tasks: The tasks to run
+        :type tasks: list of :class:`ScheduledTask` instances
+        :param on_done: Called with the tick once all its tasks are over
+        :type on_done: callable
+        :param timestamp: Grid point of the tick on the wall clock
+            (nanoseconds since the epoch), which the drivers stamp their
+            measurements with
+        :type timestamp: int
+        """
+        self.interval = interval
+        self.tasks = tasks
+        self.timestamp = timestamp
+        self._on_done = on_done
+        self._pending = len(tasks)
+        self._lock = Lock()
+
+    def task_done(self):
+        with self._lock:
+            self._pending -= 1
+            done = self._pending == 0
+        if done and self._on_done is not None:
+            self._on_done(self)
+
+
+class WorkerPool(object):
+    """Bounded pool of threads running the submitted jobs"""
+
+    def __init__(self, size):
+        """
+        :param size: Number of worker threads
+        :type size: int
+        """
+        self.size = size
+        self._jobs = Queue()
+        self._workers = []
+        self._retired = set()
+        self._lock = Lock()
+
+    def start(self):
+        with self._lock:
+            while len(self._workers) < self.size:
+                self._add_worker()
+
+    def _add_worker(self):
+        worker = Thread(target=self._work)
+        worker.daemon = True
+        worker.start()
+        self._workers.append(worker)
+
+    def submit(self, job, *args):
+        self._jobs.put((job, args))
+
+    def retire(self, worker):
+        """Replaces a worker stuck on a job with a new one
+
+        The retired worker exits as soon as (and if ever) its job is over.
+        """
+        with self._lock:
+            if worker not in self._workers:
+                return
+            self._workers.remove(worker)
+            self._retired.add(worker)
+            self._add_worker()
+
+    def stop(self):
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for _ in workers:
+            self._jobs.put(None)
+        for worker in workers:
+            worker.join()
+
+    def _work(self):
+        worker = current_thread()
+        while True:
+            item = self._jobs.get()
+            if item is None:
+                break
+            job, args = item
+            try:
+                job(*args)
+            except Exception as exc:
+                LOG.exception(exc)
+            with self._lock:
+                if worker in self._retired:
+                    self._retired.remove(worker)
+                    break
+
+
+class Scheduler(Thread):
+    """Heap-based scheduler pulling every driver at its own interval
+
+    The drivers sharing the same interval are pulled within the same tick so
+    that their measurements can be sent together: ``on_tick_done`` is called
+    once all the pulls of a tick are over. The pulls themselves are run by a
+    bounded pool of ``max_workers`` threads, whatever the number of drivers.
+
+    The pulls of the coroutine drivers do not use up a worker: they run on
+    a single event loop, started along with the first of them, and at most
+    ``max_async_pulls`` of them run at the same time.
+
+    A pull lasting longer than the ``pull_timeout`` of its driver is
+    abandoned: coroutines are cancelled whereas the worker threads stuck on
+    a synchronous pull are replaced, and what they return is discarded.
+
+    A driver whose previous pull is still running when it is due again is
+    not pulled twice: this tick is skipped for this driver.
+
+    Ticks are scheduled against the monotonic clock, one interval after the
+    other, so they neither drift nor follow the steps of the wall clock.
+    With ``align``, the first tick of an interval is aligned on the wall
+    clock: pulls then happen every ``interval`` seconds, shifted from the
+    interval boundaries (e.g. every minute on the minute) by a phase which
+    is specific to the host. Hence the agents of a deployment do not all
+    pull (and send) at the same time, while each of them sticks to
+    predictable grid points. ``phase_spread`` is the fraction of the
+    interval over which the phases of the hosts are spread, 0 meaning that
+    they all pull right on the interval boundaries.
+
+    Each tick carries the time of its grid point on the wall clock, which is
+    handed over to the drivers it pulls: all the measurements of a tick then
+    share the same timestamp, whatever the time each pull took to start.
+    """
+
+    def __init__(self, max_workers=4, on_tick_done=None, max_async_pulls=100,
+                 align=True, phase_spread=1., host=HOSTNAME,
+                 snapshot_cache=None):
+        """
+        :param max_workers: Maximum number of concurrent pulls
+        :type max_workers: int
+        :param on_tick_done: Called with the :class:`Tick` instance once all
+            its pulls are over
+        :type on_tick_done: callable
+        :param max_async_pulls: Maximum number of concurrent coroutine pulls
+        :type max_async_pulls: int
+        :param align: Whether the ticks are aligned on the wall clock
+        :type align: bool
+        :param phase_spread: Fraction of the interval over which the phases
+            of the hosts are spread
+        :type phase_spread: float
+        :param host: The host name the phase derives from
+        :type host: str
+        :param snapshot_cache: The cache whose snapshots expire with each
+            tick
+        :type snapshot_cache: :class:`SnapshotCache` instance
+        """
+        super(Scheduler, self).__init__()
+        self.daemon = True
+        self.on_tick_done = on_tick_done
+        self.max_async_pulls = max_async_pulls
+        self.align = align
+        self.phase = get_host_phase(host) * phase_spread
+        self.snapshot_cache = snapshot_cache
+
+        self.pool = WorkerPool(max_workers)
+        self.event_loop = None
+        self._tasks = {}  # Driver key -> task
+        self._groups = {}  # Interval -> list of tasks
+        self._heap = []  # (Due time, sequence, interval)
+        self._deadlines = []  # (Deadline, sequence, task, generation)
+        self._sequence = itertools.count()
+        self._condition = Condition()
+        self._terminated = False
+
+    @property
+    def terminated(self):
+        return self._terminated
+
+    @terminated.setter
+    def terminated(self, value):
+        self._terminated = value
+
+    @property
+    def tasks(self):
+        return dict(self._tasks)
+
+    def is_scheduled(self, key):
+        return key in self._tasks
+
+    def schedule(self, driver):
+        """Schedules the periodic pulls of a driver, starting right away
+
+        :param driver: The driver to pull from
+        :type driver: :class:`MetricPuller` instance
+        """
+        with self._condition:
+            task = ScheduledTask(driver)
+            self._tasks[driver.key] = task
+            group = self._groups.get(task.interval)
+            if group is None:
+                group = self._groups[task.interval] = []
+                self._push(self.get_first_due(task.interval), task.interval)
+            group.append(task)
+            self._condition.notify()
+
+    def unschedule(self, key):
+        with self._condition:
+            task = self._tasks.pop(key, None)
+            if task is not None:
+                # An empty group is discarded when it is next due
+                self._groups[task.interval].remove(task)
+
+    def get_first_due(self, interval):
+        """
+        :return: When (on the monotonic clock) the first tick is due
+        :rtype: float
+        """
+        now = _now()
+        if not self.align:
+            return now
+        # Time elapsed since the last grid point of this host
+        elapsed = (_epoch() - self.phase * interval) % interval
+        return now + (interval - elapsed) % interval
+
+    def get_tick_timestamp(self, due, interval, now=None):
+        """
+        :param due: When (on the monotonic clock) the tick is due
+        :type due: float
+        :param interval: The interval of the tick
+        :type interval: float
+        :param now: The current time on the monotonic clock, if known
+        :type now: float
+        :return: The time of the tick on the wall clock, snapped to the
+            grid of this host when aligned (nanoseconds since the epoch)
+        :rtype: int
+        """
+        if now is None:
+            now = _now()
+        epoch = _epoch() - (now - due)
+        if self.align:
+            # Gets rid of the drift between the wall and monotonic clocks
+            offset = self.phase * interval
+            epoch = round((epoch - offset) / interval) * interval + offset
+        return int(round(epoch * 10 ** 9))
+
+    def _push(self, due, interval):
+        heapq.heappush(self._heap, (due, next(self._sequence), interval))
+
+    def run(self):
+        self.pool.start()
+        while not self.terminated:
+            try:
+                due_tasks = self._wait_for_tick()
+                if due_tasks is not None:
+                    self._run_tick(*due_tasks)
+            except Exception as exc:
+                LOG.exception(exc)
+
+    def stop(self):
+        with self._condition:
+            self.terminated = True
+            self._condition.notify()
+        if self.is_alive():
+            self.join()
+        # Waits for the pulls in progress
+        self.pool.stop()
+        if self.event_loop is not None:
+            self.event_loop.stop()
+
+    def _wait_for_tick(self):
+        with self._condition:
+            while not self.terminated:
+                now = _now()
+                timeout = self._abandon_overdue(now)
+                if not self._heap:
+                    self._condition.wait(timeout)
+                    continue
+                due, _, interval = self._heap[0]
+                if due > now:
+                    if timeout is None or timeout > due - now:
+                        timeout = due - now
+                    self._condition.wait(timeout)
+                    continue
+
+                heapq.heappop(self._heap)
+                tasks = self._groups.get(interval)
+                if not tasks:
+                    del self._groups[interval]
+                    continue
+
+                next_due = due + interval
+                if next_due <= now:
+                    # We are late (e.g. the host was suspended): we do not
+                    # try to catch up with the missed ticks
+                    missed = math.ceil((now - next_due) / float(interval))
+                    next_due += max(missed, 1) * interval
+                self._push(next_due, interval)
+                if self.snapshot_cache is not None:
+                    self.snapshot_cache.start_tick(due)
+                # The last grid point, should this tick be late
+                timestamp = self.get_tick_timestamp(
+                    next_due - interval, interval, now)
+                return interval, list(tasks), timestamp
+        return None
+
+    def _abandon_overdue(self, now):
+        """Must be called while holding the condition lock
+
+        :return: The time to wait for until the next deadline (None if none)
+        """
+        while self._deadlines:
+            deadline, _, task, generation = self._deadlines[0]
+            if task.generation != generation or not task.running:
+                heapq.heappop(self._deadlines)  # Over in time
+                continue
+            if deadline > now:
+                return deadline - now
+
+            heapq.heappop(self._deadlines)
+            LOG.warning("[%s] Pull abandoned after %ss", task.key,
+                        task.pull_timeout)
+            worker = task.worker
+            task.abandon()
+            if worker is not None:
+                self.pool.retire(worker)
+            task.tick.task_done()
+        return None
+
+    def _run_tick(self, interval, tasks, timestamp=None):
+        due_tasks = []
+        for task in tasks:
+            if task.running:
+                task.stats.skipped_ticks += 1
+                LOG.debug("[%s] Previous pull still running: skipped",
+                          task.key)
+                continue
+            if task.is_stuck:
+                task.stats.skipped_ticks += 1
+                LOG.warning("[%s] Abandoned pull still running: skipped",
+                            task.key)
+                continue
+            due_tasks.append(task)
+
+        if not due_tasks:
+            return
+        tick = Tick(interval, due_tasks, self._tick_done, timestamp)
+        for task in due_tasks:
+            if task.driver.is_coroutine:
+                self._submit_coroutine(task, tick)
+            else:
+                self._submit_task(task, tick)
+
+    def _submit_task(self, task, tick):
+        with self._condition:
+            generation = task.start(tick)
+            if task.deadline is not None:
+                heapq.heappush(self._deadlines, (
+                    task.deadline, next(self._sequence), task, generation))
+        self.pool.submit(self._run_task, task, generation)
+
+    def _run_task(self, task, generation):
+        with self._condition:
+            if task.generation != generation:
+                # Abandoned while waiting for a worker
+                return
+            task.worker = current_thread()
+            timestamp = task.tick.timestamp
+
+        try:
+            measurements = task.driver.pull_data(timestamp)
+            if task.generation == generation:
+                # Generators keep on pulling while their chunks are sent
+                task.driver.process_pulled_data(
+                    measurements,
+                    is_abandoned=lambda: task.generation != generation)
+            else:
+                LOG.warning("[%s] Measurements of an abandoned pull "
+                            "discarded", task.key)
+        except PullTimeout as exc:
+            # Driver processes enforce their timeout on their own
+            if task.generation == generation:
+                task.stats.timeouts += 1
+                task.driver.log_pull_error(exc)
+        except Exception as exc:
+            task.stats.errors += 1
+            task.driver.log_pull_error(exc)
+        finally:
+            self._finish(task, generation)
+
+    def _finish(self, task, generation):
+        with self._condition:
+            if task.stuck_worker is current_thread():
+                # Back from an abandoned pull: the driver may be pulled again
+                task.stuck_worker = None
+            finished = task.finish(generation)
+        if finished:
+            task.tick.task_done()
+
+    def _submit_coroutine(self, task, tick):
+        if self.event_loop is None:
+            self.event_loop = EventLoop(self.max_async_pulls)
+            self.event_loop.start()
+        with self._condition:
+            generation = task.start(tick)
+        # The event loop is in charge of the timeout of coroutines
+        self.event_loop.submit(
+            functools.partial(task.driver.pull_data, tick.timestamp),
+            task.pull_timeout,
+            functools.partial(self._coroutine_done, task, generation))
+
+    def _coroutine_done(self, task, generation, measurements, exc):
+        """Called from the event loop thread"""
+        try:
+            if isinstance(exc, PullTimeout):
+                task.stats.timeouts += 1
+                task.driver.log_pull_error(exc)
+            elif exc is not None:
+                task.stats.errors += 1
+                task.driver.log_pull_error(exc)
+            else:
+                task.driver.process_pulled_data(measurements)
+        finally:
+            self._finish(task, generation)
+
+    def _tick_done(self, tick):
+        if self.on_tick_done is not None:
+            self.on_tick_done(tick)
@@ -0,0 +1,292 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Decouples the drivers from the network by buffering their measurements"""
+
+from __future__ import unicode_literals
+
+from collections import deque
+from threading import Condition
+from threading import Thread
+import time
+
+from oslo_log import log
+from watcher_metering.protocol.frame import CODEC_GORILLA
+from watcher_metering.protocol.frame import CODEC_MSGPACK
+from watcher_metering.protocol.frame import CODECS
+from watcher_metering.protocol.frame import pack_compressed_frame
+from watcher_metering.protocol.frame import pack_frame
+from watcher_metering.protocol.frame import pack_record
+from watcher_metering.protocol.frame import pack_series_frame
+
+LOG = log.getLogger(__name__)
+
+_now = getattr(time, "monotonic", time.time)
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST)
+
+
+class SenderStats(object):
+    """Counters exposed by the :class:`MeasurementSender`"""
+
+    def __init__(self):
+        self.measurements_queued = 0
+        self.measurements_dropped = 0
+        self.measurements_sent = 0
+        self.frames_sent = 0
+        self.series_registered = 0
+        self.send_retries = 0
+        self.send_errors = 0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+class MeasurementSender(Thread):
+    """Coalesces the measurements of all the drivers into frames
+
+    Drivers push their (already packed) measurements into a bounded outbox
+    and return straight away. A dedicated thread then flushes the outbox
+    into frames as soon as either ``frame_max_measurements`` measurements
+    are waiting or the oldest one has been waiting for ``frame_max_delay``
+    seconds.
+
+    The actual sending is delegated to ``send_frame`` which must not block:
+    it returns False if the frame could not be sent right away, in which
+    case the same frame is retried after ``retry_interval`` seconds while
+    the outbox keeps on buffering the new measurements.
+
+    If a ``registry`` is given, series frames are sent (version 3, or version
+    4 when using the 'gorilla' codec), otherwise records frames (version 2)
+    are.
+    """
+
+    def __init__(self, send_frame, outbox_size=10000,
+                 overflow_policy=DROP_OLDEST, frame_max_measurements=500,
+                 frame_max_delay=.5, retry_interval=.1, registry=None,
+                 codec=CODEC_MSGPACK):
+        """
+        :param send_frame: Non-blocking callable sending an encoded frame
+        :type send_frame: callable returning a bool
+        :param outbox_size: Maximum number of measurements to buffer
+        :type outbox_size: int
+        :param overflow_policy: What to discard when the outbox is full,
+            either 'drop_oldest' or 'drop_newest'
+        :type overflow_policy: str
+        :param frame_max_measurements: Maximum number of measurements per
+            frame
+        :type frame_max_measurements: int
+        :param frame_max_delay: Maximum time (in seconds) a measurement may
+            wait in the outbox before being sent
+        :type frame_max_delay: float
+        :param retry_interval: Time (in seconds) to wait before trying to
+            send a frame again when the socket is not ready
+        :type retry_interval: float
+        :param registry: Registry of the series sent by this agent
+        :type registry: :class:`SeriesRegistry` instance
+        :param codec: How the samples of the series frames are encoded,
+            either 'msgpack' or 'gorilla'
+        :type codec: str
+        """
+        super(MeasurementSender, self).__init__()
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError("Invalid overflow policy `%s`" % overflow_policy)
+        if codec not in CODECS:
+            raise ValueError("Invalid codec `%s`" % codec)
+
+        self.send_frame = send_frame
+        self.outbox_size = outbox_size
+        self.overflow_policy = overflow_policy
+        self.frame_max_measurements = frame_max_measurements
+        self.frame_max_delay = frame_max_delay
+        self.retry_interval = retry_interval
+        self.registry = registry
+        self.codec = codec
+
+        self.stats = SenderStats()
+        self.daemon = True
+
+        self._outbox = deque()
+        self._oldest_timestamp = None
+        self._condition = Condition()
+        self._pending_frame = None
+        self._kicked = False
+        self._reported_drops = 0
+        self._terminated = False
+
+    @property
+    def terminated(self):
+        return self._terminated
+
+    @terminated.setter
+    def terminated(self, value):
+        self._terminated = value
+
+    @property
+    def outbox_length(self):
+        return len(self._outbox)
+
+    def put(self, packed_measurements):
+        """Buffers measurements without ever waiting on the network
+
+        :param packed_measurements: Measurements encoded by
+            :meth:`watcher_metering.agent.measurement.Measurement.as_sample`
+        :type packed_measurements: list of (bytes, timestamp, value) tuples
+        """
+        with self._condition:
+            for packed_measurement in packed_measurements:
+                if len(self._outbox) >= self.outbox_size:
+                    self.stats.measurements_dropped += 1
+                    if self.overflow_policy == DROP_NEWEST:
+                        continue
+                    self._outbox.popleft()
+                self._outbox.append(packed_measurement)
+                self.stats.measurements_queued += 1
+
+            if self._outbox and self._oldest_timestamp is None:
+                self._oldest_timestamp = _now()
+            if len(self._outbox) >= self.frame_max_measurements:
+                self._condition.notify()
+
+    def kick(self):
+        """Sends what is in the outbox without waiting any longer
+
+        Called once the drivers pulled within the same tick are done so
+        that their measurements are sent together.
+        """
+        with self._condition:
+            if self._outbox:
+                self._kicked = True
+                self._condition.notify()
+
+    def run(self):
+        while not self.terminated:
+            if self._pending_frame is None:
+                self._pending_frame = self._wait_for_frame()
+            if self._pending_frame is not None:
+                self._flush_pending_frame()
+            self._report_drops()
+
+    def flush(self):
+        """Sends whatever is buffered (best effort)
+
+        Should not be called while the sender thread is running.
+        """
+        while True:
+            if self._pending_frame is None:
+                with self._condition:
+                    self._pending_frame = self._pop_frame()
+            if self._pending_frame is None:
+                break
+            if not self._send_pending_frame():
+                break
+
+    def stop(self):
+        with self._condition:
+            self.terminated = True
+            self._condition.notify()
+        if self.is_alive():
+            self.join()
+        self.flush()
+
+    def _wait_for_frame(self):
+        with self._condition:
+            while not self.terminated:
+                outbox_length = len(self._outbox)
+                if outbox_length >= self.frame_max_measurements:
+                    break
+                if self._kicked and outbox_length:
+                    break
+                if outbox_length:
+                    waited = _now() - self._oldest_timestamp
+                    if waited >= self.frame_max_delay:
+                        break
+                    self._condition.wait(self.frame_max_delay - waited)
+                else:
+                    self._condition.wait(self.frame_max_delay)
+
+            frame = self._pop_frame()
+            if not self._outbox:
+                self._kicked = False
+            return frame
+
+    def _pop_frame(self):
+        """Must be called while holding the condition lock"""
+        if not self._outbox:
+            return None
+
+        count = min(len(self._outbox), self.frame_max_measurements)
+        packed_measurements = [self._outbox.popleft() for _ in range(count)]
+        if not self._outbox:
+            self._oldest_timestamp = None
+        # Otherwise, the remaining measurements are at least as old as the
+        # ones we just popped so we keep the same reference timestamp
+
+        # The frame is encoded once and for all so that a retried frame
+        # carries the very same series registrations
+        return self._build_frame(packed_measurements), count
+
+    def _build_frame(self, packed_measurements):
+        if self.registry is None:
+            return pack_frame([pack_record(*packed_measurement)
+                               for packed_measurement in packed_measurements])
+
+        registrations, samples = self.registry.encode(packed_measurements)
+        self.stats.series_registered += len(registrations)
+        if self.codec == CODEC_GORILLA:
+            return pack_compressed_frame(self.registry.session_id,
+                                         registrations, samples)
+        return pack_series_frame(self.registry.session_id,
+                                 registrations, samples)
+
+    def _flush_pending_frame(self):
+        while self._pending_frame is not None and not self.terminated:
+            if self._send_pending_frame():
+                break
+            self.stats.send_retries += 1
+            time.sleep(self.retry_interval)
+
+    def _send_pending_frame(self):
+        """Tries to send the pending frame once
+
+        :return: False if the frame has to be sent again later
+        """
+        frame, count = self._pending_frame
+        try:
+            if not self.send_frame(frame):
+                return False
+        except Exception as exc:
+            # This frame will never make it so we discard it
+            LOG.exception(exc)
+            self.stats.send_errors += 1
+            self.stats.measurements_dropped += count
+            if self.registry is not None:
+                # Along with the series it may have registered
+                self.registry.forget()
+        else:
+            self.stats.frames_sent += 1
+            self.stats.measurements_sent += count
+        self._pending_frame = None
+        return True
+
+    def _report_drops(self):
+        dropped = self.stats.measurements_dropped
+        if dropped != self._reported_drops:
+            LOG.warning("[Agent] %d measurement(s) dropped (%d in total)",
+                        dropped - self._reported_drops, dropped)
+            self._reported_drops = dropped
@@ -0,0 +1,102 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Shares what the drivers read (e.g. procfs files) within a same tick"""
+
+from __future__ import unicode_literals
+
+from threading import Lock
+
+
+class SnapshotCache(object):
+    """Agent-wide cache of the sources read by the drivers during a tick
+
+    A source (e.g. ``/proc/stat``) is read (and parsed) by the first driver
+    asking for it within a tick: the other drivers pulled within the same
+    tick get the very same snapshot. The ticks of the different intervals
+    which are due at the same time (within ``tolerance`` seconds) share
+    their snapshots as well.
+
+    Snapshots are shared between threads and must therefore not be
+    modified by the drivers.
+    """
+
+    def __init__(self, tolerance=.05):
+        """
+        :param tolerance: Maximum time (in seconds) between the due times of
+            two ticks sharing their snapshots
+        :type tolerance: float
+        """
+        self.tolerance = tolerance
+        self.hits = 0
+        self.misses = 0
+
+        self._tick = 0
+        self._tick_due = None
+        self._snapshots = {}  # key -> snapshot of the current tick
+        self._key_locks = {}  # key -> lock held while reading the source
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._snapshots)
+
+    def start_tick(self, due):
+        """Expires the snapshots unless the tick is due with the last one
+
+        :param due: When (on the monotonic clock) the tick is due
+        :type due: float
+        """
+        with self._lock:
+            if self._tick_due is not None:
+                if abs(due - self._tick_due) <= self.tolerance:
+                    return
+            self._tick += 1
+            self._tick_due = due
+            self._snapshots.clear()
+
+    def get(self, key, load):
+        """Returns the snapshot of a source, read on first use in the tick
+
+        Concurrent requests for the same source wait for a single read.
+
+        :param key: Identifies the source (e.g. the path of a file)
+        :param load: Called without arguments to read the source
+        :type load: callable
+        :return: What ``load`` returned
+        """
+        with self._lock:
+            try:
+                snapshot = self._snapshots[key]
+                self.hits += 1
+                return snapshot
+            except KeyError:
+                key_lock = self._key_locks.setdefault(key, Lock())
+
+        with key_lock:
+            with self._lock:
+                tick = self._tick
+                if key in self._snapshots:
+                    # Read by another driver in the meantime
+                    self.hits += 1
+                    return self._snapshots[key]
+
+            snapshot = load()
+            with self._lock:
+                self.misses += 1
+                # Nothing is kept out of a tick, as nothing would expire it
+                if tick and self._tick == tick:
+                    self._snapshots[key] = snapshot
+            return snapshot
@@ -30,8 +30,11 @@ class RandomDataPuller(MetricPuller):
     This is a demo drivers which shows how a driver should be implemented in
     order to gather data from a source
     """
-    def __init__(self, title, probe_id, interval, static_data):
-        super(RandomDataPuller, self).__init__(title, probe_id, interval)
+    def __init__(self, title, probe_id, interval, static_data, **kwargs):
+        # The other base options (pull_timeout, aggregation_window...) are
+        # handled by MetricPuller itself
+        super(RandomDataPuller, self).__init__(
+            title, probe_id, interval, **kwargs)
         self.static_data = static_data
 
     @classmethod
@@ -0,0 +1,400 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals
+
+import errno
+import os
+import re
+
+from oslo_config import cfg
+from oslo_log import log
+from watcher_metering.agent.measurement import HOSTNAME
+from watcher_metering.agent.measurement import MeasurementTemplate
+from watcher_metering.drivers.linux.procfs import get_fd_capacity
+from watcher_metering.drivers.linux.procfs import get_field
+from watcher_metering.drivers.linux.procfs import is_fd_exhausted
+from watcher_metering.drivers.linux.procfs import ProcFile
+from watcher_metering.drivers.linux.procfs import ProcfsMetricPuller
+
+LOG = log.getLogger(__name__)
+
+CGROUP_SERIES = (
+    ("compute.cgroup.cpu.percent", "%"),
+    ("compute.cgroup.memory.usage", "B"),
+    ("compute.cgroup.io.read.bytes.rate", "B/s"),
+    ("compute.cgroup.io.write.bytes.rate", "B/s"),
+)
+
+# Scopes of the containers and VMs, either from systemd (e.g.
+# machine.slice/machine-qemu\x2d1\x2dinstance.scope) or from the cgroupfs
+# layouts of Docker, LXC and libvirt
+DEFAULT_CGROUP_PATTERN = r"\.scope$|^(docker|lxc|machine)/[^/]+$"
+
+
+def parse_io_stat(data):
+    """Sums the bytes read and written over the devices of an io.stat file
+
+    :param data: Lines such as ``8:0 rbytes=4096 wbytes=0 rios=1 ...``
+    :type data: bytes
+    :return: The bytes read and written
+    :rtype: tuple
+    """
+    read_bytes = write_bytes = 0
+    for field in data.split():
+        if field.startswith(b"rbytes="):
+            read_bytes += int(field[7:])
+        elif field.startswith(b"wbytes="):
+            write_bytes += int(field[7:])
+    return read_bytes, write_bytes
+
+
+def parse_blkio_bytes(data):
+    """Sums the bytes read and written over the devices of a
+    blkio.throttle.io_service_bytes file (cgroup v1)
+
+    :param data: Lines such as ``8:0 Read 4096``
+    :type data: bytes
+    :return: The bytes read and written
+    :rtype: tuple
+    """
+    read_bytes = write_bytes = 0
+    for line in data.splitlines():
+        fields = line.split()
+        if len(fields) != 3:
+            continue  # e.g. the Total line
+        if fields[1] == b"Read":
+            read_bytes += int(fields[2])
+        elif fields[1] == b"Write":
+            write_bytes += int(fields[2])
+    return read_bytes, write_bytes
+
+
+class _Directory(object):
+
+    __slots__ = ("depth", "signature", "children")
+
+    def __init__(self, depth):
+        self.depth = depth
+        self.signature = None
+        self.children = set()
+
+
+class CgroupTree(object):
+    """The cgroups of a hierarchy, discovered incrementally
+
+    Rather than walking the whole hierarchy on each refresh, only the
+    directories whose modification time or link count changed (i.e. whose
+    subdirectories were created or removed) get listed again.
+    """
+
+    def __init__(self, root, max_depth):
+        """
+        :param root: Mount point of the hierarchy
+        :type root: str
+        :param max_depth: Depth of the deepest cgroups discovered
+        :type max_depth: int
+        """
+        self.root = root
+        self.max_depth = max_depth
+        self._directories = {}  # relative path -> _Directory
+
+    def __iter__(self):
+        return (path for path in self._directories if path)
+
+    def __len__(self):
+        return max(len(self._directories) - 1, 0)
+
+    def refresh(self):
+        """Discovers the cgroups created or removed since the last refresh
+
+        :return: The relative paths of the cgroups added and removed
+        :rtype: tuple of sets
+        """
+        added, removed = set(), set()
+        if not self._directories:
+            self._directories[""] = _Directory(0)
+        for path, directory in list(self._directories.items()):
+            if directory.depth >= self.max_depth:
+                continue  # Not listed anyway
+            if path not in self._directories:
+                continue  # Removed along with its parent
+            try:
+                stat = os.stat(os.path.join(self.root, path))
+            except OSError:
+                continue  # Removed in the meantime, noticed by its parent
+            signature = (stat.st_mtime, stat.st_nlink)
+            if signature != directory.signature:
+                directory.signature = signature
+                self._list(path, directory, added, removed)
+        return added, removed
+
+    def _list(self, path, directory, added, removed):
+        full_path = os.path.join(self.root, path)
+        try:
+            children = set(name for name in os.listdir(full_path)
+                           if os.path.isdir(os.path.join(full_path, name)))
+        except OSError:
+            children = set()
+
+        for name in directory.children - children:
+            self._remove(os.path.join(path, name), removed)
+        for name in children - directory.children:
+            child_path = os.path.join(path, name)
+            child = self._directories[child_path] = _Directory(
+                directory.depth + 1)
+            added.add(child_path)
+            if child.depth < self.max_depth:
+                try:
+                    stat = os.stat(os.path.join(self.root, child_path))
+                except OSError:
+                    continue
+                child.signature = (stat.st_mtime, stat.st_nlink)
+                self._list(child_path, child, added, removed)
+        directory.children = children
+
+    def _remove(self, path, removed):
+        directory = self._directories.pop(path)
+        removed.add(path)
+        for name in directory.children:
+            self._remove(os.path.join(path, name), removed)
+
+
+# Raised when reading the files of a cgroup which was removed
+GONE_ERRNOS = (errno.ENOENT, errno.ENODEV)
+
+
+class TrackedCgroup(object):
+    """A cgroup monitored by the driver, along with its files"""
+
+    __slots__ = ("path", "cpu_file", "memory_file", "io_file", "templates")
+
+    def __init__(self, path, cpu_file, memory_file, io_file):
+        self.path = path
+        # None if the controller is not enabled for this cgroup
+        self.cpu_file = cpu_file
+        self.memory_file = memory_file
+        self.io_file = io_file
+        self.templates = None
+
+    def close(self):
+        for cgroup_file in (self.cpu_file, self.memory_file, self.io_file):
+            if cgroup_file is not None:
+                cgroup_file.close()
+
+
+class CgroupPuller(ProcfsMetricPuller):
+    """CPU, memory and I/O usage of each container or VM, out of the
+    accounting of their cgroup (either v1 or v2)
+
+    The cgroups are discovered incrementally (see :class:`CgroupTree`) and
+    their accounting files are kept open, so that a pull costs one stat per
+    directory of the hierarchy plus one read per file monitored. All the
+    measurements of a pull are sent at once.
+
+    As each cgroup keeps up to 3 files open, ``max_cgroups`` is capped by
+    the file descriptor limit of the agent.
+    """
+
+    def __init__(self, title, probe_id, interval,
+                 cgroup_path="/sys/fs/cgroup",
+                 cgroup_pattern=DEFAULT_CGROUP_PATTERN, max_depth=4,
+                 max_cgroups=2000, **kwargs):
+        super(CgroupPuller, self).__init__(
+            title, probe_id, interval, **kwargs)
+        self.cgroup_path = cgroup_path
+        self.cgroup_pattern = None
+        if cgroup_pattern:
+            self.cgroup_pattern = re.compile(cgroup_pattern)
+        self.max_depth = max_depth
+        self.max_cgroups = max_cgroups
+        capacity = get_fd_capacity(3)
+        if capacity is not None and capacity < max_cgroups:
+            LOG.warning("[%s] The file descriptor limit only leaves room "
+                        "for %d of the %d cgroups to monitor", self.key,
+                        capacity, max_cgroups)
+            self.max_cgroups = capacity
+
+        self.unified = None  # Whether the hierarchy is cgroup v2
+        self.tree = None
+        self._monitored = set()  # Relative paths of the cgroups monitored
+        self._cgroups = {}  # relative path -> tracked cgroup
+
+    @classmethod
+    def get_config_opts(cls):
+        # The cgroups are not read through procfs
+        return cls.get_base_opts() + [
+            cfg.StrOpt(
+                'cgroup_path',
+                help="Mount point of the cgroup filesystem (that of the "
+                     "unified hierarchy with cgroup v2)",
+                default="/sys/fs/cgroup"),
+            cfg.StrOpt(
+                'cgroup_pattern',
+                help="Regular expression matching the paths (relative to "
+                     "the hierarchy) of the cgroups to monitor (all of "
+                     "them if empty)",
+                default=DEFAULT_CGROUP_PATTERN),
+            cfg.IntOpt(
+                'max_depth',
+                help="Depth of the deepest cgroups monitored",
+                default=4, min=1),
+            cfg.IntOpt(
+                'max_cgroups',
+                help="Maximum number of cgroups monitored, whose files are "
+                     "kept open (capped by the file descriptor limit)",
+                default=2000, min=1),
+        ]
+
+    @classmethod
+    def get_name(cls):
+        return "cgroups"
+
+    @classmethod
+    def get_default_probe_id(cls):
+        return "compute.cgroup"
+
+    def collect(self, timestamp, now):
+        if self.tree is None:
+            self.unified = os.path.exists(
+                os.path.join(self.cgroup_path, "cgroup.controllers"))
+            root = self.cgroup_path
+            if not self.unified:
+                root = os.path.join(self.cgroup_path, "cpuacct")
+            self.tree = CgroupTree(root, self.max_depth)
+
+        added, removed = self.tree.refresh()
+        for path in removed:
+            self._forget(path)
+            self._monitored.discard(path)
+        for path in sorted(added):
+            if self.cgroup_pattern and not self.cgroup_pattern.search(path):
+                continue
+            if len(self._monitored) >= self.max_cgroups:
+                LOG.warning("[%s] Already %d cgroups monitored: ignoring %s",
+                            self.key, self.max_cgroups, path)
+                continue
+            self._monitored.add(path)
+
+        measurements = []
+        fds_exhausted = False
+        for path in self._monitored:
+            cgroup = self._cgroups.get(path)
+            try:
+                if cgroup is None:
+                    if fds_exhausted:
+                        continue  # Tracked on a later pull
+                    cgroup = self._cgroups[path] = self._track(path)
+                self._add_usage(cgroup, timestamp, now, measurements)
+            except (IOError, OSError) as exc:
+                if is_fd_exhausted(exc):
+                    LOG.error("[%s] Could not open the files of %s, nor "
+                              "those of the other new cgroups: %s",
+                              self.key, path, exc)
+                    fds_exhausted = True
+                elif exc.errno in GONE_ERRNOS:
+                    # Being removed, or removed and created again: its files
+                    # are reopened on the next pull if it is still there
+                    self._forget(path)
+                else:
+                    LOG.warning("[%s] Could not read the usage of %s: %s",
+                                self.key, path, exc)
+        return measurements
+
+    def stop(self):
+        super(CgroupPuller, self).stop()
+        for cgroup in self._cgroups.values():
+            cgroup.close()
+        self._cgroups.clear()
+
+    def _forget(self, path):
+        cgroup = self._cgroups.pop(path, None)
+        if cgroup is not None:
+            cgroup.close()
+        self.rates.forget([(path, "cpu"), (path, "read"), (path, "write")])
+
+    def _get_file_paths(self, path):
+        if self.unified:
+            directory = os.path.join(self.cgroup_path, path)
+            return (os.path.join(directory, "cpu.stat"),
+                    os.path.join(directory, "memory.current"),
+                    os.path.join(directory, "io.stat"))
+        return (
+            os.path.join(self.cgroup_path, "cpuacct", path, "cpuacct.usage"),
+            os.path.join(self.cgroup_path, "memory", path,
+                         "memory.usage_in_bytes"),
+            os.path.join(self.cgroup_path, "blkio", path,
+                         "blkio.throttle.io_service_bytes"))
+
+    def _track(self, path):
+        cpu_path, memory_path, io_path = self._get_file_paths(path)
+        cgroup = TrackedCgroup(path, ProcFile(cpu_path, buffer_size=512),
+                               None, None)
+        try:
+            cgroup.cpu_file.read()  # Fails if the cgroup is already gone
+            cgroup.memory_file = self._open(memory_path)
+            cgroup.io_file = self._open(io_path)
+        except Exception:
+            cgroup.close()
+            raise
+        return cgroup
+
+    @staticmethod
+    def _open(path):
+        cgroup_file = ProcFile(path, buffer_size=512)
+        try:
+            cgroup_file.read()
+        except (IOError, OSError) as exc:
+            if is_fd_exhausted(exc):
+                raise
+            return None  # Controller not enabled
+        return cgroup_file
+
+    def _add_usage(self, cgroup, timestamp, now, measurements):
+        if cgroup.templates is None:
+            cgroup.templates = self._create_templates(cgroup.path)
+        cpu, memory, read_rate, write_rate = cgroup.templates
+
+        data = cgroup.cpu_file.read()
+        if self.unified:
+            cpu_time = get_field(data, b"usage_usec") / 1e6
+        else:
+            cpu_time = int(data) / 1e9
+        cpu_rate = self.rates.update((cgroup.path, "cpu"), cpu_time, now)
+        if cpu_rate is not None:
+            measurements.append(cpu.create(100. * cpu_rate, timestamp))
+
+        if cgroup.memory_file is not None:
+            measurements.append(memory.create(
+                int(cgroup.memory_file.read()), timestamp))
+
+        if cgroup.io_file is not None:
+            parse = parse_io_stat if self.unified else parse_blkio_bytes
+            read_bytes, write_bytes = parse(cgroup.io_file.read())
+            for template, key, value in ((read_rate, "read", read_bytes),
+                                         (write_rate, "write", write_bytes)):
+                rate = self.rates.update((cgroup.path, key), value, now)
+                if rate is not None:
+                    measurements.append(template.create(rate, timestamp))
+
+    @staticmethod
+    def _create_templates(path):
+        # Not kept by the driver as the cgroups come and go
+        resource_id = "%s_%s" % (HOSTNAME, path)
+        metadata = {"cgroup": "/" + path}
+        return [MeasurementTemplate(name, unit, "gauge", resource_id,
+                                    resource_metadata=metadata)
+                for name, unit in CGROUP_SERIES]
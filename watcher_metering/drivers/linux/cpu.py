@@ -0,0 +1,108 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals
+
+from oslo_config import cfg
+from watcher_metering.drivers.linux.procfs import get_field
+from watcher_metering.drivers.linux.procfs import ProcfsMetricPuller
+
+CPU_SERIES = (
+    ("compute.node.cpu.percent", "%"),
+    ("compute.node.cpu.user.percent", "%"),
+    ("compute.node.cpu.system.percent", "%"),
+    ("compute.node.cpu.iowait.percent", "%"),
+    ("compute.node.cpu.steal.percent", "%"),
+)
+ACTIVITY_SERIES = (
+    ("compute.node.context_switches.rate", "switch/s"),
+    ("compute.node.forks.rate", "process/s"),
+)
+
+
+class CpuPuller(ProcfsMetricPuller):
+    """Percentages of CPU time spent by mode, out of /proc/stat"""
+
+    def __init__(self, title, probe_id, interval, per_cpu=False, **kwargs):
+        super(CpuPuller, self).__init__(title, probe_id, interval, **kwargs)
+        self.per_cpu = per_cpu
+        self._last_times = {}  # CPU -> times of the previous pull
+
+    @classmethod
+    def get_config_opts(cls):
+        return super(CpuPuller, cls).get_config_opts() + [
+            cfg.BoolOpt(
+                'per_cpu',
+                help="Whether the usage of each CPU is sent along with the "
+                     "overall one",
+                default=False),
+        ]
+
+    @classmethod
+    def get_name(cls):
+        return "cpu"
+
+    @classmethod
+    def get_default_probe_id(cls):
+        return "compute.node.cpu"
+
+    def collect(self, timestamp, now):
+        data = self.read_proc_file("stat")
+        measurements = []
+
+        # The overall usage comes first, followed by that of each CPU
+        end = data.index(b"\n")
+        self._add_usage(None, data[:end], timestamp, measurements)
+        if self.per_cpu:
+            for line in data[end + 1:].split(b"\n"):
+                if not line.startswith(b"cpu"):
+                    break
+                cpu = line[:line.index(b" ")].decode("ascii")
+                self._add_usage(cpu, line, timestamp, measurements)
+
+        templates = self.get_templates(None, ACTIVITY_SERIES)
+        counters = (get_field(data, b"ctxt "),
+                    get_field(data, b"processes "))
+        for template, counter in zip(templates, counters):
+            if counter is None:
+                continue
+            rate = self.rates.update(template.name, counter, now)
+            if rate is not None:
+                measurements.append(template.create(rate, timestamp))
+        return measurements
+
+    def _add_usage(self, cpu, line, timestamp, measurements):
+        # user nice system idle iowait irq softirq steal (in ticks),
+        # guest times being accounted for in user times already
+        times = [int(field) for field in line.split()[1:9]]
+        last_times = self._last_times.get(cpu)
+        self._last_times[cpu] = times
+        if last_times is None or len(last_times) != len(times):
+            return
+
+        deltas = [time_ - last for time_, last in zip(times, last_times)]
+        total = sum(deltas)
+        if total <= 0 or len(deltas) < 8:
+            return
+        user, nice, system, idle, iowait, irq, softirq, steal = deltas
+        values = (total - idle - iowait, user + nice,
+                  system + irq + softirq, iowait, steal)
+
+        metadata = {"cpu": cpu} if cpu is not None else None
+        templates = self.get_templates(cpu, CPU_SERIES, metadata)
+        for template, value in zip(templates, values):
+            measurements.append(template.create(100. * value / total,
+                                                timestamp))
@@ -0,0 +1,124 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals
+
+import re
+
+from oslo_config import cfg
+from watcher_metering.drivers.linux.procfs import ProcfsMetricPuller
+
+DISK_SERIES = (
+    ("compute.node.disk.read.bytes.rate", "B/s"),
+    ("compute.node.disk.write.bytes.rate", "B/s"),
+    ("compute.node.disk.read.requests.rate", "request/s"),
+    ("compute.node.disk.write.requests.rate", "request/s"),
+    ("compute.node.disk.busy.percent", "%"),
+)
+
+SECTOR_SIZE = 512  # The unit of the sector counters, whatever the device
+
+# Index (among the fields following the device name) and scale of the
+# counter of each series: reads and writes completed, sectors read and
+# written, and milliseconds spent doing I/Os
+DISK_COUNTERS = ((2, SECTOR_SIZE), (6, SECTOR_SIZE), (0, 1), (4, 1), (9, .1))
+
+
+class DiskPuller(ProcfsMetricPuller):
+    """I/O throughput and utilization of each block device, out of
+    /proc/diskstats
+    """
+
+    def __init__(self, title, probe_id, interval, devices=None,
+                 exclude_devices=None, **kwargs):
+        super(DiskPuller, self).__init__(title, probe_id, interval, **kwargs)
+        self.devices = set(devices or [])
+        self.exclude_devices = None
+        if exclude_devices:
+            self.exclude_devices = re.compile(exclude_devices)
+        self._names = {}  # raw device name -> name (None if excluded)
+        self._known_devices = set()
+
+    @classmethod
+    def get_config_opts(cls):
+        return super(DiskPuller, cls).get_config_opts() + [
+            cfg.ListOpt(
+                'devices',
+                help="Block devices to monitor (all of them if empty)",
+                default=[]),
+            cfg.StrOpt(
+                'exclude_devices',
+                help="Regular expression matching the names of the block "
+                     "devices not to monitor",
+                default=r"^(loop|ram)\d+$"),
+        ]
+
+    @classmethod
+    def get_name(cls):
+        return "disk_io"
+
+    @classmethod
+    def get_default_probe_id(cls):
+        return "compute.node.disk"
+
+    def collect(self, timestamp, now):
+        measurements = []
+        seen = set()
+        seen_names = set()
+        for line in self.read_proc_file("diskstats").splitlines():
+            fields = line.split()
+            if len(fields) < 14:
+                continue
+            seen_names.add(fields[2])
+            device = self._get_device(fields[2])
+            if device is None:
+                continue
+            seen.add(device)
+
+            templates = self.get_templates(device, DISK_SERIES,
+                                           {"device": device})
+            for index, (template, (field, scale)) in enumerate(
+                    zip(templates, DISK_COUNTERS)):
+                rate = self.rates.update((device, index),
+                                         int(fields[3 + field]), now)
+                if rate is not None:
+                    measurements.append(template.create(rate * scale,
+                                                        timestamp))
+
+        gone = self._known_devices - seen
+        if gone:
+            self.rates.forget((device, index) for device in gone
+                              for index in range(len(DISK_COUNTERS)))
+            self.forget_templates(gone)
+        if len(self._names) > len(seen_names):
+            # Including the excluded devices gone
+            self._names = {raw_name: self._names[raw_name]
+                           for raw_name in seen_names}
+        self._known_devices = seen
+        return measurements
+
+    def _get_device(self, raw_name):
+        try:
+            return self._names[raw_name]
+        except KeyError:
+            pass
+
+        device = raw_name.decode("utf-8")
+        excluded = self.devices and device not in self.devices
+        if self.exclude_devices is not None:
+            excluded = excluded or self.exclude_devices.match(device)
+        self._names[raw_name] = None if excluded else device
+        return self._names[raw_name]
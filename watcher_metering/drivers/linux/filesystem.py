@@ -0,0 +1,134 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals
+
+import os
+import re
+
+from oslo_config import cfg
+from oslo_log import log
+import six
+from watcher_metering.drivers.linux.procfs import ProcfsMetricPuller
+
+LOG = log.getLogger(__name__)
+
+FILESYSTEM_SERIES = (
+    ("compute.node.filesystem.total", "B"),
+    ("compute.node.filesystem.used", "B"),
+    ("compute.node.filesystem.available", "B"),
+    ("compute.node.filesystem.percent", "%"),
+    ("compute.node.filesystem.inodes.percent", "%"),
+)
+
+# Characters such as spaces are octal-escaped within /proc/self/mounts
+_ESCAPED = re.compile(r"\\([0-7]{3})")
+
+
+def unescape_mount_point(raw_mount_point):
+    """
+    :param raw_mount_point: A mount point as found in /proc/self/mounts
+    :type raw_mount_point: bytes
+    :rtype: str
+    """
+    return _ESCAPED.sub(lambda match: six.unichr(int(match.group(1), 8)),
+                        raw_mount_point.decode("utf-8"))
+
+
+class FilesystemPuller(ProcfsMetricPuller):
+    """Space and inodes used on each mounted filesystem
+
+    The filesystems are listed out of /proc/self/mounts and their usage is
+    got with ``statvfs()``.
+    """
+
+    def __init__(self, title, probe_id, interval, mount_points=None,
+                 **kwargs):
+        super(FilesystemPuller, self).__init__(
+            title, probe_id, interval, **kwargs)
+        self.mount_points = set(mount_points or [])
+        self._mounts = None  # Content of the mount table last parsed
+        self._mount_points = []
+
+    @classmethod
+    def get_config_opts(cls):
+        return super(FilesystemPuller, cls).get_config_opts() + [
+            cfg.ListOpt(
+                'mount_points',
+                help="Mount points of the filesystems to monitor (all the "
+                     "filesystems backed by a device if empty)",
+                default=[]),
+        ]
+
+    @classmethod
+    def get_name(cls):
+        return "filesystem"
+
+    @classmethod
+    def get_default_probe_id(cls):
+        return "compute.node.filesystem"
+
+    def collect(self, timestamp, now):
+        mounts = self.read_proc_file("self/mounts")
+        if mounts != self._mounts:
+            # The mount table rarely changes: only parses it when it does
+            mount_points = self._parse_mounts(mounts)
+            self.forget_templates(
+                set(self._mount_points) - set(mount_points))
+            self._mount_points = mount_points
+            self._mounts = mounts
+
+        measurements = []
+        for mount_point in self._mount_points:
+            try:
+                stat = os.statvfs(mount_point)
+            except OSError as exc:
+                LOG.warning("[%s] Cannot stat `%s`: %s",
+                            self.key, mount_point, exc)
+                continue
+            total = stat.f_blocks * stat.f_frsize
+            used = (stat.f_blocks - stat.f_bfree) * stat.f_frsize
+            available = stat.f_bavail * stat.f_frsize
+            # Like df, the space reserved to root is not accounted for
+            usable = used + available
+            used_inodes = stat.f_files - stat.f_ffree
+            values = (total, used, available,
+                      100. * used / usable if usable else 0.,
+                      100. * used_inodes / stat.f_files
+                      if stat.f_files else 0.)
+
+            templates = self.get_templates(
+                mount_point, FILESYSTEM_SERIES, {"mount_point": mount_point})
+            for template, value in zip(templates, values):
+                measurements.append(template.create(value, timestamp))
+        return measurements
+
+    def _parse_mounts(self, mounts):
+        mount_points = []
+        devices = set()
+        for line in mounts.splitlines():
+            fields = line.split()
+            if len(fields) < 3:
+                continue
+            mount_point = unescape_mount_point(fields[1])
+            if self.mount_points:
+                if mount_point in self.mount_points:
+                    mount_points.append(mount_point)
+            elif fields[0].startswith(b"/") and fields[0] not in devices:
+                # Once per device, whatever its bind mounts
+                devices.add(fields[0])
+                mount_points.append(mount_point)
+        return mount_points
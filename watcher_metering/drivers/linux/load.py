@@ -0,0 +1,51 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals
+
+from watcher_metering.drivers.linux.procfs import ProcfsMetricPuller
+
+LOAD_SERIES = (
+    ("compute.node.load.1min", ""),
+    ("compute.node.load.5min", ""),
+    ("compute.node.load.15min", ""),
+    ("compute.node.tasks.runnable", "task"),
+    ("compute.node.tasks.total", "task"),
+)
+
+
+class LoadPuller(ProcfsMetricPuller):
+    """Load averages and task counts out of /proc/loadavg"""
+
+    @classmethod
+    def get_name(cls):
+        return "load"
+
+    @classmethod
+    def get_default_probe_id(cls):
+        return "compute.node.load"
+
+    def collect(self, timestamp, now):
+        # e.g. "0.52 0.58 0.59 2/1289 12345"
+        load1, load5, load15, tasks = self.read_proc_file(
+            "loadavg").split()[:4]
+        runnable, total = tasks.split(b"/")
+        values = (float(load1), float(load5), float(load15),
+                  int(runnable), int(total))
+        return [
+            template.create(value, timestamp) for template, value in zip(
+                self.get_templates(None, LOAD_SERIES), values)
+        ]
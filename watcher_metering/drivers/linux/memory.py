@@ -0,0 +1,85 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals
+
+import resource
+
+from watcher_metering.drivers.linux.procfs import parse_fields
+from watcher_metering.drivers.linux.procfs import ProcfsMetricPuller
+
+MEMORY_SERIES = (
+    ("compute.node.memory.total", "B"),
+    ("compute.node.memory.available", "B"),
+    ("compute.node.memory.used", "B"),
+    ("compute.node.memory.percent", "%"),
+    ("compute.node.swap.used", "B"),
+    ("compute.node.swap.percent", "%"),
+)
+PAGING_SERIES = (
+    ("compute.node.swap.in.rate", "B/s"),
+    ("compute.node.swap.out.rate", "B/s"),
+    ("compute.node.memory.major_faults.rate", "fault/s"),
+)
+
+PAGE_SIZE = resource.getpagesize()
+
+
+class MemoryPuller(ProcfsMetricPuller):
+    """Memory and swap usage out of /proc/meminfo and /proc/vmstat"""
+
+    @classmethod
+    def get_name(cls):
+        return "memory"
+
+    @classmethod
+    def get_default_probe_id(cls):
+        return "compute.node.memory"
+
+    def collect(self, timestamp, now):
+        # Parsed once per tick, whatever the drivers in need of it
+        meminfo = self.read_proc_file("meminfo", parse_fields)
+        total = meminfo[b"MemTotal:"] * 1024
+        available = meminfo.get(b"MemAvailable:")
+        if available is None:  # Linux < 3.14
+            available = sum(meminfo.get(label, 0) for label in (
+                b"MemFree:", b"Buffers:", b"Cached:"))
+        available *= 1024
+        swap_total = meminfo.get(b"SwapTotal:", 0) * 1024
+        swap_used = swap_total - meminfo.get(b"SwapFree:", 0) * 1024
+
+        used = total - available
+        values = (total, available, used,
+                  100. * used / total if total else 0.,
+                  swap_used,
+                  100. * swap_used / swap_total if swap_total else 0.)
+        measurements = [
+            template.create(value, timestamp) for template, value in zip(
+                self.get_templates(None, MEMORY_SERIES), values)
+        ]
+
+        vmstat = self.read_proc_file("vmstat", parse_fields)
+        counters = (vmstat.get(b"pswpin"), vmstat.get(b"pswpout"),
+                    vmstat.get(b"pgmajfault"))
+        factors = (PAGE_SIZE, PAGE_SIZE, 1)
+        templates = self.get_templates(None, PAGING_SERIES)
+        for template, counter, factor in zip(templates, counters, factors):
+            if counter is None:
+                continue
+            rate = self.rates.update(template.name, counter, now)
+            if rate is not None:
+                measurements.append(template.create(rate * factor, timestamp))
+        return measurements
@@ -0,0 +1,123 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals
+
+import re
+
+from oslo_config import cfg
+from watcher_metering.drivers.linux.procfs import ProcfsMetricPuller
+
+NETWORK_SERIES = (
+    ("compute.node.network.incoming.bytes.rate", "B/s"),
+    ("compute.node.network.incoming.packets.rate", "packet/s"),
+    ("compute.node.network.incoming.errors.rate", "packet/s"),
+    ("compute.node.network.incoming.drops.rate", "packet/s"),
+    ("compute.node.network.outgoing.bytes.rate", "B/s"),
+    ("compute.node.network.outgoing.packets.rate", "packet/s"),
+    ("compute.node.network.outgoing.errors.rate", "packet/s"),
+    ("compute.node.network.outgoing.drops.rate", "packet/s"),
+)
+
+# Index of the counter of each series among the fields following the name
+# of the interface: bytes, packets, errors and drops, received then sent
+NETWORK_COUNTERS = (0, 1, 2, 3, 8, 9, 10, 11)
+
+
+class NetworkPuller(ProcfsMetricPuller):
+    """Traffic of each network interface, out of /proc/net/dev"""
+
+    def __init__(self, title, probe_id, interval, interfaces=None,
+                 exclude_interfaces=None, **kwargs):
+        super(NetworkPuller, self).__init__(
+            title, probe_id, interval, **kwargs)
+        self.interfaces = set(interfaces or [])
+        self.exclude_interfaces = None
+        if exclude_interfaces:
+            self.exclude_interfaces = re.compile(exclude_interfaces)
+        self._names = {}  # raw interface name -> name (None if excluded)
+        self._known_interfaces = set()
+
+    @classmethod
+    def get_config_opts(cls):
+        return super(NetworkPuller, cls).get_config_opts() + [
+            cfg.ListOpt(
+                'interfaces',
+                help="Network interfaces to monitor (all of them if empty)",
+                default=[]),
+            cfg.StrOpt(
+                'exclude_interfaces',
+                help="Regular expression matching the names of the network "
+                     "interfaces not to monitor",
+                default=r"^lo$"),
+        ]
+
+    @classmethod
+    def get_name(cls):
+        return "network"
+
+    @classmethod
+    def get_default_probe_id(cls):
+        return "compute.node.network"
+
+    def collect(self, timestamp, now):
+        measurements = []
+        seen = set()
+        seen_names = set()
+        # The first 2 lines are headers
+        for line in self.read_proc_file("net/dev").splitlines()[2:]:
+            # The counters may be stuck to the colon
+            raw_name, _, counters = line.partition(b":")
+            raw_name = raw_name.strip()
+            seen_names.add(raw_name)
+            interface = self._get_interface(raw_name)
+            if interface is None:
+                continue
+            seen.add(interface)
+
+            fields = counters.split()
+            templates = self.get_templates(interface, NETWORK_SERIES,
+                                           {"interface": interface})
+            for template, field in zip(templates, NETWORK_COUNTERS):
+                rate = self.rates.update((interface, field),
+                                         int(fields[field]), now)
+                if rate is not None:
+                    measurements.append(template.create(rate, timestamp))
+
+        gone = self._known_interfaces - seen
+        if gone:
+            self.rates.forget((interface, field) for interface in gone
+                              for field in NETWORK_COUNTERS)
+            self.forget_templates(gone)
+        if len(self._names) > len(seen_names):
+            # Including the excluded interfaces gone
+            self._names = {raw_name: self._names[raw_name]
+                           for raw_name in seen_names}
+        self._known_interfaces = seen
+        return measurements
+
+    def _get_interface(self, raw_name):
+        try:
+            return self._names[raw_name]
+        except KeyError:
+            pass
+
+        interface = raw_name.decode("utf-8")
+        excluded = self.interfaces and interface not in self.interfaces
+        if self.exclude_interfaces is not None:
+            excluded = excluded or self.exclude_interfaces.match(interface)
+        self._names[raw_name] = None if excluded else interface
+        return self._names[raw_name]
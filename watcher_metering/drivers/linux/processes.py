@@ -0,0 +1,321 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals
+
+import errno
+import os
+import re
+import resource
+
+from oslo_config import cfg
+from oslo_log import log
+from watcher_metering.agent.measurement import HOSTNAME
+from watcher_metering.agent.measurement import MeasurementTemplate
+from watcher_metering.drivers.linux.procfs import get_fd_capacity
+from watcher_metering.drivers.linux.procfs import get_field
+from watcher_metering.drivers.linux.procfs import is_fd_exhausted
+from watcher_metering.drivers.linux.procfs import ProcFile
+from watcher_metering.drivers.linux.procfs import ProcfsMetricPuller
+
+LOG = log.getLogger(__name__)
+
+PROCESS_SERIES = (
+    ("compute.process.cpu.percent", "%"),
+    ("compute.process.memory.rss", "B"),
+    ("compute.process.io.read.bytes.rate", "B/s"),
+    ("compute.process.io.write.bytes.rate", "B/s"),
+)
+
+CLOCK_TICKS = os.sysconf(str("SC_CLK_TCK"))
+PAGE_SIZE = resource.getpagesize()
+
+# Index of the fields of /proc/<pid>/stat following the command name
+UTIME, STIME, RSS = 11, 12, 21
+
+# Raised when reading the files of a process which exited
+GONE_ERRNOS = (errno.ENOENT, errno.ESRCH)
+
+
+def parse_stat(data):
+    """Splits the content of /proc/<pid>/stat
+
+    :param data: The content of the file
+    :type data: bytes
+    :return: The command name and the fields following it
+    :rtype: tuple
+    """
+    # The command name may itself contain spaces and parentheses
+    head, _, tail = data.rpartition(b")")
+    return head.partition(b"(")[2], tail.split()
+
+
+class TrackedProcess(object):
+    """A process monitored by the driver, along with its static fields"""
+
+    __slots__ = ("pid", "name", "uid", "cgroup", "stat_file", "io_file",
+                 "templates", "cpu_time", "read_bytes", "write_bytes",
+                 "last_time")
+
+    def __init__(self, pid, name, uid, cgroup, stat_file, io_file):
+        self.pid = pid
+        self.name = name
+        self.uid = uid
+        self.cgroup = cgroup
+        self.stat_file = stat_file
+        self.io_file = io_file  # None if not readable
+        self.templates = None
+        self.cpu_time = None
+        self.read_bytes = None
+        self.write_bytes = None
+        self.last_time = None
+
+    def close(self):
+        self.stat_file.close()
+        if self.io_file is not None:
+            self.io_file.close()
+
+
+class ProcessPuller(ProcfsMetricPuller):
+    """CPU, memory and I/O usage of each process
+
+    The processes are indexed incrementally: only the PIDs which appeared
+    since the last pull get examined and filtered (by user, name and
+    cgroup, from the cheapest to the most expensive check). The static
+    fields of the processes are read once and their stat and io files are
+    kept open, so that the cost of a pull grows with the number of
+    processes monitored and started, rather than with the number of PIDs.
+
+    As each process keeps 2 files open, ``max_processes`` is capped by the
+    file descriptor limit of the agent. The PIDs turned away for lack of
+    room are examined again as soon as monitored processes exit.
+    """
+
+    def __init__(self, title, probe_id, interval, uids=None,
+                 name_pattern=None, cgroup_pattern=None, max_processes=1000,
+                 **kwargs):
+        super(ProcessPuller, self).__init__(
+            title, probe_id, interval, **kwargs)
+        self.uids = set(int(uid) for uid in uids or [])
+        self.name_pattern = re.compile(name_pattern) if name_pattern else None
+        self.cgroup_pattern = None
+        if cgroup_pattern:
+            self.cgroup_pattern = re.compile(cgroup_pattern, re.MULTILINE)
+        self.max_processes = max_processes
+        capacity = get_fd_capacity(2)
+        if capacity is not None and capacity < max_processes:
+            LOG.warning("[%s] The file descriptor limit only leaves room "
+                        "for %d of the %d processes to monitor", self.key,
+                        capacity, max_processes)
+            self.max_processes = capacity
+
+        self._processes = {}  # PID -> tracked process
+        self._known = set()  # All the PIDs listed by the previous pull
+        self._turned_away = set()  # PIDs which passed the filters, no room
+
+    @classmethod
+    def get_config_opts(cls):
+        return super(ProcessPuller, cls).get_config_opts() + [
+            cfg.ListOpt(
+                'uids',
+                help="Only monitors the processes of these user IDs (all of "
+                     "them if empty)",
+                default=[]),
+            cfg.StrOpt(
+                'name_pattern',
+                help="Only monitors the processes whose command name "
+                     "matches this regular expression",
+                default=""),
+            cfg.StrOpt(
+                'cgroup_pattern',
+                help="Only monitors the processes one of whose cgroups "
+                     "(e.g. '0::/machine.slice/...' lines of "
+                     "/proc/<pid>/cgroup) matches this regular expression",
+                default=""),
+            cfg.IntOpt(
+                'max_processes',
+                help="Maximum number of processes monitored, whose files "
+                     "are kept open (capped by the file descriptor limit)",
+                default=1000, min=1),
+        ]
+
+    @classmethod
+    def get_name(cls):
+        return "processes"
+
+    @classmethod
+    def get_default_probe_id(cls):
+        return "compute.process"
+
+    def collect(self, timestamp, now):
+        pids = set(int(entry) for entry in os.listdir(self.procfs_path)
+                   if entry.isdigit())
+        for pid in self._known - pids:
+            self._forget(pid)
+        self._turned_away &= pids
+        pending = pids - self._known
+        if len(self._processes) < self.max_processes:
+            # Some room was freed: the PIDs turned away get another chance
+            pending |= self._turned_away
+        while pending:
+            pid = pending.pop()
+            is_full = len(self._processes) >= self.max_processes
+            if is_full and pid in self._turned_away:
+                continue  # Still no room
+            try:
+                self._examine(pid)
+            except (IOError, OSError) as exc:
+                # Out of file descriptors: the PIDs left are examined again
+                # on the next pull
+                LOG.error("[%s] Could not examine %d new process(es): %s",
+                          self.key, len(pending) + 1, exc)
+                pids -= pending
+                pids.discard(pid)
+                break
+        self._known = pids
+
+        measurements = []
+        for process in list(self._processes.values()):
+            try:
+                self._add_usage(process, timestamp, now, measurements)
+            except (IOError, OSError) as exc:
+                if exc.errno not in GONE_ERRNOS:
+                    LOG.warning("[%s] Could not read the usage of process "
+                                "%d: %s", self.key, process.pid, exc)
+                # Its PID may get reused: examined again if still listed
+                self._forget(process.pid)
+                self._known.discard(process.pid)
+        return measurements
+
+    def stop(self):
+        super(ProcessPuller, self).stop()
+        for process in self._processes.values():
+            process.close()
+        self._processes.clear()
+
+    def _forget(self, pid):
+        process = self._processes.pop(pid, None)
+        if process is not None:
+            process.close()
+
+    def _examine(self, pid):
+        """Starts tracking a new PID if it passes the filters
+
+        A PID filtered out is not examined again until it disappears.
+        """
+        self._turned_away.discard(pid)
+        try:
+            process = self._track(pid)
+        except (IOError, OSError) as exc:
+            if is_fd_exhausted(exc):
+                raise
+            return  # Already gone
+        if process is not None:
+            self._processes[pid] = process
+
+    def _track(self, pid):
+        path = os.path.join(self.procfs_path, str(pid))
+        uid = os.stat(path).st_uid
+        if self.uids and uid not in self.uids:
+            return None
+
+        stat_file = ProcFile(os.path.join(path, "stat"), buffer_size=512)
+        try:
+            name = parse_stat(stat_file.read())[0]
+            name = name.decode("utf-8", "replace")
+            if self.name_pattern and not self.name_pattern.search(name):
+                stat_file.close()
+                return None
+
+            cgroup = self._read_cgroup(path)
+            if self.cgroup_pattern and not self.cgroup_pattern.search(
+                    cgroup):
+                stat_file.close()
+                return None
+        except Exception:
+            stat_file.close()
+            raise
+
+        if len(self._processes) >= self.max_processes:
+            LOG.warning("[%s] Already %d processes monitored: ignoring %d "
+                        "(%s) for now", self.key, self.max_processes, pid,
+                        name)
+            stat_file.close()
+            self._turned_away.add(pid)
+            return None
+
+        io_file = ProcFile(os.path.join(path, "io"), buffer_size=512)
+        try:
+            io_file.read()
+        except (IOError, OSError) as exc:
+            if is_fd_exhausted(exc):
+                stat_file.close()
+                raise
+            io_file = None  # e.g. the process of another user
+
+        return TrackedProcess(pid, name, uid, cgroup, stat_file, io_file)
+
+    @staticmethod
+    def _read_cgroup(path):
+        cgroup_file = ProcFile(os.path.join(path, "cgroup"))
+        try:
+            return cgroup_file.read().decode("utf-8", "replace").strip()
+        finally:
+            cgroup_file.close()
+
+    def _add_usage(self, process, timestamp, now, measurements):
+        fields = parse_stat(process.stat_file.read())[1]
+        cpu_time = int(fields[UTIME]) + int(fields[STIME])
+        read_bytes = write_bytes = None
+        if process.io_file is not None:
+            io = process.io_file.read()
+            read_bytes = get_field(io, b"read_bytes:")
+            write_bytes = get_field(io, b"write_bytes:")
+
+        if process.templates is None:
+            process.templates = self._create_templates(process)
+        cpu, rss, read_rate, write_rate = process.templates
+
+        measurements.append(rss.create(int(fields[RSS]) * PAGE_SIZE,
+                                       timestamp))
+        if process.last_time is not None and now > process.last_time:
+            elapsed = now - process.last_time
+            measurements.append(cpu.create(
+                100. * (cpu_time - process.cpu_time) / CLOCK_TICKS / elapsed,
+                timestamp))
+            if read_bytes is not None and process.read_bytes is not None:
+                measurements.append(read_rate.create(
+                    (read_bytes - process.read_bytes) / elapsed, timestamp))
+                measurements.append(write_rate.create(
+                    (write_bytes - process.write_bytes) / elapsed,
+                    timestamp))
+
+        process.cpu_time = cpu_time
+        process.read_bytes = read_bytes
+        process.write_bytes = write_bytes
+        process.last_time = now
+
+    @staticmethod
+    def _create_templates(process):
+        # Not kept by the driver as the processes come and go
+        metadata = {"pid": process.pid, "name": process.name,
+                    "uid": process.uid}
+        if process.cgroup:
+            metadata["cgroup"] = process.cgroup
+        resource_id = "%s_%d" % (HOSTNAME, process.pid)
+        return [MeasurementTemplate(name, unit, "gauge", resource_id,
+                                    resource_metadata=metadata)
+                for name, unit in PROCESS_SERIES]
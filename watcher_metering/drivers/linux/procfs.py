@@ -0,0 +1,288 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Building blocks of the Linux drivers, which read their counters in procfs"""
+
+from __future__ import unicode_literals
+
+import abc
+import errno
+import os
+import resource
+import time
+
+from oslo_config import cfg
+import six
+from watcher_metering.agent.measurement import HOSTNAME
+from watcher_metering.agent.measurement import MeasurementTemplate
+from watcher_metering.agent.puller import MetricPuller
+
+_now = getattr(time, "monotonic", time.time)
+
+# Share of the file descriptors of the agent a driver may keep open
+FD_SHARE = .25
+
+try:
+    _pread = os.pread
+except AttributeError:  # Python 2.7
+    def _pread(fd, size, offset):
+        os.lseek(fd, offset, os.SEEK_SET)
+        return os.read(fd, size)
+
+
+def is_fd_exhausted(exc):
+    """Tells whether an error is due to the lack of file descriptors
+
+    :type exc: IOError or OSError
+    :rtype: bool
+    """
+    return exc.errno in (errno.EMFILE, errno.ENFILE)
+
+
+def get_fd_capacity(fds_per_item):
+    """Number of items a driver may keep open within its share of the file
+    descriptors of the agent
+
+    :param fds_per_item: Number of file descriptors each item keeps open
+    :type fds_per_item: int
+    :return: The number of items (None if unlimited)
+    :rtype: int
+    """
+    soft_limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+    if soft_limit == resource.RLIM_INFINITY:
+        return None
+    return max(1, int(soft_limit * FD_SHARE) // fds_per_item)
+
+
+def get_field(data, label):
+    """Returns the value following a label at the start of a line
+
+    Parses lines such as ``MemTotal:  16318784 kB`` without splitting the
+    whole content into lines.
+
+    :param data: The content of a procfs file
+    :type data: bytes
+    :param label: The label (e.g. ``b"MemTotal:"``)
+    :type label: bytes
+    :return: The (first) value following the label, if found
+    :rtype: int or None
+    """
+    if data.startswith(label):
+        start = len(label)
+    else:
+        start = data.find(b"\n" + label)
+        if start < 0:
+            return None
+        start += len(label) + 1
+    end = data.find(b"\n", start)
+    if end < 0:
+        end = len(data)
+    return int(data[start:end].split(None, 1)[0])
+
+
+def parse_fields(data):
+    """Parses all the ``label value`` lines of a procfs file at once
+
+    :param data: The content of a file such as /proc/meminfo
+    :type data: bytes
+    :return: The (first) value of each label
+    :rtype: dict of bytes -> int
+    """
+    fields = {}
+    for line in data.splitlines():
+        label, _, values = line.partition(b" ")
+        values = values.split(None, 1)
+        if values:
+            fields[label] = int(values[0])
+    return fields
+
+
+class ProcFile(object):
+    """A procfs file kept open and read again from the start on each pull
+
+    This spares opening and closing the file on every pull. The read buffer
+    grows until it can hold the whole file at once.
+    """
+
+    def __init__(self, path, buffer_size=4096):
+        """
+        :param path: Path of the file
+        :type path: str
+        :param buffer_size: Initial size (in bytes) of the read buffer
+        :type buffer_size: int
+        """
+        self.path = path
+        self.buffer_size = buffer_size
+        self._fd = None
+
+    def read(self):
+        """
+        :return: The whole content of the file
+        :rtype: bytes
+        """
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDONLY)
+        data = _pread(self._fd, self.buffer_size, 0)
+        while len(data) >= self.buffer_size:
+            # Truncated by the buffer: reads it again with a larger one
+            self.buffer_size *= 2
+            data = _pread(self._fd, self.buffer_size, 0)
+        return data
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class CounterRates(object):
+    """Turns cumulative counters into rates per second
+
+    A counter yields no rate on its first update, nor when it went backwards
+    (i.e. it wrapped around or got reset).
+    """
+
+    def __init__(self):
+        self._last = {}  # key -> (value, time)
+
+    def __len__(self):
+        return len(self._last)
+
+    def update(self, key, value, now):
+        """
+        :param key: Identifies the counter
+        :param value: Current value of the counter
+        :type value: int
+        :param now: Current time (in seconds) on the monotonic clock
+        :type now: float
+        :return: The rate of the counter since its last update, if any
+        :rtype: float or None
+        """
+        last = self._last.get(key)
+        self._last[key] = (value, now)
+        if last is None:
+            return None
+        last_value, last_time = last
+        if value < last_value or now <= last_time:
+            return None
+        return (value - last_value) / (now - last_time)
+
+    def forget(self, keys):
+        """Forgets the counters of the given keys (e.g. removed devices)"""
+        for key in keys:
+            self._last.pop(key, None)
+
+
+@six.add_metaclass(abc.ABCMeta)
+class ProcfsMetricPuller(MetricPuller):
+    """Base class of the Linux drivers
+
+    The files of procfs are kept open for the whole lifetime of the driver
+    and all the measurements of a pull share the timestamp of its tick.
+    """
+
+    def __init__(self, title, probe_id, interval, procfs_path="/proc",
+                 **kwargs):
+        super(ProcfsMetricPuller, self).__init__(
+            title, probe_id, interval, **kwargs)
+        self.procfs_path = procfs_path
+        self.rates = CounterRates()
+        self._proc_files = {}
+        self._resource_templates = {}  # resource -> {series: templates}
+
+    @classmethod
+    def get_config_opts(cls):
+        return cls.get_base_opts() + [
+            cfg.StrOpt(
+                'procfs_path',
+                help="Mount point of the procfs to read the counters from "
+                     "(e.g. that of the host from within a container)",
+                default="/proc"),
+        ]
+
+    @classmethod
+    def get_default_interval(cls):
+        return 10  # In seconds
+
+    def read_proc_file(self, relative_path, parse=None):
+        """Reads a file of procfs, at most once per tick for all the drivers
+
+        :param relative_path: Path of the file within procfs
+        :type relative_path: str
+        :param parse: Called with the content of the file, so that the other
+            drivers using the same function get the parsed content as is
+        :type parse: callable
+        :return: The content of the file, or what ``parse`` returned
+        """
+        path = os.path.join(self.procfs_path, relative_path)
+        if parse is not None:
+            return self.get_snapshot((path, parse), lambda: parse(
+                self.read_proc_file(relative_path)))
+
+        proc_file = self._proc_files.get(path)
+        if proc_file is None:
+            proc_file = self._proc_files[path] = ProcFile(path)
+        return self.get_snapshot(path, proc_file.read)
+
+    def get_templates(self, resource, series, resource_metadata=None):
+        """Returns the templates of the series of a resource
+
+        :param resource: Name of the resource (e.g. a device), None for the
+            host itself
+        :type resource: str
+        :param series: (name, unit) of each series of the resource
+        :type series: tuple of tuples
+        :rtype: list of :class:`MeasurementTemplate` instances
+        """
+        resource_templates = self._resource_templates.setdefault(resource, {})
+        templates = resource_templates.get(series)
+        if templates is None:
+            resource_id = HOSTNAME
+            if resource is not None:
+                resource_id = "%s_%s" % (HOSTNAME, resource)
+            templates = resource_templates[series] = [
+                MeasurementTemplate(name, unit, "gauge", resource_id,
+                                    resource_metadata=resource_metadata)
+                for name, unit in series
+            ]
+        return templates
+
+    def forget_templates(self, resources):
+        """Forgets the templates of the given resources (e.g. gone devices)"""
+        for resource_name in resources:
+            self._resource_templates.pop(resource_name, None)
+
+    def do_pull(self):
+        return self.collect(self.get_pull_timestamp(), _now())
+
+    @abc.abstractmethod
+    def collect(self, timestamp, now):
+        """Reads the counters and creates the measurements of a pull
+
+        :param timestamp: Timestamp of the measurements (nanoseconds since
+            the epoch)
+        :type timestamp: int
+        :param now: Time (in seconds) on the monotonic clock, against which
+            the rates are computed
+        :type now: float
+        :rtype: list of :class:`Measurement` instances
+        """
+        raise NotImplementedError  # pragma: nocover
+
+    def stop(self):
+        super(ProcfsMetricPuller, self).stop()
+        for proc_file in self._proc_files.values():
+            proc_file.close()
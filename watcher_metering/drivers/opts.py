@@ -0,0 +1,38 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals
+
+from watcher_metering.drivers.linux.cgroups import CgroupPuller
+from watcher_metering.drivers.linux.cpu import CpuPuller
+from watcher_metering.drivers.linux.disk import DiskPuller
+from watcher_metering.drivers.linux.filesystem import FilesystemPuller
+from watcher_metering.drivers.linux.load import LoadPuller
+from watcher_metering.drivers.linux.memory import MemoryPuller
+from watcher_metering.drivers.linux.network import NetworkPuller
+from watcher_metering.drivers.linux.processes import ProcessPuller
+from watcher_metering.drivers.virt.libvirt_stats import LibvirtStatsPuller
+
+DRIVERS = (CpuPuller, MemoryPuller, LoadPuller, DiskPuller,
+           FilesystemPuller, NetworkPuller, ProcessPuller, CgroupPuller,
+           LibvirtStatsPuller)
+
+
+def list_opts():
+    return [
+        (driver.get_entry_name(), driver.get_config_opts())
+        for driver in DRIVERS
+    ]
@@ -0,0 +1,209 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import time
+
+from oslo_config import cfg
+from oslo_log import log
+from watcher_metering.agent.measurement import MeasurementTemplate
+from watcher_metering.agent.puller import MetricPuller
+from watcher_metering.drivers.linux.procfs import CounterRates
+
+try:
+    import libvirt
+except ImportError:
+    libvirt = None
+
+LOG = log.getLogger(__name__)
+
+_now = getattr(time, "monotonic", time.time)
+
+INSTANCE_SERIES = (
+    ("compute.instance.cpu.percent", "%"),
+    ("compute.instance.memory.total", "B"),
+    ("compute.instance.memory.usage", "B"),
+    ("compute.instance.memory.resident", "B"),
+    ("compute.instance.disk.read.bytes.rate", "B/s"),
+    ("compute.instance.disk.write.bytes.rate", "B/s"),
+    ("compute.instance.disk.read.requests.rate", "request/s"),
+    ("compute.instance.disk.write.requests.rate", "request/s"),
+    ("compute.instance.network.incoming.bytes.rate", "B/s"),
+    ("compute.instance.network.outgoing.bytes.rate", "B/s"),
+    ("compute.instance.network.incoming.packets.rate", "packet/s"),
+    ("compute.instance.network.outgoing.packets.rate", "packet/s"),
+)
+
+STATS_TYPES = ("CPU_TOTAL", "BALLOON", "VCPU", "INTERFACE", "BLOCK")
+
+# Counters of the disk and network series (in the same order), summed
+# over the devices of each domain: (device type, field)
+DEVICE_COUNTERS = (
+    ("block", "rd.bytes"), ("block", "wr.bytes"),
+    ("block", "rd.reqs"), ("block", "wr.reqs"),
+    ("net", "rx.bytes"), ("net", "tx.bytes"),
+    ("net", "rx.pkts"), ("net", "tx.pkts"),
+)
+
+
+def sum_devices(stats, device_type, field):
+    """Sums a counter over the devices of a domain
+
+    :param stats: The statistics of the domain, as returned by
+        ``virConnect.getAllDomainStats()`` (e.g. ``block.0.rd.bytes``)
+    :type stats: dict
+    :param device_type: Either ``block`` or ``net``
+    :type device_type: str
+    :param field: Name of the counter (e.g. ``rd.bytes``)
+    :type field: str
+    :rtype: int
+    """
+    return sum(stats.get("%s.%d.%s" % (device_type, index, field), 0)
+               for index in range(stats.get("%s.count" % device_type, 0)))
+
+
+class LibvirtStatsPuller(MetricPuller):
+    """CPU, memory, disk and network usage of each instance of the host
+
+    The statistics of all the running domains are fetched at once with
+    ``virConnect.getAllDomainStats()``, rather than with a few calls per
+    domain and device, so that a pull costs one round trip to libvirtd
+    whatever the number of instances. The measurements are keyed by the
+    UUID of the domains, i.e. that of the instances with Nova.
+    """
+
+    def __init__(self, title, probe_id, interval,
+                 connection_uri="qemu:///system", **kwargs):
+        super(LibvirtStatsPuller, self).__init__(
+            title, probe_id, interval, **kwargs)
+        self.connection_uri = connection_uri
+        self.rates = CounterRates()
+        self._connection = None
+        self._domain_templates = {}  # UUID -> templates
+
+    @classmethod
+    def get_config_opts(cls):
+        return cls.get_base_opts() + [
+            cfg.StrOpt(
+                'connection_uri',
+                help="URI of the (read-only) connection to libvirt",
+                default="qemu:///system"),
+        ]
+
+    @classmethod
+    def get_name(cls):
+        return "libvirt"
+
+    @classmethod
+    def get_default_probe_id(cls):
+        return "compute.instance"
+
+    @classmethod
+    def get_default_interval(cls):
+        return 10  # In seconds
+
+    def get_connection(self):
+        if self._connection is None:
+            if libvirt is None:
+                raise ImportError("The libvirt Python bindings are required "
+                                  "by the libvirt driver")
+            LOG.info("[%s] Connecting to %s", self.key, self.connection_uri)
+            self._connection = libvirt.openReadOnly(self.connection_uri)
+        return self._connection
+
+    def do_pull(self):
+        connection = self.get_connection()
+        stats_types = 0
+        for stats_type in STATS_TYPES:
+            stats_types |= getattr(libvirt, "VIR_DOMAIN_STATS_" + stats_type)
+        try:
+            all_stats = connection.getAllDomainStats(
+                stats_types,
+                libvirt.VIR_CONNECT_GET_ALL_DOMAINS_STATS_ACTIVE)
+        except libvirt.libvirtError:
+            self._close()  # Reconnects on the next pull
+            raise
+        timestamp, now = self.get_pull_timestamp(), _now()
+
+        measurements = []
+        uuids = set()
+        for domain, stats in all_stats:
+            uuid = domain.UUIDString()
+            uuids.add(uuid)
+            templates = self._domain_templates.get(uuid)
+            if templates is None:
+                templates = self._domain_templates[uuid] = (
+                    self._create_templates(uuid, domain.name()))
+            self._add_usage(uuid, stats, templates, timestamp, now,
+                            measurements)
+
+        for uuid in set(self._domain_templates) - uuids:
+            # Stopped, deleted or migrated away
+            del self._domain_templates[uuid]
+            self.rates.forget([(uuid, counter) for counter in
+                               ("cpu",) + DEVICE_COUNTERS])
+        return measurements
+
+    def stop(self):
+        super(LibvirtStatsPuller, self).stop()
+        self._close()
+
+    def _close(self):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            try:
+                connection.close()
+            except libvirt.libvirtError:
+                pass
+
+    def _add_usage(self, uuid, stats, templates, timestamp, now,
+                   measurements):
+        cpu_rate = None
+        if "cpu.time" in stats:
+            cpu_rate = self.rates.update((uuid, "cpu"), stats["cpu.time"],
+                                         now)
+        if cpu_rate is not None:
+            # Relative to the vCPUs of the domain (in nanoseconds)
+            vcpus = stats.get("vcpu.current") or 1
+            measurements.append(templates[0].create(
+                cpu_rate / 1e7 / vcpus, timestamp))
+
+        # In KiB
+        if "balloon.current" in stats:
+            measurements.append(templates[1].create(
+                stats["balloon.current"] * 1024, timestamp))
+        if "balloon.available" in stats and "balloon.unused" in stats:
+            # Only reported with the balloon driver of the guest
+            used = stats["balloon.available"] - stats["balloon.unused"]
+            measurements.append(templates[2].create(used * 1024, timestamp))
+        if "balloon.rss" in stats:
+            measurements.append(templates[3].create(
+                stats["balloon.rss"] * 1024, timestamp))
+
+        for template, counter in zip(templates[4:], DEVICE_COUNTERS):
+            rate = self.rates.update(
+                (uuid, counter), sum_devices(stats, *counter), now)
+            if rate is not None:
+                measurements.append(template.create(rate, timestamp))
+
+    @staticmethod
+    def _create_templates(uuid, name):
+        metadata = {"domain": name}
+        return [MeasurementTemplate(series_name, unit, "gauge", uuid,
+                                    resource_metadata=metadata)
+                for series_name, unit in INSTANCE_SERIES]
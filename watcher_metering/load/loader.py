@@ -92,10 +92,13 @@ class DriverLoader(object):
         opts.update(external_options)
         opts.update(internal_options)
 
-        client = store_client_driver(**opts)
+        client = self._create(store_client_driver, opts)
 
         return client
 
+    def _create(self, driver_cls, opts):
+        return driver_cls(**opts)
+
     def _reload_config(self):
         self.conf()
 
@@ -0,0 +1,376 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Wire format of the messages pushed by the agents to the publisher.
+
+A frame is a msgpack array whose first item is the frame version:
+
+* Version 1: ``[1, [measurement_1, measurement_2, ...]]`` where each
+  measurement is the msgpack map returned by ``Measurement.as_dict()``.
+* Version 2: ``[2, [record_1, record_2, ...]]`` where each record is
+  positional: ``[static, timestamp, value]`` with ``static`` being
+  ``[name, unit, type, resource_id, host, resource_metadata]``. The key
+  strings are never sent and the ``static`` part of a given series can be
+  packed once and reused for all of its records. Integer timestamps (epoch
+  nanoseconds) are carried as msgpack Timestamp extensions.
+
+* Version 3: ``[3, session_id, [registration_1, ...], [sample_1, ...]]``
+  where each registration is ``[series_id, static]`` and each sample is
+  ``[series_id, timestamp, value]``. The ``static`` part of a series is only
+  sent when registering it so samples just refer to it by its ``series_id``
+  which is only meaningful within the agent session that assigned it (see
+  :mod:`watcher_metering.protocol.series`).
+
+* Version 4: ``[4, session_id, [registration_1, ...], [sample_1, ...],
+  [chunk_1, ...]]`` which is a version 3 frame where the samples of each
+  series are compressed into a ``[series_id, chunk]`` (see
+  :mod:`watcher_metering.protocol.gorilla`) whenever possible.
+
+Messages sent by agents predating frames (a msgpack map holding a single
+measurement) are still accepted when unpacking.
+"""
+
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+
+import msgpack
+import six
+from watcher_metering.protocol import gorilla
+
+FRAME_VERSION_BATCH = 1
+FRAME_VERSION_RECORDS = 2
+FRAME_VERSION_SERIES = 3
+FRAME_VERSION_COMPRESSED = 4
+
+CODEC_MSGPACK = "msgpack"
+CODEC_GORILLA = "gorilla"
+CODECS = (CODEC_MSGPACK, CODEC_GORILLA)
+
+
+def pack_measurement(measurement_dict):
+    """Encodes a single measurement so it can be embedded into a frame
+
+    :param measurement_dict: The measurement as returned by ``as_dict()``
+    :type measurement_dict: dict
+    :return: The msgpack encoded measurement
+    :rtype: bytes
+    """
+    return msgpack.packb(measurement_dict, use_bin_type=True)
+
+
+def pack_static(name, unit, type_, resource_id, host, resource_metadata):
+    """Encodes the static part of a record
+
+    :return: The msgpack encoded static part
+    :rtype: bytes
+    """
+    return msgpack.packb(
+        [name, unit, type_, resource_id, host, resource_metadata],
+        use_bin_type=True,
+    )
+
+
+def pack_point(timestamp, value):
+    """Encodes the dynamic part of a record (or of a sample)
+
+    The returned bytes are the timestamp followed by the value, without any
+    array header so that they can be appended to the static part of a record
+    or to the series ID of a sample.
+
+    :param timestamp: The timestamp of the measurement, either as epoch
+        nanoseconds or as an ISO 8601 string (legacy)
+    :type timestamp: int or str
+    :param value: The value of the measurement
+    :return: The msgpack encoded timestamp and value
+    :rtype: bytes
+    """
+    if isinstance(timestamp, six.integer_types):
+        timestamp = msgpack.Timestamp.from_unix_nano(timestamp)
+    # Packing a 2-item array only to strip its 1-byte header out costs a
+    # single packb() call for the dynamic part of the record
+    return msgpack.packb((timestamp, value), use_bin_type=True)[1:]
+
+
+def pack_record(packed_static, timestamp, value):
+    """Encodes a positional record out of its already packed static part
+
+    :param packed_static: The static part as returned by :func:`pack_static`
+    :type packed_static: bytes
+    :param timestamp: The timestamp of the measurement, either as epoch
+        nanoseconds or as an ISO 8601 string (legacy)
+    :type timestamp: int or str
+    :param value: The value of the measurement
+    :return: The msgpack encoded record
+    :rtype: bytes
+    """
+    return b"".join([b"\x93", packed_static, pack_point(timestamp, value)])
+
+
+def pack_frame(packed_measurements, version=FRAME_VERSION_RECORDS):
+    """Builds a frame out of already encoded measurements
+
+    The measurements are not re-encoded: only the frame header is packed,
+    then the measurements are appended as they are.
+
+    :param packed_measurements: Measurements encoded by
+        :func:`pack_record` (or by :func:`pack_measurement` for version 1
+        frames)
+    :type packed_measurements: list of bytes
+    :param version: The version of the frame
+    :type version: int
+    :return: The msgpack encoded frame
+    :rtype: bytes
+    """
+    packer = msgpack.Packer(use_bin_type=True)
+    chunks = [
+        packer.pack_array_header(2),
+        packer.pack(version),
+        packer.pack_array_header(len(packed_measurements)),
+    ]
+    chunks.extend(packed_measurements)
+    return b"".join(chunks)
+
+
+def pack_series_frame(session_id, registrations, samples):
+    """Builds a version 3 frame out of already encoded parts
+
+    :param session_id: The ID of the agent session
+    :type session_id: int
+    :param registrations: The series to be registered
+    :type registrations: list of (series_id, packed_static) tuples
+    :param samples: The samples to be sent
+    :type samples: list of (series_id, timestamp, value) tuples
+    :return: The msgpack encoded frame
+    :rtype: bytes
+    """
+    packer = msgpack.Packer(use_bin_type=True)
+    chunks = [
+        packer.pack_array_header(4),
+        packer.pack(FRAME_VERSION_SERIES),
+        packer.pack(session_id),
+        packer.pack_array_header(len(registrations)),
+    ]
+    for series_id, packed_static in registrations:
+        chunks.extend((b"\x92", packer.pack(series_id), packed_static))
+    chunks.append(packer.pack_array_header(len(samples)))
+    for series_id, timestamp, value in samples:
+        chunks.extend((b"\x93", packer.pack(series_id),
+                       pack_point(timestamp, value)))
+    return b"".join(chunks)
+
+
+def pack_compressed_frame(session_id, registrations, samples):
+    """Builds a version 4 frame, compressing the samples of each series
+
+    :param session_id: The ID of the agent session
+    :type session_id: int
+    :param registrations: The series to be registered
+    :type registrations: list of (series_id, packed_static) tuples
+    :param samples: The samples to be sent
+    :type samples: list of (series_id, timestamp, value) tuples
+    :return: The msgpack encoded frame
+    :rtype: bytes
+    """
+    runs = OrderedDict()
+    for series_id, timestamp, value in samples:
+        timestamps, values = runs.setdefault(series_id, ([], []))
+        timestamps.append(timestamp)
+        values.append(value)
+
+    packer = msgpack.Packer(use_bin_type=True)
+    chunks = []
+    uncompressed = []
+    for series_id, (timestamps, values) in runs.items():
+        if gorilla.can_encode(timestamps, values):
+            chunks.append((series_id, gorilla.encode(timestamps, values)))
+            continue
+        # e.g. legacy timestamps or non-numerical values
+        packed_series_id = packer.pack(series_id)
+        for timestamp, value in zip(timestamps, values):
+            uncompressed.extend((b"\x93", packed_series_id,
+                                 pack_point(timestamp, value)))
+
+    parts = [
+        packer.pack_array_header(5),
+        packer.pack(FRAME_VERSION_COMPRESSED),
+        packer.pack(session_id),
+        packer.pack_array_header(len(registrations)),
+    ]
+    for series_id, packed_static in registrations:
+        parts.extend((b"\x92", packer.pack(series_id), packed_static))
+    parts.append(packer.pack_array_header(len(uncompressed) // 3))
+    parts.extend(uncompressed)
+    parts.append(packer.pack(chunks))
+    return b"".join(parts)
+
+
+def unpack_frame(raw, sessions=None):
+    """Decodes a message received from an agent
+
+    :param raw: The message as received on the socket
+    :type raw: bytes
+    :param sessions: The series registered by the agents, mandatory to
+        decode version 3 frames
+    :type sessions: :class:`watcher_metering.protocol.series.SeriesSessions`
+    :return: The measurements carried by this message
+    :rtype: list of dict
+    :raises: :class:`FrameError` if the message is not a valid frame
+    """
+    return decode_frame(msgpack.unpackb(raw, raw=False), sessions)
+
+
+class FrameUnpacker(object):
+    """Decodes the frames received one after the other
+
+    A single long-lived :class:`msgpack.Unpacker` is fed with the received
+    messages (which may be views onto a reused receive buffer) instead of
+    creating a new unpacker and a new bytes object per message. Arrays are
+    decoded as tuples, which are cheaper to build than lists.
+    """
+
+    def __init__(self, sessions=None, max_frame_size=1024 * 1024):
+        """
+        :param sessions: The series registered by the agents, mandatory to
+            decode version 3 and 4 frames
+        :type sessions: :class:`SeriesSessions` instance
+        :param max_frame_size: The maximum size (in bytes) of a frame
+        :type max_frame_size: int
+        """
+        self.sessions = sessions
+        self.max_frame_size = max_frame_size
+        self._unpacker = None
+        self._fed = 0
+        self._reset()
+
+    def _reset(self):
+        self._unpacker = msgpack.Unpacker(
+            raw=False, use_list=False, max_buffer_size=self.max_frame_size)
+        self._fed = 0
+
+    def unpack(self, data):
+        """Decodes a single message
+
+        :param data: The message as received on the socket
+        :type data: bytes, bytearray or memoryview
+        :return: The measurements carried by this message
+        :rtype: list of dict
+        :raises: :class:`FrameError` if the message is not a valid frame
+        """
+        try:
+            self._unpacker.feed(data)
+            self._fed += len(data)
+            payload = self._unpacker.unpack()
+        except (msgpack.UnpackException, ValueError) as exc:
+            # The unpacker may hold the leftovers of this message
+            self._reset()
+            raise FrameError("Invalid message: %r" % exc)
+
+        if self._unpacker.tell() != self._fed:
+            self._reset()
+            raise FrameError("Invalid message: extra data")
+
+        return decode_frame(payload, self.sessions)
+
+
+def decode_frame(payload, sessions=None):
+    """Extracts the measurements out of an already unpacked message
+
+    :param payload: The unpacked message
+    :type payload: dict, list or tuple
+    :param sessions: The series registered by the agents, mandatory to
+        decode version 3 frames
+    :type sessions: :class:`watcher_metering.protocol.series.SeriesSessions`
+    :return: The measurements carried by this message
+    :rtype: list of dict
+    :raises: :class:`FrameError` if the message is not a valid frame
+    """
+    if isinstance(payload, dict):
+        # Legacy message: a single measurement per message
+        return [payload]
+
+    if not isinstance(payload, (list, tuple)) or not payload:
+        raise FrameError("Invalid frame: %r" % (payload,))
+
+    version = payload[0]
+    if version == FRAME_VERSION_BATCH:
+        if len(payload) != 2:
+            raise FrameError("Invalid batch frame: %r" % (payload,))
+        try:
+            return list(payload[1])
+        except TypeError as exc:
+            raise FrameError("Invalid batch frame: %r" % exc)
+    elif version == FRAME_VERSION_RECORDS:
+        if len(payload) != 2:
+            raise FrameError("Invalid records frame: %r" % (payload,))
+        try:
+            return [decode_record(*record) for record in payload[1]]
+        except (TypeError, ValueError) as exc:
+            raise FrameError("Invalid record: %r" % exc)
+    elif version == FRAME_VERSION_SERIES:
+        if len(payload) != 4:
+            raise FrameError("Invalid series frame: %r" % (payload,))
+        if sessions is None:
+            raise FrameError("Series frames require a session registry")
+        _, session_id, registrations, samples = payload
+        try:
+            return sessions.expand(session_id, registrations, samples)
+        except (TypeError, ValueError) as exc:
+            raise FrameError("Invalid series frame: %r" % exc)
+    elif version == FRAME_VERSION_COMPRESSED:
+        if len(payload) != 5:
+            raise FrameError("Invalid compressed frame: %r" % (payload,))
+        if sessions is None:
+            raise FrameError("Compressed frames require a session registry")
+        _, session_id, registrations, samples, chunks = payload
+        try:
+            samples = list(samples)
+            for series_id, chunk in chunks:
+                timestamps, values = gorilla.decode(chunk)
+                samples.extend(
+                    (series_id, timestamp, value)
+                    for timestamp, value in zip(timestamps, values))
+            return sessions.expand(session_id, registrations, samples)
+        except (TypeError, ValueError) as exc:
+            raise FrameError("Invalid compressed frame: %r" % exc)
+
+    raise FrameError("Unsupported frame version `%r`" % (version,))
+
+
+def decode_record(static, timestamp, value):
+    """Expands a positional record into a measurement dictionary
+
+    :return: The measurement, whose timestamp is in epoch nanoseconds
+        (unless the agent sent an ISO 8601 string)
+    :rtype: dict
+    """
+    name, unit, type_, resource_id, host, resource_metadata = static
+    if isinstance(timestamp, msgpack.Timestamp):
+        timestamp = timestamp.to_unix_nano()
+    return {
+        "name": name,
+        "timestamp": timestamp,
+        "unit": unit,
+        "type": type_,
+        "value": value,
+        "resource_id": resource_id,
+        "host": host,
+        "resource_metadata": resource_metadata,
+    }
+
+
+class FrameError(ValueError):
+    pass
@@ -0,0 +1,340 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Gorilla-like compression of the samples of a series
+
+This follows the time series compression described in "Gorilla: A Fast,
+Scalable, In-Memory Time Series Database" (Pelkonen et al., VLDB 2015):
+
+* Timestamps are encoded as delta-of-deltas, so that regularly pulled
+  series only cost a single bit per timestamp. As timestamps are expressed in
+  nanoseconds here, the buckets are wider than the ones of the paper.
+* Floats are XOR-ed with the previous value and only their meaningful bits
+  are written, reusing the previous leading/trailing zeros window whenever
+  possible.
+* Integers are encoded as delta-of-deltas, just as the timestamps are.
+
+A chunk is self-contained (it starts with the value kind and the number of
+samples) so it can be stored as is, e.g. in an on-disk buffer.
+"""
+
+from __future__ import unicode_literals
+
+import struct
+
+import six
+
+KIND_FLOAT = 0
+KIND_INT = 1
+
+_INT64_MIN = -(1 << 63)
+_INT64_MAX = (1 << 63) - 1
+_UINT64_MASK = (1 << 64) - 1
+
+# (Prefix, prefix length, value length) for the zigzag encoded
+# delta-of-deltas, the last bucket holding the delta-of-delta of any 64-bit
+# integers
+_DOD_BUCKETS = (
+    (0b10, 2, 12),
+    (0b110, 3, 24),
+    (0b1110, 4, 36),
+    (0b1111, 4, 66),
+)
+
+
+class GorillaError(ValueError):
+    pass
+
+
+class BitWriter(object):
+    """Writes bits, most significant first, into a byte buffer"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._current = 0
+        self._length = 0  # Number of bits in self._current
+
+    def write(self, value, length):
+        self._current = (self._current << length) | value
+        self._length += length
+        while self._length >= 8:
+            self._length -= 8
+            self._buffer.append(self._current >> self._length)
+            self._current &= (1 << self._length) - 1
+
+    def getvalue(self):
+        """Returns the bits written so far padded with zeros"""
+        if not self._length:
+            return bytes(self._buffer)
+        return bytes(self._buffer + bytearray(
+            [self._current << (8 - self._length)]))
+
+
+class BitReader(object):
+    """Reads bits, most significant first, out of a byte buffer"""
+
+    def __init__(self, data):
+        self._data = bytearray(data)
+        self._position = 0
+        self._current = 0
+        self._length = 0  # Number of bits in self._current
+
+    def read(self, length):
+        while self._length < length:
+            if self._position >= len(self._data):
+                raise GorillaError("Truncated chunk")
+            self._current = (self._current << 8) | self._data[self._position]
+            self._position += 1
+            self._length += 8
+        self._length -= length
+        value = self._current >> self._length
+        self._current &= (1 << self._length) - 1
+        return value
+
+
+def _zigzag(value):
+    return value << 1 if value >= 0 else ((-value) << 1) - 1
+
+
+def _unzigzag(value):
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+
+def _write_dod(writer, dod):
+    if dod == 0:
+        writer.write(0, 1)
+        return
+    zigzagged = _zigzag(dod)
+    for prefix, prefix_length, length in _DOD_BUCKETS:
+        if zigzagged >> length == 0:
+            writer.write(prefix, prefix_length)
+            writer.write(zigzagged, length)
+            return
+    raise GorillaError("Delta-of-delta out of range: %d" % dod)
+
+
+def _read_dod(reader):
+    if not reader.read(1):
+        return 0
+    for _, prefix_length, length in _DOD_BUCKETS[:-1]:
+        if not reader.read(1):
+            return _unzigzag(reader.read(length))
+    return _unzigzag(reader.read(_DOD_BUCKETS[-1][2]))
+
+
+def _float_to_bits(value):
+    return struct.unpack(str(">Q"), struct.pack(str(">d"), value))[0]
+
+
+def _bits_to_float(bits):
+    return struct.unpack(str(">d"), struct.pack(str(">Q"), bits))[0]
+
+
+def _leading_zeros(bits):
+    return 64 - bits.bit_length()
+
+
+def _trailing_zeros(bits):
+    return (bits & -bits).bit_length() - 1
+
+
+def get_kind(values):
+    """Returns how a run of values can be compressed
+
+    :return: Either KIND_FLOAT or KIND_INT, None if the values cannot be
+        compressed (e.g. strings or integers that do not fit in 64 bits)
+    """
+    kind = None
+    for value in values:
+        if isinstance(value, bool):
+            return None
+        elif isinstance(value, float):
+            if kind == KIND_INT:
+                return None
+            kind = KIND_FLOAT
+        elif isinstance(value, six.integer_types):
+            if kind == KIND_FLOAT or not _INT64_MIN <= value <= _INT64_MAX:
+                return None
+            kind = KIND_INT
+        else:
+            return None
+    return kind
+
+
+def can_encode(timestamps, values):
+    """Whether the samples of a series can be compressed by :func:`encode`
+
+    :param timestamps: The epoch nanosecond timestamps of the samples
+    :type timestamps: list of int
+    :param values: The values of the samples
+    :type values: list
+    :rtype: bool
+    """
+    for timestamp in timestamps:
+        if isinstance(timestamp, bool):
+            return False
+        if not isinstance(timestamp, six.integer_types):
+            return False
+        if not 0 <= timestamp <= _INT64_MAX:
+            return False
+    return get_kind(values) is not None
+
+
+def encode(timestamps, values):
+    """Compresses the samples of a series
+
+    :param timestamps: The epoch nanosecond timestamps of the samples
+    :type timestamps: list of int
+    :param values: The values of the samples, either all floats or all
+        integers (see :func:`can_encode`)
+    :type values: list
+    :return: The compressed chunk
+    :rtype: bytes
+    """
+    kind = get_kind(values)
+    if kind is None or len(timestamps) != len(values):
+        raise GorillaError("Samples cannot be compressed")
+
+    writer = BitWriter()
+    writer.write(kind, 8)
+    writer.write(len(timestamps), 32)
+
+    previous_timestamp = previous_delta = 0
+    for index, timestamp in enumerate(timestamps):
+        if index == 0:
+            writer.write(timestamp, 64)
+        else:
+            delta = timestamp - previous_timestamp
+            _write_dod(writer, delta - previous_delta)
+            previous_delta = delta
+        previous_timestamp = timestamp
+
+    if kind == KIND_FLOAT:
+        _encode_floats(writer, values)
+    else:
+        _encode_ints(writer, values)
+
+    return writer.getvalue()
+
+
+def _encode_floats(writer, values):
+    previous = None
+    leading = trailing = None
+    for value in values:
+        bits = _float_to_bits(value)
+        if previous is None:
+            writer.write(bits, 64)
+            previous = bits
+            continue
+
+        xored = bits ^ previous
+        previous = bits
+        if not xored:
+            writer.write(0, 1)
+            continue
+
+        new_leading = min(_leading_zeros(xored), 31)
+        new_trailing = _trailing_zeros(xored)
+        in_window = leading is not None and leading <= new_leading
+        if in_window and trailing <= new_trailing:
+            # Fits in the window of the previous value
+            writer.write(0b10, 2)
+            writer.write(xored >> trailing, 64 - leading - trailing)
+        else:
+            leading, trailing = new_leading, new_trailing
+            meaningful = 64 - leading - trailing
+            writer.write(0b11, 2)
+            writer.write(leading, 5)
+            # 64 meaningful bits cannot be written on 6 bits: 0 stands for it
+            writer.write(meaningful & 0x3F, 6)
+            writer.write(xored >> trailing, meaningful)
+
+
+def _encode_ints(writer, values):
+    previous_value = previous_delta = 0
+    for index, value in enumerate(values):
+        if index == 0:
+            writer.write(value & _UINT64_MASK, 64)
+        else:
+            delta = value - previous_value
+            _write_dod(writer, delta - previous_delta)
+            previous_delta = delta
+        previous_value = value
+
+
+def decode(data):
+    """Decompresses a chunk built by :func:`encode`
+
+    :param data: The compressed chunk
+    :type data: bytes
+    :return: The timestamps and the values of the samples
+    :rtype: tuple of (list of int, list)
+    :raises: :class:`GorillaError` if the chunk is invalid
+    """
+    reader = BitReader(data)
+    kind = reader.read(8)
+    count = reader.read(32)
+
+    timestamps = []
+    timestamp = delta = 0
+    for index in range(count):
+        if index == 0:
+            timestamp = reader.read(64)
+        else:
+            delta += _read_dod(reader)
+            timestamp += delta
+        timestamps.append(timestamp)
+
+    if kind == KIND_FLOAT:
+        values = _decode_floats(reader, count)
+    elif kind == KIND_INT:
+        values = _decode_ints(reader, count)
+    else:
+        raise GorillaError("Unknown value kind `%d`" % kind)
+
+    return timestamps, values
+
+
+def _decode_floats(reader, count):
+    values = []
+    bits = 0
+    leading = trailing = 0
+    for index in range(count):
+        if index == 0:
+            bits = reader.read(64)
+        elif reader.read(1):
+            if reader.read(1):
+                leading = reader.read(5)
+                meaningful = reader.read(6) or 64
+                trailing = 64 - leading - meaningful
+            bits ^= reader.read(64 - leading - trailing) << trailing
+        values.append(_bits_to_float(bits))
+    return values
+
+
+def _decode_ints(reader, count):
+    values = []
+    value = delta = 0
+    for index in range(count):
+        if index == 0:
+            value = reader.read(64)
+            if value > _INT64_MAX:
+                value -= 1 << 64
+        else:
+            delta += _read_dod(reader)
+            value += delta
+        values.append(value)
+    return values
@@ -0,0 +1,192 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Series registration used by the version 3 frames
+
+The static attributes of a series (name, unit, type, resource_id, host and
+resource_metadata) almost never change from one pull to the other. So the
+agent registers each series once by sending its static attributes along with
+a numeric ID, then only sends ``[series_id, timestamp, value]`` samples.
+
+The agent/publisher link has no back channel, so the publisher cannot ask
+for a series it does not know about (e.g. after a restart). Instead, the
+agent registers all of its series again every ``registration_interval``
+seconds. Each agent run picks a random session ID so that the publisher never
+mixes up the series IDs of two runs of the same agent.
+"""
+
+from __future__ import unicode_literals
+
+import random
+import time
+
+from oslo_log import log
+from watcher_metering.protocol.frame import decode_record
+
+LOG = log.getLogger(__name__)
+
+_now = getattr(time, "monotonic", time.time)
+
+
+def new_session_id():
+    return random.SystemRandom().getrandbits(63)
+
+
+class SeriesRegistry(object):
+    """Agent side registry assigning an ID to each series
+
+    Not thread-safe: it is meant to be used by the sender thread only.
+    """
+
+    def __init__(self, registration_interval=60, max_series=100000):
+        """
+        :param registration_interval: Time (in seconds) after which all the
+            series are registered again
+        :type registration_interval: float
+        :param max_series: Maximum number of series in a session, a new
+            session is started with the next frame once it is reached
+        :type max_series: int
+        """
+        self.registration_interval = registration_interval
+        self.max_series = max_series
+
+        self.session_id = None
+        self._series_ids = {}
+        self._registered = set()
+        self._registered_at = None
+        self._new_session()
+
+    def _new_session(self):
+        self.session_id = new_session_id()
+        self._series_ids.clear()
+        self._registered.clear()
+        self._registered_at = _now()
+
+    def __len__(self):
+        return len(self._series_ids)
+
+    def encode(self, packed_samples):
+        """Splits samples into the registrations and samples of a frame
+
+        :param packed_samples: The samples to be sent
+        :type packed_samples: list of (packed_static, timestamp, value)
+            tuples
+        :return: The registrations and the samples to put into the frame
+        :rtype: tuple of (list of (series_id, packed_static),
+            list of (series_id, timestamp, value))
+        """
+        if len(self._series_ids) >= self.max_series:
+            # Series come and go (e.g. processes) so we start over instead of
+            # keeping track of the ones which are gone
+            LOG.info("[Agent] %d series registered, starting a new session",
+                     len(self._series_ids))
+            self._new_session()
+        elif _now() - self._registered_at >= self.registration_interval:
+            self.forget()
+
+        registrations = []
+        samples = []
+        for packed_static, timestamp, value in packed_samples:
+            series_id = self._series_ids.get(packed_static)
+            if series_id is None:
+                series_id = len(self._series_ids)
+                self._series_ids[packed_static] = series_id
+            if series_id not in self._registered:
+                self._registered.add(series_id)
+                registrations.append((series_id, packed_static))
+            samples.append((series_id, timestamp, value))
+
+        return registrations, samples
+
+    def forget(self):
+        """Registers all the series again within the next frames
+
+        To be called whenever a frame (and hence possibly some registrations)
+        could not be delivered.
+        """
+        self._registered.clear()
+        self._registered_at = _now()
+
+
+class SeriesSessions(object):
+    """Publisher side registry of the series of every agent session"""
+
+    def __init__(self, session_ttl=600):
+        """
+        :param session_ttl: Time (in seconds) after which the series of an
+            agent session which did not send anything are discarded
+        :type session_ttl: float
+        """
+        self.session_ttl = session_ttl
+        self.unknown_samples = 0
+
+        self._sessions = {}
+        self._last_seen = {}
+        self._purged_at = _now()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def expand(self, session_id, registrations, samples):
+        """Registers series and turns samples back into measurements
+
+        Samples referring to a series which is not registered (e.g. because
+        the publisher restarted) are discarded: the agent will register it
+        again soon enough.
+
+        :param session_id: The ID of the agent session
+        :type session_id: int
+        :param registrations: The series to be registered
+        :type registrations: list of [series_id, static]
+        :param samples: The samples to be expanded
+        :type samples: list of [series_id, timestamp, value]
+        :return: The measurements
+        :rtype: list of dict
+        """
+        now = _now()
+        if now - self._purged_at >= self.session_ttl:
+            self._purge(now)
+
+        series = self._sessions.setdefault(session_id, {})
+        self._last_seen[session_id] = now
+
+        for series_id, static in registrations:
+            if len(static) != 6:
+                raise ValueError("Invalid series `%r`" % (static,))
+            series[series_id] = static
+
+        measurements = []
+        unknown_samples = 0
+        for series_id, timestamp, value in samples:
+            static = series.get(series_id)
+            if static is None:
+                unknown_samples += 1
+                continue
+            measurements.append(decode_record(static, timestamp, value))
+
+        if unknown_samples:
+            self.unknown_samples += unknown_samples
+            LOG.warning("[Publisher] %d sample(s) of unregistered series "
+                        "discarded (session %s)", unknown_samples, session_id)
+        return measurements
+
+    def _purge(self, now):
+        for session_id, last_seen in list(self._last_seen.items()):
+            if now - last_seen >= self.session_ttl:
+                LOG.debug("[Publisher] Session %s expired", session_id)
+                del self._sessions[session_id]
+                del self._last_seen[session_id]
+        self._purged_at = now
@@ -19,10 +19,12 @@ import abc
 import os
 import threading
 
-import msgpack
 import nanomsg
 from oslo_log import log
 import six
+from watcher_metering.protocol.frame import FrameError
+from watcher_metering.protocol.frame import FrameUnpacker
+from watcher_metering.protocol.series import SeriesSessions
 
 LOG = log.getLogger(__name__)
 
@@ -32,7 +34,8 @@ class PublisherServerBase(threading.Thread):
 
     def __init__(self, use_nanoconfig_service, publisher_endpoint,
                  nanoconfig_service_endpoint, nanoconfig_update_endpoint,
-                 nanoconfig_profile):
+                 nanoconfig_profile, session_ttl=600,
+                 receive_buffer_size=1024 * 1024):
         super(PublisherServerBase, self).__init__()
         self.socket = nanomsg.Socket(nanomsg.PULL)
         self.use_nanoconfig_service = use_nanoconfig_service
@@ -40,6 +43,16 @@ class PublisherServerBase(threading.Thread):
         self.nanoconfig_service_endpoint = nanoconfig_service_endpoint
         self.nanoconfig_update_endpoint = nanoconfig_update_endpoint
         self.nanoconfig_profile = nanoconfig_profile
+        # Series registered by the agents sending series frames
+        self.sessions = SeriesSessions(session_ttl)
+        self.unpacker = FrameUnpacker(self.sessions, receive_buffer_size)
+
+        # Every message is received into the same buffer
+        self.receive_buffer_size = receive_buffer_size
+        self._receive_buffer = nanomsg.create_writable_buffer(
+            receive_buffer_size)
+        self._receive_view = memoryview(self._receive_buffer)
+        self.truncated_messages = 0
 
         self.daemon = True
         self._terminated = False
@@ -59,11 +72,11 @@ class PublisherServerBase(threading.Thread):
         self._terminated = value
 
     @abc.abstractmethod
-    def on_receive(self, msg):
+    def on_receive(self, msgs):
         """
-        Action to be carried upon receiving a message from an agent
-        :param msg: The serialized message
-        :type msg: str
+        Action to be carried upon receiving a frame from an agent
+        :param msgs: The measurements carried by the received frame
+        :type msgs: list of dict
         """
         raise NotImplementedError
 
@@ -105,6 +118,25 @@ class PublisherServerBase(threading.Thread):
         else:
             self.nanoconfig_update_endpoint = nn_config_updates
 
+    def receive(self):
+        """Receives a message into the reusable receive buffer
+
+        :return: A view onto the received message (only valid until the next
+            call), None if the message did not fit into the buffer
+        :rtype: memoryview
+        """
+        size, _ = nanomsg.wrapper.nn_recv(
+            self.socket.fd, self._receive_buffer, 0)
+        if size < 0:
+            raise nanomsg.NanoMsgAPIError()
+        if size > self.receive_buffer_size:
+            self.truncated_messages += 1
+            LOG.error("[Publisher] Message of %d bytes discarded as it does "
+                      "not fit into the receive buffer (%d bytes)",
+                      size, self.receive_buffer_size)
+            return None
+        return self._receive_view[:size]
+
     def stop(self):
         super(PublisherServerBase, self).stop()
         self.socket.close()
@@ -121,12 +153,13 @@ class PublisherServerBase(threading.Thread):
         while not self.terminated:
             try:
                 LOG.debug("[Publisher] Waiting for message")
-                raw = self.socket.recv()
-                msg = msgpack.loads(raw, encoding='utf-8')
-                LOG.debug("[Publisher] Received message --> `%r`", msg)
-                self.on_receive(msg)
-            except (ValueError,
-                    msgpack.ExtraData,
+                raw = self.receive()
+                if raw is None:
+                    continue
+                msgs = self.unpacker.unpack(raw)
+                LOG.debug("[Publisher] Received %d measurement(s)", len(msgs))
+                self.on_receive(msgs)
+            except (FrameError,
                     nanomsg.NanoMsgError) as exc:
                 LOG.exception(exc)
                 LOG.error(
@@ -18,7 +18,7 @@
 from __future__ import unicode_literals
 
 from oslo_config import cfg
-
+from watcher_metering.store.opts import STORES
 
 PUBLISHER_OPTS = (
     cfg.StrOpt(
@@ -82,6 +82,60 @@ PUBLISHER_OPTS = (
         required=True,
         help='Minimum size for the worker pool',
     ),
+    cfg.IntOpt(
+        'session_ttl',
+        default=600,
+        min=1,
+        help='Time (in seconds) after which the series registered by an '
+             'agent which stopped sending data are discarded',
+    ),
+    cfg.IntOpt(
+        'receive_buffer_size',
+        default=1024 * 1024,
+        min=1024,
+        help='Size (in bytes) of the buffer the messages sent by the agents '
+             'are received into. Larger messages are discarded',
+    ),
+    cfg.FloatOpt(
+        'pool_check_interval',
+        default=1.,
+        min=.01,
+        help='Time (in seconds) between two adjustments of the size of the '
+             'worker pool',
+    ),
+    cfg.FloatOpt(
+        'pool_target_wait',
+        default=.05,
+        min=0,
+        help='Mean time (in seconds) the messages may wait in the queue '
+             'before the worker pool grows',
+    ),
+    cfg.FloatOpt(
+        'pool_scale_down_delay',
+        default=30.,
+        min=0,
+        help='Time (in seconds) the worker pool must have been oversized '
+             'for before a worker gets stopped',
+    ),
+)
+
+# How the workers batch the messages sent to each store
+STORE_BATCH_OPTS = (
+    cfg.IntOpt(
+        'batch_size',
+        default=100,
+        min=1,
+        help='Number of messages a worker gathers before sending them to '
+             'the store in one go (the frames received from the agents are '
+             'never split)',
+    ),
+    cfg.FloatOpt(
+        'batch_linger',
+        default=10,
+        min=0,
+        help='Time (in milliseconds) a worker waits for more messages '
+             'before sending an incomplete batch to the store',
+    ),
 )
 
 PUBLISHER_GROUP_NAME = "publisher"
@@ -91,7 +145,27 @@ def register_publisher_opts(conf):
     conf.register_opts(PUBLISHER_OPTS, group=PUBLISHER_GROUP_NAME)
 
 
+def get_store_batch_group_name(metrics_store):
+    return "%s.%s" % (PUBLISHER_GROUP_NAME, metrics_store)
+
+
+def get_store_batch_opts(conf, metrics_store):
+    """
+    :param conf: Configuration obtained from a configuration file
+    :type conf: oslo_config.cfg.ConfigOpts instance
+    :param metrics_store: The name of the store
+    :type metrics_store: str
+    :return: The batch options of the given store
+    """
+    group_name = get_store_batch_group_name(metrics_store)
+    conf.register_opts(STORE_BATCH_OPTS, group=group_name)
+    return conf.get(group_name)
+
+
 def list_opts():
     return [
         (PUBLISHER_GROUP_NAME, PUBLISHER_OPTS),
+    ] + [
+        (get_store_batch_group_name(store_cls.get_name()), STORE_BATCH_OPTS)
+        for store_cls in STORES
     ]
@@ -19,6 +19,9 @@ from threading import Thread
 from oslo_log import log
 from six.moves.queue import Queue
 from watcher_metering.publisher.base import PublisherServerBase
+from watcher_metering.publisher.supervisor import PoolStats
+from watcher_metering.publisher.supervisor import PoolSupervisor
+from watcher_metering.publisher.supervisor import QueuedFrame
 from watcher_metering.publisher.worker import Worker
 
 LOG = log.getLogger(__name__)
@@ -29,7 +32,9 @@ class Publisher(PublisherServerBase):
     def __init__(self, use_nanoconfig_service, publisher_endpoint,
                  nanoconfig_service_endpoint, nanoconfig_update_endpoint,
                  nanoconfig_profile, metrics_store, max_queue_size,
-                 max_worker, min_worker=5):
+                 max_worker, min_worker=5, session_ttl=600,
+                 receive_buffer_size=1024 * 1024, pool_check_interval=1.,
+                 pool_target_wait=.05, pool_scale_down_delay=30.):
         """
         :param use_nanoconfig_service: Indicates whether or not it should use a
             nanoconfig service
@@ -48,11 +53,26 @@ class Publisher(PublisherServerBase):
         :type max_worker: int
         :param min_worker: Min number of worker to be spawned at a given time
         :type min_worker: int
+        :param session_ttl: Time (in seconds) after which the series
+            registered by an idle agent are discarded
+        :type session_ttl: int
+        :param receive_buffer_size: Size (in bytes) of the buffer messages
+            are received into, larger messages are discarded
+        :type receive_buffer_size: int
+        :param pool_check_interval: Time (in seconds) between two
+            adjustments of the worker pool
+        :type pool_check_interval: float
+        :param pool_target_wait: Mean time (in seconds) the messages may
+            wait in the queue before the worker pool grows
+        :type pool_target_wait: float
+        :param pool_scale_down_delay: Time (in seconds) the worker pool must
+            have been oversized for before a worker gets stopped
+        :type pool_scale_down_delay: float
         """
         super(Publisher, self).__init__(
             use_nanoconfig_service, publisher_endpoint,
             nanoconfig_service_endpoint, nanoconfig_update_endpoint,
-            nanoconfig_profile
+            nanoconfig_profile, session_ttl, receive_buffer_size
         )
         self.max_queue_size = max_queue_size
         self.metrics_store = metrics_store
@@ -61,47 +81,37 @@ class Publisher(PublisherServerBase):
 
         self.msg_queue = Queue(self.max_queue_size)
         self.workers = []
+        self.pool_stats = PoolStats()
+        self.supervisor = PoolSupervisor(
+            self, pool_check_interval, pool_target_wait,
+            pool_scale_down_delay)
 
     @property
     def num_workers(self):
         return len(self.workers)
 
-    def on_receive(self, msg):
-        LOG.debug('[Publisher] Queue msg size = %s | workers = %s',
-                  self.msg_queue.qsize(), self.num_workers)
-        try:
-            self.check_workers_alive()
-            self.adjust_pool_size()
-        except OSError as exc:
-            LOG.exception(exc)
-            LOG.error("[Publisher] Error upon receiving a message")
+    def run(self):
+        # The pool is managed from the supervisor thread, so that receiving
+        # a message only takes decoding and queueing it
+        while self.num_workers < self.min_worker:
+            self.start_worker()
+        self.supervisor.start()
+        super(Publisher, self).run()
 
-        self.msg_queue.put(msg)
+    def on_receive(self, msgs):
+        # The whole frame is queued as a single unit of work
+        self.msg_queue.put(QueuedFrame(msgs))
 
     def check_workers_alive(self):
-        # Because we can create new workers in this loop, we create a copy
-        # --> We could otherwise loop onto a new workers...
-        worker_items = self.workers[:]
-        for worker_thread in worker_items:
+        for worker_thread in self.workers[:]:
             if not worker_thread.is_alive():
-                self.workers.pop(self.workers.index(worker_thread))
-                self.start_worker()
-
-    def adjust_pool_size(self):
-        needed_size = self.msg_queue.qsize() + self.min_worker
-        if abs(needed_size - self.num_workers) > self.min_worker * 2:
-            LOG.debug(("[Publisher] Auto adjust pool size needed size is `%s` "
-                       "and the current size is `%s`"),
-                      needed_size, self.num_workers)
-            while self.num_workers > min(self.min_worker, needed_size):
-                self.stop_worker()
-            # Create enough, but not too many
-            while self.num_workers < min(self.max_worker, needed_size):
+                self.workers.remove(worker_thread)
+                LOG.warning("[Publisher] Replacing a dead worker")
                 self.start_worker()
 
     def start_worker(self):
         LOG.debug("[Publisher] starting worker")
-        worker = Worker(self.msg_queue, self.metrics_store)
+        worker = Worker(self.msg_queue, self.metrics_store, self.pool_stats)
         worker.start()
         self.workers.append(worker)
 
@@ -112,10 +122,11 @@ class Publisher(PublisherServerBase):
             worker.stop()
 
     def stop(self):
+        self.supervisor.stop()
         super(Publisher, self).stop()
         join_threads = []
-        for key in self.workers:
-            t = Thread(target=self.workers.get(key).stop)
+        for worker in self.workers:
+            t = Thread(target=worker.stop)
             t.start()
             join_threads.append(t)
         for join_thread in join_threads:
@@ -0,0 +1,201 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Sizes the worker pool of the Publisher from a thread of its own"""
+
+from __future__ import unicode_literals
+
+import math
+from threading import Event
+from threading import Lock
+from threading import Thread
+import time
+
+from oslo_log import log
+
+LOG = log.getLogger(__name__)
+
+_now = getattr(time, "monotonic", time.time)
+
+
+class QueuedFrame(list):
+    """The measurements of a frame, stamped with the time they got queued"""
+
+    def __init__(self, msgs, enqueued_at=None):
+        super(QueuedFrame, self).__init__(msgs)
+        self.enqueued_at = _now() if enqueued_at is None else enqueued_at
+
+
+class PoolStats(object):
+    """What the workers went through since the supervisor last looked"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._frames = 0
+        self._wait_time = 0.
+        self._service_time = 0.
+
+    def record(self, wait_time, service_time):
+        """Called by the workers once they sent a frame to the store
+
+        :param wait_time: Time (in seconds) the frame spent in the queue
+        :type wait_time: float
+        :param service_time: Time (in seconds) the store took to get it
+        :type service_time: float
+        """
+        with self._lock:
+            self._frames += 1
+            self._wait_time += wait_time
+            self._service_time += service_time
+
+    def collect(self):
+        """
+        :return: The number of frames sent along with their total wait and
+            service times since the last call
+        :rtype: tuple
+        """
+        with self._lock:
+            collected = (self._frames, self._wait_time, self._service_time)
+            self._frames = 0
+            self._wait_time = self._service_time = 0.
+        return collected
+
+
+class PoolSupervisor(Thread):
+    """Grows and shrinks the worker pool of the Publisher
+
+    Every ``check_interval`` seconds, the dead workers are replaced and the
+    size of the pool is adjusted out of smoothed (EWMA) figures: the arrival
+    rate of the frames, the time the store takes to get a frame and the
+    time frames wait in the queue. The pool is sized after Little's law
+    (arrival rate times service time, with some headroom) and grows at once
+    whenever the frames wait longer than ``target_wait`` or the arrival rate
+    rises above its average, i.e. at the start of a burst. It only shrinks
+    one worker at a time, once it has been oversized for ``scale_down_delay``
+    seconds in a row, so that it does not thrash.
+    """
+
+    SMOOTHING = .3  # Weight of the latest sample in the averages
+    HEADROOM = 1.25
+
+    def __init__(self, publisher, check_interval=1., target_wait=.05,
+                 scale_down_delay=30.):
+        """
+        :param publisher: The publisher whose pool is supervised
+        :type publisher: :class:`Publisher` instance
+        :param check_interval: Time (in seconds) between two adjustments
+        :type check_interval: float
+        :param target_wait: Mean time (in seconds) frames may wait in the
+            queue before the pool grows
+        :type target_wait: float
+        :param scale_down_delay: Time (in seconds) the pool must have been
+            oversized for before a worker gets stopped
+        :type scale_down_delay: float
+        """
+        super(PoolSupervisor, self).__init__(name="pool-supervisor")
+        self.publisher = publisher
+        self.check_interval = check_interval
+        self.target_wait = target_wait
+        self.scale_down_delay = scale_down_delay
+        self.daemon = True
+
+        self.arrival_rate = 0.  # Frames per second
+        self.service_time = 0.  # Seconds per frame
+        self.queue_wait = 0.  # Seconds per frame
+
+        self._stopped = Event()
+        self._last_check = None
+        self._last_queue_size = 0
+        self._oversized_since = None
+
+    def run(self):
+        LOG.info("[Publisher] Pool supervisor started")
+        while not self._stopped.wait(self.check_interval):
+            try:
+                self.check()
+            except Exception as exc:
+                LOG.exception(exc)
+
+    def stop(self):
+        self._stopped.set()
+
+    def check(self, now=None):
+        """Replaces the dead workers then adjusts the size of the pool"""
+        now = _now() if now is None else now
+        self.publisher.check_workers_alive()
+        rate = self._update_averages(now)
+
+        current = self.publisher.num_workers
+        target = self._get_target_size(rate)
+        if target > current:
+            LOG.debug("[Publisher] Growing the pool from %d to %d worker(s) "
+                      "(queue wait: %.3fs, service time: %.3fs, %.1f "
+                      "frame(s)/s)", current, target, self.queue_wait,
+                      self.service_time, self.arrival_rate)
+            for _ in range(target - current):
+                self.publisher.start_worker()
+            self._oversized_since = None
+        elif target < current:
+            if self._oversized_since is None:
+                self._oversized_since = now
+            elif now - self._oversized_since >= self.scale_down_delay:
+                LOG.debug("[Publisher] Shrinking the pool to %d worker(s)",
+                          current - 1)
+                self.publisher.stop_worker()
+                self._oversized_since = now  # One worker per delay
+        else:
+            self._oversized_since = None
+
+    def _update_averages(self, now):
+        """
+        :return: The arrival rate since the last check
+        :rtype: float
+        """
+        frames, wait_time, service_time = self.publisher.pool_stats.collect()
+        queue_size = self.publisher.msg_queue.qsize()
+        elapsed = now - self._last_check if self._last_check else 0
+        self._last_check = now
+
+        rate = 0.
+        if elapsed > 0:
+            arrivals = frames + queue_size - self._last_queue_size
+            rate = max(arrivals, 0) / elapsed
+        self._last_queue_size = queue_size
+        self.arrival_rate = self._smooth(self.arrival_rate, rate)
+
+        if frames:
+            self.queue_wait = self._smooth(self.queue_wait,
+                                           wait_time / frames)
+            self.service_time = self._smooth(self.service_time,
+                                             service_time / frames)
+        else:
+            # Nothing got through: the frames queued are still waiting
+            self.queue_wait = self._smooth(
+                self.queue_wait, elapsed if queue_size else 0.)
+        return rate
+
+    def _smooth(self, average, sample):
+        return average + self.SMOOTHING * (sample - average)
+
+    def _get_target_size(self, rate):
+        current = self.publisher.num_workers
+        # Grows ahead of a burst, but only shrinks along with the average
+        peak_rate = max(rate, self.arrival_rate)
+        needed = int(math.ceil(peak_rate * self.service_time * self.HEADROOM))
+        if self.queue_wait > self.target_wait:
+            needed = max(needed, current + 1)
+        return min(max(needed, self.publisher.min_worker),
+                   self.publisher.max_worker)
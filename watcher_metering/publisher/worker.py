@@ -20,6 +20,9 @@ from threading import Thread
 
 from oslo_config import cfg
 from oslo_log import log
+from six.moves.queue import Empty
+from watcher_metering.publisher.opts import get_store_batch_opts
+from watcher_metering.publisher.supervisor import _now
 from watcher_metering.store.loader import StoreClientLoader
 
 LOG = log.getLogger(__name__)
@@ -27,9 +30,11 @@ LOG = log.getLogger(__name__)
 
 class Worker(Thread):
 
-    def __init__(self, queue, client_name):
+    def __init__(self, queue, client_name, stats=None):
         super(Worker, self).__init__()
         self.queue = queue
+        # Where the wait and service times of the frames are recorded
+        self.stats = stats
         self._terminated = False
         self.setDaemon(True)
 
@@ -37,6 +42,10 @@ class Worker(Thread):
         self._client_loader = StoreClientLoader(cfg.CONF, client_name)
         self.client = self._client_loader.load()
 
+        batch_opts = get_store_batch_opts(cfg.CONF, client_name)
+        self.batch_size = batch_opts.batch_size
+        self.batch_linger = batch_opts.batch_linger / 1000.  # In seconds
+
     @property
     def terminated(self):
         return self._terminated
@@ -56,19 +65,69 @@ class Worker(Thread):
         while not self.terminated:
             try:
                 LOG.info("[Worker] Waiting for a message...")
-                msg = self.queue.get()
-                LOG.info("[Worker] Sending the message to the store: %r", msg)
-                self.client.send(msg)
+                frames = self.get_batch()
+                started = _now()
+                msgs = []
+                for frame in frames:
+                    if isinstance(frame, dict):
+                        msgs.append(frame)
+                    else:
+                        msgs.extend(frame)
+                LOG.info("[Worker] Sending %d message(s) to the store",
+                         len(msgs))
+                self.send(msgs)
+                if self.stats is not None:
+                    self._record(frames, started)
             except Exception as exc:
                 # Error ignored not to keep our worker running
                 LOG.exception(exc)
-            else:
-                LOG.info("[Worker] Message sent successfully!")
 
         try:
             self.client.disconnect()
         except Exception as exc:
             LOG.exception(exc)
 
+    def get_batch(self):
+        """Waits for a frame, then for more of them until the batch is full
+
+        :return: The frames taken from the queue, holding up to
+            ``batch_size`` messages unless the last one does not fit
+        :rtype: list
+        """
+        frames = [self.queue.get()]
+        size = self._get_size(frames[0])
+        deadline = _now() + self.batch_linger
+        while size < self.batch_size:
+            timeout = deadline - _now()
+            try:
+                if timeout > 0:
+                    frame = self.queue.get(timeout=timeout)
+                else:
+                    frame = self.queue.get_nowait()
+            except Empty:
+                break
+            frames.append(frame)
+            size += self._get_size(frame)
+        return frames
+
+    @staticmethod
+    def _get_size(frame):
+        return 1 if isinstance(frame, dict) else len(frame)
+
+    def _record(self, frames, started):
+        # The frames of a batch share its round trip to the store
+        service_time = (_now() - started) / len(frames)
+        for frame in frames:
+            enqueued_at = getattr(frame, "enqueued_at", started)
+            self.stats.record(started - enqueued_at, service_time)
+
+    def send(self, msgs):
+        try:
+            self.client.send_batch(msgs)
+        except Exception as exc:
+            LOG.exception(exc)
+        else:
+            LOG.debug("[Worker] Messages sent successfully!")
+
     def stop(self):
         self.terminated = True
@@ -18,10 +18,13 @@ from __future__ import unicode_literals
 
 import abc
 
+from oslo_log import log
 import six
 from watcher_metering.load.loadable import Loadable
 from watcher_metering.store.loader import StoreClientLoader
 
+LOG = log.getLogger(__name__)
+
 
 @six.add_metaclass(abc.ABCMeta)
 class MetricsStoreClientBase(Loadable):
@@ -68,6 +71,24 @@ class MetricsStoreClientBase(Loadable):
     def send(self, metric):
         raise NotImplementedError  # pragma: nocover
 
+    def send_batch(self, metrics):
+        """Sends several metrics to the store at once
+
+        Store clients supporting bulk writes should override this so that a
+        whole batch takes a single round trip. By default, the metrics are
+        sent one at a time.
+
+        :param metrics: The metrics to send
+        :type metrics: list of dict
+        """
+        for metric in metrics:
+            try:
+                self.send(metric)
+            except Exception as exc:
+                # A faulty metric must not prevent the rest of the batch
+                # from being sent
+                LOG.exception(exc)
+
 
 class MetricsStoreError(Exception):
     pass
@@ -25,6 +25,7 @@ from watcher_metering.store.base import MetricsStoreClientBase
 from watcher_metering.store.base import MetricsStoreError
 from watcher_metering.store.utils.keystone import KeystoneClient
 from watcher_metering.store.utils.keystone import KeystoneError
+from watcher_metering.store.utils.timestamp import to_isoformat
 
 LOG = log.getLogger(__name__)
 
@@ -126,11 +127,14 @@ class CeilometerClient(MetricsStoreClientBase):
                     "project_id": metric.get("project_id", ""),
                     "resource_id": metric.get("resource_id", ""),
                     "resource_metadata": metric["resource_metadata"],
-                    "timestamp": metric["timestamp"]
+                    "timestamp": to_isoformat(metric["timestamp"])
                 }
             ])
         except KeystoneError as exc:
             LOG.exception(exc)
+        except ValueError as exc:
+            LOG.exception(exc)
+            raise MetricsStoreError("Invalid timestamp: %r" % exc)
 
     def request_http_post(self, metric):
         try:
@@ -17,22 +17,74 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
+import zlib
+
 from influxdb import InfluxDBClient
 
 from oslo_config import cfg
 from oslo_log import log
+import requests
 
 from watcher_metering.store.base import MetricsStoreClientBase
 from watcher_metering.store.base import MetricsStoreError
+from watcher_metering.store.utils.line_protocol import LineProtocolBuffer
+from watcher_metering.store.utils.line_protocol import PRECISIONS
+from watcher_metering.store.utils.timestamp import to_epoch_ns
+from watcher_metering.store.utils.udp import DEFAULT_PAYLOAD_SIZE
+from watcher_metering.store.utils.udp import MAX_PAYLOAD_SIZE
+from watcher_metering.store.utils.udp import UdpLineSender
 
 LOG = log.getLogger(__name__)
 
+MANDATORY_FIELDS = frozenset(("name", "unit", "type", "value",
+                              "resource_id", "host", "timestamp"))
+
+# Most of the gain of gzip, for a fraction of its CPU time
+GZIP_LEVEL = 1
+
+# Tag or field key -> attribute of the metric, the entries of its resource
+# metadata being referred to as `resource_metadata.<key>`
+DEFAULT_TAGS = {
+    "counter_name": "name",
+    "counter_unit": "unit",
+    "counter_type": "type",
+    "host": "host",
+    "resource_id": "resource_id",
+}
+DEFAULT_FIELDS = {
+    "value": "value",
+}
+
+METADATA_PREFIX = "resource_metadata."
+
+HTTP = "http"
+UDP = "udp"
+TRANSPORTS = (HTTP, UDP)
+
+
+def get_attribute(metric, attribute):
+    """
+    :param metric: The metric
+    :type metric: dict
+    :param attribute: Name of the attribute, or `resource_metadata.<key>`
+    :type attribute: str
+    :return: The value of the attribute (None if missing)
+    """
+    if attribute.startswith(METADATA_PREFIX):
+        metadata = metric.get("resource_metadata") or {}
+        return metadata.get(attribute[len(METADATA_PREFIX):])
+    return metric.get(attribute)
+
 
 class InfluxClient(MetricsStoreClientBase):
     """InfluxDBClient client"""
 
     def __init__(self, default_host, default_port, default_database,
-                 default_username, default_password, create_database):
+                 default_username, default_password, create_database,
+                 time_precision="n", use_gzip=True, tags=None, fields=None,
+                 legacy_schema=False, transport=HTTP, udp_port=8089,
+                 udp_payload_size=DEFAULT_PAYLOAD_SIZE,
+                 udp_flush_interval=1.):
         """
         :param default_host: InfluxDB host
         :type default_host: str
@@ -46,6 +98,30 @@ class InfluxClient(MetricsStoreClientBase):
         :type default_password: str
         :param create_database: If true, the database is created.
         :type create_database: bool
+        :param time_precision: Precision of the timestamps written (n, u, ms
+            or s)
+        :type time_precision: str
+        :param use_gzip: Whether the batches are sent gzip-compressed
+        :type use_gzip: bool
+        :param tags: Tag key -> attribute of the metric it is taken from
+            (defaults to :data:`DEFAULT_TAGS`)
+        :type tags: dict
+        :param fields: Field key -> attribute of the metric it is taken from
+            (defaults to :data:`DEFAULT_FIELDS`)
+        :type fields: dict
+        :param legacy_schema: Whether the value is also written as the
+            `counter_volume` tag, as it used to be
+        :type legacy_schema: bool
+        :param transport: Whether the points are written over HTTP or sent
+            over UDP, without any acknowledgement
+        :type transport: str
+        :param udp_port: Port of the UDP listener of InfluxDB
+        :type udp_port: int
+        :param udp_payload_size: Maximum size (in bytes) of the datagrams
+        :type udp_payload_size: int
+        :param udp_flush_interval: Time (in seconds) after which an
+            incomplete datagram is sent anyway
+        :type udp_flush_interval: float
         """
         super(InfluxClient, self).__init__()
 
@@ -55,6 +131,31 @@ class InfluxClient(MetricsStoreClientBase):
         self.default_username = default_username
         self.default_password = default_password
         self.create_database = create_database
+        self.time_precision = time_precision
+        self.use_gzip = use_gzip
+        self.tags = dict(DEFAULT_TAGS if tags is None else tags)
+        self.fields = dict(DEFAULT_FIELDS if fields is None else fields)
+        self.legacy_schema = legacy_schema
+        self._validate_schema()
+        if transport not in TRANSPORTS:
+            raise ValueError("Invalid transport `%s`" % transport)
+        self.transport = transport
+        self.udp_port = udp_port
+        self.udp_payload_size = udp_payload_size
+        self.udp_flush_interval = udp_flush_interval
+        self.udp_sender = None  # Created on connection
+
+        # Sorted once and for all, so are the cache keys of the series
+        self._tag_attributes = tuple(sorted(self.tags.items()))
+        self._field_attributes = tuple(sorted(self.fields.items()))
+
+        # Batches are written in line protocol over a keep-alive connection
+        self._session = requests.Session()
+        self._session.auth = (default_username, default_password)
+        self._write_url = "http://%s:%d/write" % (default_host, default_port)
+        self._write_params = {"db": default_database,
+                              "precision": time_precision}
+        self._lines = LineProtocolBuffer(time_precision)
 
         self._client = InfluxDBClient(
             host=self.default_host,
@@ -71,6 +172,17 @@ class InfluxClient(MetricsStoreClientBase):
             LOG.warn('Unable to create database %s' % self.default_database)
             LOG.exception(exc)
 
+    def _validate_schema(self):
+        if not self.fields:
+            raise ValueError("At least one field must be written")
+        both = set(self.tags) & set(self.fields)
+        if self.legacy_schema:
+            keys = set(self.tags).union(self.fields)
+            both.update(keys.intersection(["counter_volume"]))
+        if both:
+            raise ValueError("Both tag and field key(s): %s" %
+                             ", ".join(sorted(both)))
+
     @property
     def _is_need_to_create_database(self):
         database = list(filter(lambda database:
@@ -114,6 +226,68 @@ class InfluxClient(MetricsStoreClientBase):
                 default=False, required=False,
                 help='Create database on startup',
             ),
+            cfg.StrOpt(
+                'time_precision',
+                default="n", choices=sorted(PRECISIONS),
+                help='Precision of the timestamps written: n, u, ms or s '
+                     '(nano, micro, milliseconds or seconds)',
+            ),
+            cfg.BoolOpt(
+                'use_gzip',
+                default=True,
+                help='Whether the batches of points are sent gzip-compressed',
+            ),
+            cfg.DictOpt(
+                'tags',
+                default=DEFAULT_TAGS,
+                help='Tags of the points, as key:attribute pairs where the '
+                     'attribute of the metric is either name, unit, type, '
+                     'value, host, resource_id or resource_metadata.<key>. '
+                     'Every distinct set of tag values makes a new series: '
+                     'only map attributes with few distinct values to tags',
+            ),
+            cfg.DictOpt(
+                'fields',
+                default=DEFAULT_FIELDS,
+                help='Fields of the points, as key:attribute pairs (see '
+                     'tags)',
+            ),
+            cfg.BoolOpt(
+                'legacy_schema',
+                default=False,
+                help='Whether the value is also written as the '
+                     'counter_volume tag, as the previous versions did, for '
+                     'the databases whose queries still rely on it. Every '
+                     'distinct value then makes a new series',
+            ),
+            cfg.StrOpt(
+                'transport',
+                default=HTTP, choices=TRANSPORTS,
+                help='Whether the points are written over HTTP, or sent over '
+                     'UDP without waiting for any response (the points lost '
+                     'on the way go unnoticed). The database and the '
+                     'precision of the timestamps are then those of the UDP '
+                     'listener of InfluxDB, whose precision must match '
+                     'time_precision',
+            ),
+            cfg.IntOpt(
+                'udp_port',
+                default=8089, min=1, max=65535,
+                help='Port of the UDP listener of InfluxDB',
+            ),
+            cfg.IntOpt(
+                'udp_payload_size',
+                default=DEFAULT_PAYLOAD_SIZE, min=64, max=MAX_PAYLOAD_SIZE,
+                help='Maximum size (in bytes) of the datagrams, which should '
+                     'fit in the MTU of the network along with the IP and '
+                     'UDP headers (28 bytes)',
+            ),
+            cfg.FloatOpt(
+                'udp_flush_interval',
+                default=1., min=.01,
+                help='Time (in seconds) after which an incomplete datagram '
+                     'is sent anyway',
+            ),
         ]
 
     @property
@@ -121,38 +295,127 @@ class InfluxClient(MetricsStoreClientBase):
         return self._client
 
     def connect(self):
+        if self.transport == UDP and self.udp_sender is None:
+            self.udp_sender = UdpLineSender(
+                self.default_host, self.udp_port,
+                payload_size=self.udp_payload_size,
+                flush_interval=self.udp_flush_interval)
+            self.udp_sender.start()
         LOG.info("[InfluxDB] Client connected")
 
     def disconnect(self):
+        self._session.close()
+        if self.udp_sender is not None:
+            self.udp_sender.stop()
+            LOG.info("[InfluxDB] UDP stats: %r",
+                     self.udp_sender.stats.as_dict())
+            self.udp_sender = None
         LOG.info("[InfluxDB] Client disconnected")
 
-    def _send(self, point):
-        try:
-            self.store_endpoint.write_points([point])
-        except Exception as exc:
-            raise MetricsStoreError(
-                "Message formatting issue => "
-                "%r: '%r'" % (point, exc)
-            )
-
     def send(self, metric):
         LOG.debug('Publishing metrics to `%s:%d`',
                   self.default_host, self.default_port)
 
+        self._lines.clear()
         try:
-            point = self.create_point(metric)
+            self._add_line(metric)
         except (MetricsStoreError, KeyError) as exc:
             LOG.exception(exc)
             raise MetricsStoreError(exc)
+        self._flush()
+
+    def send_batch(self, metrics):
+        """Writes all the metrics within a single request"""
+        LOG.debug('Publishing %d metrics to `%s:%d`', len(metrics),
+                  self.default_host, self.default_port)
+
+        self._lines.clear()
+        for metric in metrics:
+            try:
+                self._add_line(metric)
+            except (MetricsStoreError, KeyError) as exc:
+                # A faulty metric must not prevent the rest of the batch
+                # from being sent
+                LOG.exception(exc)
+        self._flush()
+
+    def _add_line(self, metric):
+        if not isinstance(metric, dict):
+            raise MetricsStoreError("Invalid dictionary")
+        if not MANDATORY_FIELDS.issubset(metric):
+            raise MetricsStoreError("Missing mandatory fields")
+        try:
+            timestamp = to_epoch_ns(metric["timestamp"])
+        except ValueError as exc:
+            raise MetricsStoreError(exc)
+
+        try:
+            series_key = self._lines.get_series_key(metric["name"], tuple(
+                (key, self._get_tag(metric, attribute))
+                for key, attribute in self._tag_attributes))
+            self._lines.append(series_key, self._get_fields(metric),
+                               timestamp, extra_tags=self._get_extra_tags(
+                                   metric))
+        except TypeError as exc:
+            raise MetricsStoreError(exc)
+
+    @staticmethod
+    def _get_tag(metric, attribute):
+        value = get_attribute(metric, attribute)
+        return "" if value is None else value  # Empty tags are left out
+
+    def _get_fields(self, metric):
+        fields = []
+        for key, attribute in self._field_attributes:
+            value = get_attribute(metric, attribute)
+            if value is not None:  # Missing fields are left out
+                fields.append((key, value))
+        if not fields:
+            raise MetricsStoreError("No field to write")
+        return fields
+
+    def _get_extra_tags(self, metric):
+        if self.legacy_schema:
+            # Never cached: it differs from one point to the other
+            return (("counter_volume", metric["value"]),)
+        return ()
+
+    def _flush(self):
+        if not self._lines.count:
+            return
+        if self.transport == UDP:
+            if self.udp_sender is None:
+                raise MetricsStoreError("Not connected")
+            self.udp_sender.write(self._lines.get_lines())
+            return
+
+        data = self._lines.getvalue()
+        headers = {"Content-Type": "text/plain; charset=utf-8"}
+        if self.use_gzip:
+            compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            data = compressor.compress(data) + compressor.flush()
+            headers["Content-Encoding"] = "gzip"
 
         for _ in range(2):  # 2 attempts
             try:
-                self._send(point)
+                self._write(data, headers)
                 break
             except Exception as exc:
-                LOG.warn('Unable to send metric `%r`', point)
+                LOG.warn('Unable to send %d metric(s)', self._lines.count)
                 LOG.exception(exc)
 
+    def _write(self, data, headers):
+        try:
+            response = self._session.post(
+                self._write_url, params=self._write_params, data=data,
+                headers=headers, timeout=10)
+        except requests.RequestException as exc:
+            raise MetricsStoreError(exc)
+        if response.status_code != requests.codes.no_content:
+            raise MetricsStoreError(
+                "Could not write %d point(s): %d %s" % (
+                    self._lines.count, response.status_code, response.text))
+
     def create_point(self, metric):
         """Translates a dictionary of event attributes to an JSON Point object
 
@@ -164,37 +427,28 @@ class InfluxClient(MetricsStoreClientBase):
             if not isinstance(metric, dict):
                 raise MetricsStoreError("Invalid dictionary")
 
-            mandatory_fields = ("name", "unit", "type", "value",
-                                "resource_id", "host", "timestamp")
-
-            if not set(mandatory_fields).issubset(metric.keys()):
+            if not MANDATORY_FIELDS.issubset(metric):
                 raise MetricsStoreError("Missing mandatory fields")
 
             measurement = metric.get('name')
-            time = metric.get('timestamp')
-            value = metric.get('value')
-            tags = self._build_tags(metric)
+            time = to_epoch_ns(metric.get('timestamp'))
             point = {
                 "measurement": measurement,
-                "tags": tags,
+                "tags": self._build_tags(metric),
                 "time": time,
-                "fields": {
-                    "value": value
-                }
+                "fields": dict(self._get_fields(metric)),
             }
             return point
 
-        except TypeError as exc:
+        except (TypeError, ValueError) as exc:
             LOG.exception(exc)
             raise MetricsStoreError(exc)
 
     def _build_tags(self, metric):
-        tags = {
-            'counter_name': metric['name'],
-            'counter_unit': metric['unit'],
-            'counter_type': metric['type'],
-            'counter_volume': metric['value'],
-            'host': metric['host'],
-            'resource_id': metric['resource_id']
-        }
+        tags = {}
+        for key, attribute in self._tag_attributes:
+            value = self._get_tag(metric, attribute)
+            if value != "":
+                tags[key] = value
+        tags.update(self._get_extra_tags(metric))
         return tags
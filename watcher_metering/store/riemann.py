@@ -16,10 +16,8 @@
 
 from __future__ import unicode_literals
 
-import calendar
 import struct
 
-from dateutil import parser
 from oslo_config import cfg
 from oslo_log import log
 from riemann_client.client import Client
@@ -28,6 +26,7 @@ from riemann_client import transport
 from six.moves.urllib.parse import urlparse
 from watcher_metering.store.base import MetricsStoreClientBase
 from watcher_metering.store.base import MetricsStoreError
+from watcher_metering.store.utils.timestamp import to_epoch_seconds
 
 LOG = log.getLogger(__name__)
 
@@ -163,6 +162,15 @@ class RiemannClient(MetricsStoreClientBase):
                 "%r: '%r'" % (Client.create_dict(event), exc)
             )
 
+    def _send_events(self, events):
+        try:
+            self.client.send_events(events)
+        except (transport.RiemannError, struct.error,
+                OSError, RuntimeError) as exc:
+            LOG.exception(exc)
+            raise MetricsStoreError("Could not deliver the messages "
+                                    "to the Riemann server.")
+
     def send(self, metric):
         LOG.debug('Publishing metrics to `%s:%d`',
                   self.store_uri.hostname, self.store_uri.port)
@@ -183,6 +191,31 @@ class RiemannClient(MetricsStoreClientBase):
                 LOG.error("Connection issue --> try again...")
                 self.reconnect()
 
+    def send_batch(self, metrics):
+        """Sends all the metrics within a single Riemann message"""
+        LOG.debug('Publishing %d metrics to `%s:%d`', len(metrics),
+                  self.store_uri.hostname, self.store_uri.port)
+        events = []
+        for metric in metrics:
+            try:
+                events.append(self.create_event(metric))
+            except (MetricsStoreError, KeyError) as exc:
+                # A faulty metric must not prevent the rest of the batch
+                # from being sent
+                LOG.exception(exc)
+        if not events:
+            return
+
+        for _ in range(2):  # 2 attempts
+            try:
+                self._send_events(events)
+                break
+            except Exception as exc:
+                LOG.warn('Unable to send %d metric(s)', len(events))
+                LOG.exception(exc)
+                LOG.error("Connection issue --> try again...")
+                self.reconnect()
+
     def create_event(self, metric):
         """Translates a dictionary of event attributes to an Event object
 
@@ -199,8 +232,7 @@ class RiemannClient(MetricsStoreClientBase):
 
         try:
             timestamp = metric.get("timestamp", "")
-            parsed = parser.parse(timestamp)
-            epoch_seconds = calendar.timegm(parsed.timetuple())
+            epoch_seconds = to_epoch_seconds(timestamp)
         except ValueError:
             error_message = "Could not parse the `%r` timestamp! " % timestamp
             LOG.exception(error_message)
@@ -0,0 +1,167 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Encoding of the measurements into the InfluxDB line protocol"""
+
+from __future__ import unicode_literals
+
+import six
+
+# Nanoseconds per unit of each timestamp precision
+PRECISIONS = {"n": 1, "u": 10 ** 3, "ms": 10 ** 6, "s": 10 ** 9}
+
+
+def escape_measurement(value):
+    """Escapes a measurement name, in which only the commas and spaces are
+    unescaped by InfluxDB
+
+    :type value: str
+    :rtype: str
+    """
+    return six.text_type(value).replace(",", "\\,").replace(" ", "\\ ")
+
+
+def escape(value):
+    """Escapes a tag key or value, or a field key
+
+    :type value: str
+    :rtype: str
+    """
+    return (six.text_type(value)
+            .replace("\\", "\\\\")
+            .replace(" ", "\\ ")
+            .replace(",", "\\,")
+            .replace("=", "\\=")
+            .replace("\n", "\\n"))
+
+
+def format_field_value(value):
+    """Formats a field value, keeping its InfluxDB type
+
+    Integers are suffixed with ``i`` the way the ``influxdb`` library does,
+    so that the type of the fields written by both stays the same. Only the
+    backslashes and double quotes of the strings are escaped, these being
+    the only ones InfluxDB unescapes within string fields.
+
+    :type value: int, float, bool or str
+    :rtype: str
+    """
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, six.integer_types):
+        return "%di" % value
+    if isinstance(value, float):
+        return repr(value)
+    if isinstance(value, six.string_types):
+        return '"%s"' % value.replace("\\", "\\\\").replace('"', '\\"')
+    raise TypeError("Invalid field value `%r`" % (value,))
+
+
+class LineProtocolBuffer(object):
+    """Lines of line protocol, written into a buffer reused between batches
+
+    The series keys (the measurement name followed by its escaped and sorted
+    tag set) are only encoded once per series.
+    """
+
+    MAX_CACHED_SERIES = 100000
+
+    def __init__(self, precision="n"):
+        """
+        :param precision: Precision of the timestamps (n, u, ms or s)
+        :type precision: str
+        """
+        self.precision = precision
+        self.count = 0  # Number of lines in the buffer
+        # Offset of the end of each line, as string fields may themselves
+        # contain newlines
+        self._line_ends = []
+        self._divisor = PRECISIONS[precision]
+        self._buffer = bytearray()
+        self._series_keys = {}
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def clear(self):
+        del self._buffer[:]
+        del self._line_ends[:]
+        self.count = 0
+
+    def getvalue(self):
+        """
+        :return: The lines written since the buffer was last cleared
+        :rtype: bytes
+        """
+        return bytes(self._buffer)
+
+    def get_lines(self):
+        """
+        :return: Each of the lines written since the buffer was last cleared
+        :rtype: list of bytes
+        """
+        buffer = bytes(self._buffer)
+        starts = [0] + self._line_ends[:-1]
+        return [buffer[start:end]
+                for start, end in zip(starts, self._line_ends)]
+
+    def get_series_key(self, measurement, tags):
+        """
+        :param measurement: Name of the measurement
+        :type measurement: str
+        :param tags: (key, value) of each tag, those with an empty value
+            being left out
+        :type tags: tuple of tuples
+        :return: The encoded series key
+        :rtype: bytes
+        """
+        cache_key = (measurement, tags)
+        series_key = self._series_keys.get(cache_key)
+        if series_key is None:
+            if len(self._series_keys) >= self.MAX_CACHED_SERIES:
+                self._series_keys.clear()
+            parts = [escape_measurement(measurement)]
+            parts.extend("%s=%s" % (escape(key), escape(value))
+                         for key, value in sorted(tags) if value != "")
+            series_key = ",".join(parts).encode("utf-8")
+            self._series_keys[cache_key] = series_key
+        return series_key
+
+    def append(self, series_key, fields, timestamp, extra_tags=()):
+        """Writes a line into the buffer
+
+        :param series_key: The series key, see :meth:`get_series_key`
+        :type series_key: bytes
+        :param fields: (key, value) of each field
+        :type fields: tuple of tuples
+        :param timestamp: Epoch nanoseconds
+        :type timestamp: int
+        :param extra_tags: (key, value) of the tags varying from one line of
+            the series to the other, which are not cached
+        :type extra_tags: tuple of tuples
+        """
+        buffer = self._buffer  # Extended in place
+        buffer += series_key
+        for key, value in extra_tags:
+            if value != "":
+                buffer += (",%s=%s" % (escape(key), escape(value))).encode(
+                    "utf-8")
+        buffer += (" " + ",".join(
+            "%s=%s" % (escape(key), format_field_value(value))
+            for key, value in fields)).encode("utf-8")
+        buffer += (" %d\n" % (timestamp // self._divisor)).encode("ascii")
+        self._line_ends.append(len(buffer))
+        self.count += 1
@@ -0,0 +1,79 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Conversions of the measurement timestamps into the store native formats
+
+Measurements carry integer epoch nanoseconds, but the ones sent by older
+agents carry ISO 8601 strings instead: both are accepted here.
+"""
+
+from __future__ import unicode_literals
+
+import calendar
+import datetime
+
+from dateutil import parser
+from dateutil import tz
+import six
+
+NS_PER_SECOND = 10 ** 9
+
+
+def to_epoch_ns(timestamp):
+    """Converts a measurement timestamp into integer epoch nanoseconds
+
+    :param timestamp: Epoch nanoseconds or ISO 8601 string (assumed to be
+        UTC if naive)
+    :type timestamp: int or str
+    :rtype: int
+    :raises: ValueError if the timestamp cannot be parsed
+    """
+    if isinstance(timestamp, six.integer_types):
+        return timestamp
+    if not isinstance(timestamp, six.string_types):
+        raise ValueError("Invalid timestamp `%r`" % (timestamp,))
+
+    parsed = parser.parse(timestamp)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(tz.tzutc())
+    epoch_seconds = calendar.timegm(parsed.timetuple())
+    return epoch_seconds * NS_PER_SECOND + parsed.microsecond * 1000
+
+
+def to_epoch_seconds(timestamp):
+    """Converts a measurement timestamp into integer epoch seconds
+
+    :rtype: int
+    :raises: ValueError if the timestamp cannot be parsed
+    """
+    return to_epoch_ns(timestamp) // NS_PER_SECOND
+
+
+def to_isoformat(timestamp):
+    """Converts a measurement timestamp into an ISO 8601 UTC string
+
+    Legacy ISO 8601 strings are returned untouched.
+
+    :rtype: str
+    :raises: ValueError if the timestamp cannot be parsed
+    """
+    if isinstance(timestamp, six.string_types):
+        return timestamp
+
+    epoch_ns = to_epoch_ns(timestamp)
+    seconds, ns = divmod(epoch_ns, NS_PER_SECOND)
+    utc_datetime = datetime.datetime.fromtimestamp(seconds, tz.tzutc())
+    return utc_datetime.replace(microsecond=ns // 1000).isoformat()
@@ -0,0 +1,130 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Fire-and-forget sending of line protocol over UDP"""
+
+from __future__ import unicode_literals
+
+import socket
+from threading import Event
+from threading import Lock
+from threading import Thread
+
+from oslo_log import log
+
+LOG = log.getLogger(__name__)
+
+# Fits in an Ethernet frame (1500 bytes) along with the IP and UDP headers
+DEFAULT_PAYLOAD_SIZE = 1400
+MAX_PAYLOAD_SIZE = 65507
+
+
+class UdpSenderStats(object):
+    """Counters exposed by the :class:`UdpLineSender`"""
+
+    def __init__(self):
+        self.lines_sent = 0
+        self.datagrams_sent = 0
+        self.bytes_sent = 0
+        self.send_errors = 0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+class UdpLineSender(Thread):
+    """Packs lines of line protocol into datagrams of at most a given size
+
+    A datagram is sent as soon as the next line would not fit in it, and
+    the datagram being filled is sent anyway every ``flush_interval``
+    seconds, so that no line waits any longer. A line larger than
+    ``payload_size`` is sent within a datagram of its own.
+
+    Nothing tells whether the datagrams are received: only the errors
+    raised by the local network stack are counted.
+    """
+
+    def __init__(self, host, port, payload_size=DEFAULT_PAYLOAD_SIZE,
+                 flush_interval=1.):
+        """
+        :param host: Host of the UDP listener
+        :type host: str
+        :param port: Port of the UDP listener
+        :type port: int
+        :param payload_size: Maximum size (in bytes) of the datagrams
+        :type payload_size: int
+        :param flush_interval: Time (in seconds) after which an incomplete
+            datagram is sent anyway
+        :type flush_interval: float
+        """
+        super(UdpLineSender, self).__init__(name="udp-line-sender")
+        self.payload_size = min(payload_size, MAX_PAYLOAD_SIZE)
+        self.flush_interval = flush_interval
+        self.daemon = True
+        self.stats = UdpSenderStats()
+
+        # Resolved once and for all rather than for each datagram
+        family, _, _, _, self.address = socket.getaddrinfo(
+            host, port, 0, socket.SOCK_DGRAM)[0]
+        self._socket = socket.socket(family, socket.SOCK_DGRAM)
+        self._datagram = bytearray()
+        self._line_count = 0  # Number of lines in the datagram
+        self._lock = Lock()
+        self._stopped = Event()
+
+    def run(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+    def stop(self):
+        """Sends the lines left and closes the socket"""
+        self._stopped.set()
+        self.flush()
+        self._socket.close()
+
+    def write(self, lines):
+        """
+        :param lines: Lines of line protocol, each ending with a newline
+        :type lines: list of bytes
+        """
+        with self._lock:
+            for line in lines:
+                if len(self._datagram) + len(line) > self.payload_size:
+                    self._send()
+                self._datagram += line
+                self._line_count += 1
+
+    def flush(self):
+        """Sends the datagram being filled, if any"""
+        with self._lock:
+            self._send()
+
+    def _send(self):
+        if not self._datagram:
+            return
+        try:
+            sent = self._socket.sendto(bytes(self._datagram), self.address)
+        except (IOError, OSError) as exc:
+            self.stats.send_errors += 1
+            LOG.error("Could not send a datagram of %d line(s) to %s: %s",
+                      self._line_count, self.address, exc)
+        else:
+            self.stats.lines_sent += self._line_count
+            self.stats.datagrams_sent += 1
+            self.stats.bytes_sent += sent
+        del self._datagram[:]
+        self._line_count = 0
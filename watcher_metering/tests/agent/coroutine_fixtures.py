@@ -0,0 +1,51 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Coroutine drivers, only to be imported by Python 3.5+"""
+
+from __future__ import unicode_literals
+
+import asyncio
+
+from watcher_metering.agent.puller import MetricPuller
+
+
+class CoroutineMetricPuller(MetricPuller):
+
+    def __init__(self, title, probe_id, interval, pull_timeout=0,
+                 delay=0):
+        super(CoroutineMetricPuller, self).__init__(
+            title, probe_id, interval, pull_timeout)
+        self.delay = delay
+
+    @classmethod
+    def get_name(cls):
+        return 'coroutine'
+
+    @classmethod
+    def get_default_probe_id(cls):
+        return 'data.puller.coroutine'
+
+    @classmethod
+    def get_default_interval(cls):
+        return 1
+
+    async def do_pull(self):
+        await asyncio.sleep(self.delay)
+        return self.get_template(
+            name="coroutine.data.puller", unit="", type_="",
+            resource_id="test_hostname", host="test_hostname",
+        ).create(13.37, timestamp=1438701345703542000)
@@ -26,6 +26,7 @@ from mock import Mock
 from mock import patch
 from mock import PropertyMock
 import msgpack
+import nanomsg
 import operator
 from oslo_config import cfg
 from oslotest.base import BaseTestCase
@@ -166,8 +167,7 @@ class TestAgent(BaseTestCase):
         # Initial is 2 drivers => 2 - 1 == 1
         self.assertEqual(len(self.agent.drivers), 1)
 
-    @patch.object(Measurement, "as_dict")
-    def test_send_measurements(self, m_as_dict):
+    def test_send_measurements(self):
         self.agent.register_drivers()
 
         measurement_dict = OrderedDict(
@@ -179,49 +179,93 @@ class TestAgent(BaseTestCase):
             host="test_hostname",
             timestamp="2015-08-04T15:15:45.703542",
         )
-        m_as_dict.return_value = measurement_dict
 
         measurement = Measurement(**measurement_dict)
 
         for driver in self.agent.drivers.values():
             driver.send_measurements([measurement])
             break  # only the first one
-        expected_encoded_msg = msgpack.dumps(measurement_dict)
+
+        # Nothing is sent synchronously
+        self.assertFalse(self.m_agent_socket.return_value.send.called)
+        self.assertEqual(self.agent.sender.outbox_length, 1)
+
+        self.agent.sender.flush()
+
+        # The series is registered along with its first sample
+        expected_encoded_msg = msgpack.dumps([
+            3,
+            self.agent.sender.registry.session_id,
+            [[0, ["dummy.data.puller", "", "", "test_hostname",
+                  "test_hostname", {}]]],
+            [[0, "2015-08-04T15:15:45.703542", 13.37]],
+        ])
         self.m_agent_socket.return_value.send.assert_called_once_with(
-            expected_encoded_msg
+            expected_encoded_msg, nanomsg.DONTWAIT
         )
+        self.assertEqual(self.agent.sender.stats.frames_sent, 1)
+
+    def test_send_frame_publisher_not_ready(self):
+        fake_error = nanomsg.NanoMsgAPIError.__new__(nanomsg.NanoMsgAPIError)
+        fake_error.errno = nanomsg.EAGAIN
+        self.m_agent_socket.return_value.send.side_effect = fake_error
+
+        self.assertFalse(self.agent.send_frame(b"FAKE FRAME"))
 
-    @patch.object(DummyMetricPuller, "is_alive")
-    @patch.object(DummyMetricPuller, "start")
     @patch("watcher_metering.agent.manager.MetricManager.lock")
-    def test_check_drivers_alive(self, m_lock, m_start, m_is_alive):
+    def test_check_drivers_alive(self, m_lock):
         m_lock.acquire = Mock(return_value=True)  # Emulates a thread behavior
         m_lock.release = Mock(return_value=True)  # Emulates a thread behavior
-        m_is_alive.return_value = True  # Emulates a thread that is running
-        m_start.return_value = None
 
         self.agent.register_drivers()
         self.agent.check_drivers_alive()
 
-        self.assertTrue(m_is_alive.called)
-        self.assertFalse(m_start.called)
+        self.assertEqual(
+            sorted(self.agent.scheduler.tasks),
+            sorted(self.agent.drivers),
+        )
+
+        # Drivers are only scheduled once
+        with patch.object(self.agent.scheduler, "schedule") as m_schedule:
+            self.agent.check_drivers_alive()
+        self.assertFalse(m_schedule.called)
 
-    @patch.object(DummyMetricPuller, "is_alive")
-    @patch.object(DummyMetricPuller, "start")
     @patch("watcher_metering.agent.manager.MetricManager.lock")
-    def test_check_drivers_alive_with_driver_stopped(self, m_lock, m_start,
-                                                     m_is_alive):
+    def test_check_drivers_alive_with_scheduler_stopped(self, m_lock):
         m_lock.acquire = Mock(return_value=True)  # Emulates a thread behavior
         m_lock.release = Mock(return_value=True)  # Emulates a thread behavior
-        m_is_alive.side_effect = [False, True]
-        m_start.side_effect = [RuntimeError, True, True]  # Fails once
+        self.agent.register_drivers()
+        dead_scheduler = self.agent.scheduler
+        dead_scheduler.start()
+        dead_scheduler.stop()
 
+        # should restart the scheduler
+        self.agent.check_drivers_alive()
+        self.addCleanup(self.agent.scheduler.stop)
+
+        self.assertIsNot(self.agent.scheduler, dead_scheduler)
+        self.assertTrue(self.agent.scheduler.is_alive())
+        self.assertEqual(len(self.agent.scheduler.tasks), 2)
+
+    @patch("watcher_metering.agent.manager.MetricManager.lock")
+    def test_get_pull_stats(self, m_lock):
+        m_lock.acquire = Mock(return_value=True)  # Emulates a thread behavior
+        m_lock.release = Mock(return_value=True)  # Emulates a thread behavior
         self.agent.register_drivers()
-        # should re-run the driver
         self.agent.check_drivers_alive()
 
-        self.assertEqual(m_is_alive.call_count, 1)
-        self.assertEqual(m_start.call_count, 2)
+        pull_stats = self.agent.get_pull_stats()
+
+        self.assertEqual(sorted(pull_stats), sorted(self.agent.drivers))
+        for stats in pull_stats.values():
+            self.assertEqual(stats["pulls"], 0)
+            self.assertEqual(stats["timeouts"], 0)
+
+    def test_on_tick_done_kicks_sender(self):
+        with patch.object(self.agent.sender, "kick") as m_kick:
+            self.agent.on_tick_done(MagicMock())
+
+        m_kick.assert_called_once_with()
 
     @patch.object(os._Environ, "__setitem__")
     @patch("watcher_metering.agent.agent.os.environ.get")
@@ -0,0 +1,140 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from oslotest.base import BaseTestCase
+from watcher_metering.agent.aggregation import WindowAggregator
+from watcher_metering.agent.measurement import MeasurementTemplate
+
+SECOND = 10 ** 9
+START = 1438701300 * SECOND  # On the minute
+
+
+class TestWindowAggregator(BaseTestCase):
+
+    def setUp(self):
+        super(TestWindowAggregator, self).setUp()
+        self.cpu = MeasurementTemplate(
+            "compute.node.cpu.percent", "%", "gauge", "test_node",
+            "test_node")
+        self.ram = MeasurementTemplate(
+            "compute.node.ram.percent", "%", "gauge", "test_node",
+            "test_node")
+
+    def _summary(self, measurements):
+        return sorted((msg.name, msg.unit, msg.type, msg.value, msg.timestamp)
+                      for msg in measurements)
+
+    def test_aggregate_window(self):
+        aggregator = WindowAggregator(
+            30, ["min", "max", "mean", "count", "last"])
+
+        self.assertEqual(aggregator.aggregate([
+            self.cpu.create(value, START + index * SECOND)
+            for index, value in enumerate([3, 1, 2])
+        ]), [])
+        # The first measurement of the next window closes this one
+        emitted = aggregator.aggregate(
+            [self.cpu.create(4, START + 30 * SECOND)])
+
+        end = START + 30 * SECOND
+        self.assertEqual(self._summary(emitted), [
+            ("compute.node.cpu.percent.count", "", "gauge", 3, end),
+            ("compute.node.cpu.percent.last", "%", "gauge", 2., end),
+            ("compute.node.cpu.percent.max", "%", "gauge", 3., end),
+            ("compute.node.cpu.percent.mean", "%", "gauge", 2., end),
+            ("compute.node.cpu.percent.min", "%", "gauge", 1., end),
+        ])
+        self.assertEqual(
+            self._summary(aggregator.flush()),
+            [("compute.node.cpu.percent.count", "", "gauge", 1,
+              START + 60 * SECOND),
+             ("compute.node.cpu.percent.last", "%", "gauge", 4.,
+              START + 60 * SECOND),
+             ("compute.node.cpu.percent.max", "%", "gauge", 4.,
+              START + 60 * SECOND),
+             ("compute.node.cpu.percent.mean", "%", "gauge", 4.,
+              START + 60 * SECOND),
+             ("compute.node.cpu.percent.min", "%", "gauge", 4.,
+              START + 60 * SECOND)])
+
+    def test_aggregate_per_series(self):
+        aggregator = WindowAggregator(60)
+        aggregator.aggregate([self.cpu.create(10, START),
+                              self.ram.create(50, START),
+                              self.cpu.create(20, START + SECOND)])
+
+        emitted = aggregator.flush()
+
+        self.assertEqual(len(aggregator), 2)
+        self.assertEqual(
+            [(msg.name, msg.value) for msg in emitted],
+            [("compute.node.cpu.percent.mean", 15.),
+             ("compute.node.ram.percent.mean", 50.)])
+        # The static part is only encoded once per series and function
+        aggregator.aggregate([self.cpu.create(30, START + 60 * SECOND)])
+        self.assertIs(aggregator.flush()[0].template, emitted[0].template)
+
+    def test_series_without_measurement_not_emitted(self):
+        aggregator = WindowAggregator(60)
+        aggregator.aggregate([self.cpu.create(10, START),
+                              self.ram.create(50, START)])
+        aggregator.aggregate([self.cpu.create(20, START + 60 * SECOND)])
+
+        emitted = aggregator.aggregate(
+            [self.cpu.create(30, START + 120 * SECOND)])
+
+        self.assertEqual([(msg.name, msg.value) for msg in emitted],
+                         [("compute.node.cpu.percent.mean", 20.)])
+
+    def test_series_churn(self):
+        aggregator = WindowAggregator(60)
+
+        # A new set of short-lived series in each window
+        for window in range(50):
+            timestamp = START + window * 60 * SECOND
+            emitted = aggregator.aggregate([
+                MeasurementTemplate(
+                    "compute.node.process.cpu.percent", "%", "gauge",
+                    "test_node_%d_%d" % (window, index)).create(
+                        window, timestamp)
+                for index in range(10)
+            ])
+            if window:
+                self.assertEqual(
+                    {(msg.resource_id, msg.value) for msg in emitted},
+                    {("test_node_%d_%d" % (window - 1, index), window - 1.)
+                     for index in range(10)})
+
+        # The slots of the series gone are freed and reused
+        self.assertLessEqual(len(aggregator), 20)
+        self.assertLessEqual(len(aggregator._templates), 20)
+        self.assertLessEqual(len(aggregator._counts), 20)
+
+    def test_pass_through(self):
+        aggregator = WindowAggregator(60)
+        legacy = self.cpu.create(10, "2015-08-04T15:15:45.703542")
+        state = self.cpu.create("ok", START)
+
+        self.assertEqual(aggregator.aggregate([legacy, state]),
+                         [legacy, state])
+        self.assertEqual(aggregator.flush(), [])
+
+    def test_invalid_settings(self):
+        self.assertRaises(ValueError, WindowAggregator, 60, ["median"])
+        self.assertRaises(ValueError, WindowAggregator, 0)
@@ -0,0 +1,110 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from oslotest.base import BaseTestCase
+from watcher_metering.agent.change_filter import ChangeFilter
+from watcher_metering.agent.measurement import MeasurementTemplate
+
+
+class TestChangeFilter(BaseTestCase):
+
+    def setUp(self):
+        super(TestChangeFilter, self).setUp()
+        self.cpu_count = MeasurementTemplate(
+            "compute.node.cpu.count", "", "gauge", "test_node", "test_node")
+        self.state = MeasurementTemplate(
+            "compute.node.state", "", "gauge", "test_node", "test_node")
+
+    def _filter_values(self, change_filter, template, values):
+        return [
+            [msg.value for msg in change_filter.filter(
+                [template.create(value, timestamp=1)])]
+            for value in values
+        ]
+
+    def test_send_on_change(self):
+        change_filter = ChangeFilter(heartbeat_intervals=100)
+
+        self.assertEqual(
+            self._filter_values(change_filter, self.cpu_count,
+                                [8, 8, 8, 16, 16, 8]),
+            [[8], [], [], [16], [], [8]])
+        self.assertEqual(change_filter.suppressed_count, 3)
+
+    def test_heartbeat(self):
+        change_filter = ChangeFilter(heartbeat_intervals=3)
+
+        self.assertEqual(
+            self._filter_values(change_filter, self.cpu_count, [8] * 7),
+            [[8], [], [], [8], [], [], [8]])
+
+    def test_absolute_deadband(self):
+        change_filter = ChangeFilter(deadband=.5, heartbeat_intervals=100)
+
+        # Compared with the last value sent, so slow drifts are not missed
+        self.assertEqual(
+            self._filter_values(change_filter, self.cpu_count,
+                                [10, 10.3, 10.5, 10.6, 9.9]),
+            [[10], [], [], [10.6], [9.9]])
+
+    def test_relative_deadband(self):
+        change_filter = ChangeFilter(relative_deadband=.1,
+                                     heartbeat_intervals=100)
+
+        self.assertEqual(
+            self._filter_values(change_filter, self.cpu_count,
+                                [100, 109, 111, 120]),
+            [[100], [], [111], []])
+
+    def test_non_numerical_values(self):
+        change_filter = ChangeFilter(deadband=10, heartbeat_intervals=100)
+
+        self.assertEqual(
+            self._filter_values(change_filter, self.state,
+                                ["ok", "ok", "ko", True, True, 1.]),
+            [["ok"], [], ["ko"], [True], [], [1.]])
+
+    def test_per_series(self):
+        change_filter = ChangeFilter(heartbeat_intervals=100)
+
+        sent = change_filter.filter([self.cpu_count.create(8, 1),
+                                     self.state.create("ok", 1),
+                                     self.cpu_count.create(8, 2),
+                                     self.state.create("ko", 2)])
+
+        self.assertEqual([msg.value for msg in sent], [8, "ok", "ko"])
+        self.assertEqual(len(change_filter), 2)
+
+    def test_series_churn(self):
+        change_filter = ChangeFilter(heartbeat_intervals=3)
+
+        # A new short-lived series on each call, next to a steady one
+        for index in range(50):
+            sent = change_filter.filter([
+                self.cpu_count.create(8, index),
+                MeasurementTemplate(
+                    "compute.node.process.count", "", "gauge",
+                    "test_node_%d" % index).create(index, index),
+            ])
+            self.assertEqual(len(sent), 2 if index % 3 == 0 else 1)
+
+        # The series gone are forgotten and their slots reused
+        self.assertLessEqual(len(change_filter), 8)
+        self.assertLessEqual(len(change_filter._last_values), 8)
+        self.assertLessEqual(len(change_filter._suppressed), 8)
@@ -0,0 +1,157 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import functools
+import sys
+from threading import Event
+import unittest
+
+from mock import MagicMock
+from oslotest.base import BaseTestCase
+from watcher_metering.agent.event_loop import asyncio
+from watcher_metering.agent.event_loop import EventLoop
+from watcher_metering.agent.event_loop import PullTimeout
+from watcher_metering.agent.scheduler import Scheduler
+
+if sys.version_info >= (3, 5):
+    from watcher_metering.tests.agent.coroutine_fixtures import (
+        CoroutineMetricPuller)
+
+
+@unittest.skipIf(asyncio is None, "asyncio is not available")
+class TestEventLoop(BaseTestCase):
+
+    def setUp(self):
+        super(TestEventLoop, self).setUp()
+        self.results = []
+        self.done = Event()
+        self.event_loop = EventLoop(max_pulls=2)
+        self.event_loop.start()
+        self.addCleanup(self.event_loop.stop)
+
+    def _callback(self, expected_count):
+        def _on_result(result, exc):
+            self.results.append((result, exc))
+            if len(self.results) == expected_count:
+                self.done.set()
+        return _on_result
+
+    def test_submit(self):
+        self.event_loop.submit(functools.partial(asyncio.sleep, 0, "OK"),
+                               None, self._callback(1))
+
+        self.assertTrue(self.done.wait(5))
+        self.assertEqual(self.results, [("OK", None)])
+
+    def test_submit_error(self):
+        m_coroutine_function = MagicMock(side_effect=ValueError("KO"))
+        self.event_loop.submit(m_coroutine_function, None,
+                               self._callback(1))
+
+        self.assertTrue(self.done.wait(5))
+        (result, exc), = self.results
+        self.assertIsNone(result)
+        self.assertIsInstance(exc, ValueError)
+
+    def test_submit_timeout(self):
+        self.event_loop.submit(functools.partial(asyncio.sleep, 60),
+                               .01, self._callback(1))
+
+        self.assertTrue(self.done.wait(5))
+        (result, exc), = self.results
+        self.assertIsInstance(exc, PullTimeout)
+        self.assertEqual(self.event_loop.running_count, 0)
+
+    def test_max_pulls(self):
+        in_flight = []
+        max_in_flight = []
+        on_result = self._callback(5)
+
+        def _coroutine_function(value):
+            in_flight.append(value)
+            max_in_flight.append(len(in_flight))
+            return asyncio.sleep(.01, value)
+
+        def _callback(result, exc):
+            in_flight.remove(result)
+            on_result(result, exc)
+
+        for value in range(5):
+            self.event_loop.submit(
+                functools.partial(_coroutine_function, value), None,
+                _callback)
+
+        self.assertTrue(self.done.wait(5))
+        self.assertEqual([result for result, _ in self.results],
+                         list(range(5)))
+        self.assertEqual(max(max_in_flight), 2)
+
+    def test_stop_cancels_pulls(self):
+        self.event_loop.submit(functools.partial(asyncio.sleep, 60),
+                               None, self._callback(1))
+        self.event_loop.stop()
+
+        self.assertFalse(self.event_loop.is_alive())
+        self.assertEqual(self.results, [])
+
+
+@unittest.skipIf(sys.version_info < (3, 5), "async def is not available")
+class TestCoroutineScheduling(BaseTestCase):
+
+    def setUp(self):
+        super(TestCoroutineScheduling, self).setUp()
+        self.ticks_done = Event()
+        self.scheduler = Scheduler(
+            max_workers=1,
+            on_tick_done=lambda tick: self.ticks_done.set(),
+            align=False)
+        self.addCleanup(self.scheduler.stop)
+
+    def _driver(self, **kwargs):
+        return CoroutineMetricPuller(
+            title=CoroutineMetricPuller.get_entry_name(),
+            probe_id=CoroutineMetricPuller.get_default_probe_id(),
+            interval=60, **kwargs)
+
+    def test_coroutine_pull(self):
+        driver = self._driver()
+        m_observer = MagicMock()
+        driver.register_observer(m_observer)
+        self.scheduler.schedule(driver)
+
+        self.scheduler.start()
+
+        self.assertTrue(self.ticks_done.wait(5))
+        self.assertTrue(driver.is_coroutine)
+        self.assertIsNotNone(self.scheduler.event_loop)
+        (_, measurements), _ = m_observer.update.call_args
+        self.assertEqual([value for _, _, value in measurements], [13.37])
+        self.assertFalse(self.scheduler.tasks[driver.key].running)
+
+    def test_coroutine_pull_timeout(self):
+        driver = self._driver(pull_timeout=.01, delay=60)
+        driver.log_pull_error = MagicMock()
+        self.scheduler.schedule(driver)
+
+        self.scheduler.start()
+
+        self.assertTrue(self.ticks_done.wait(5))
+        (exc,), _ = driver.log_pull_error.call_args
+        self.assertIsInstance(exc, PullTimeout)
+        self.assertEqual(self.scheduler.tasks[driver.key].stats.timeouts, 1)
@@ -0,0 +1,73 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import msgpack
+from oslotest.base import BaseTestCase
+import six
+from watcher_metering.agent.measurement import HOSTNAME
+from watcher_metering.agent.measurement import Measurement
+from watcher_metering.agent.measurement import MeasurementTemplate
+from watcher_metering.protocol.frame import decode_record
+
+
+class TestMeasurement(BaseTestCase):
+
+    def test_measurement_has_no_dict(self):
+        measurement = Measurement(name="dummy.data.puller", unit="",
+                                  type_="", value=1, resource_id="")
+
+        self.assertFalse(hasattr(measurement, "__dict__"))
+        self.assertEqual(measurement.host, HOSTNAME)
+        self.assertIsInstance(measurement.timestamp, six.integer_types)
+
+    def test_measurement_as_record(self):
+        measurement = Measurement(
+            name="dummy.data.puller", unit="%", type_="gauge", value=13.37,
+            resource_id="test_hostname", host="test_hostname",
+            timestamp="2015-08-04T15:15:45.703542",
+            resource_metadata={"state": "ok"},
+        )
+
+        record = msgpack.unpackb(measurement.as_record(), raw=False)
+
+        self.assertEqual(decode_record(*record), measurement.as_dict())
+
+    def test_template_create(self):
+        template = MeasurementTemplate(
+            name="dummy.data.puller", unit="%", type_="gauge",
+            resource_id="test_hostname", resource_metadata={"state": "ok"},
+        )
+
+        measurement = template.create(13.37, "2015-08-04T15:15:45.703542")
+
+        self.assertIs(measurement.template, template)
+        self.assertEqual(measurement.as_dict(), {
+            "name": "dummy.data.puller",
+            "timestamp": "2015-08-04T15:15:45.703542",
+            "unit": "%",
+            "type": "gauge",
+            "value": 13.37,
+            "resource_id": "test_hostname",
+            "host": HOSTNAME,
+            "resource_metadata": {"state": "ok"},
+        })
+        # The static part is packed once by the template
+        self.assertIs(measurement.packed_static, template.packed_static)
+        record = msgpack.unpackb(measurement.as_record(), raw=False)
+        self.assertEqual(decode_record(*record), measurement.as_dict())
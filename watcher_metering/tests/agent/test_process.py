@@ -0,0 +1,187 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import os
+import time
+from unittest import TestCase
+
+from mock import MagicMock
+from watcher_metering.agent.event_loop import PullTimeout
+from watcher_metering.agent.process import DriverProcessError
+from watcher_metering.agent.process import PackedSamples
+from watcher_metering.agent.puller import MetricPuller
+
+
+class ProcessMetricPuller(MetricPuller):
+
+    def __init__(self, behaviour="pid", **kwargs):
+        super(ProcessMetricPuller, self).__init__(**kwargs)
+        if behaviour == "broken":
+            raise ValueError("Broken driver")
+        self.behaviour = behaviour
+
+    @classmethod
+    def get_name(cls):
+        return 'process'
+
+    @classmethod
+    def get_default_probe_id(cls):
+        return 'dummy.process.puller'
+
+    @classmethod
+    def get_default_interval(cls):
+        return 1
+
+    def do_pull(self):
+        if self.behaviour == "crash":
+            os._exit(3)
+        elif self.behaviour == "hang":
+            time.sleep(60)
+        elif self.behaviour == "error":
+            raise Exception("Pull error")
+        template = self.get_template("dummy.pid", "", "gauge", "test_node")
+        return [template.create(os.getpid(),
+                                timestamp=self.get_pull_timestamp())]
+
+
+# Not an oslotest test case, whose temporary directory is removed after each
+# test: the fork server of multiprocessing lives in the one it first gets
+class TestDriverProcess(TestCase):
+
+    def setUp(self):
+        super(TestDriverProcess, self).setUp()
+        self.observer = MagicMock()
+
+    def _create_driver(self, behaviour="pid", **kwargs):
+        options = dict(
+            title=ProcessMetricPuller.get_entry_name(),
+            probe_id=ProcessMetricPuller.get_default_probe_id(),
+            interval=1,
+            execution_mode="process",
+            **kwargs)
+        driver = ProcessMetricPuller(**options)
+        # As the loader does: the driver process creates its own driver
+        driver.options = dict(options, behaviour=behaviour)
+        driver.register_observer(self.observer)
+        self.addCleanup(driver.stop)
+        return driver
+
+    def _pull_pid(self, driver):
+        driver.pull_once()
+        (_, samples), _ = self.observer.update.call_args
+        self.observer.reset_mock()
+        (_, _, pid), = samples
+        return pid
+
+    def test_pull_in_child_process(self):
+        driver = self._create_driver()
+
+        self.assertFalse(driver.is_coroutine)
+        # Along with the timestamp of the tick
+        packed = driver.pull_data(1438701350000000000)
+
+        self.assertIsInstance(packed, PackedSamples)
+        (sample,), = packed
+        packed_static, timestamp, pid = sample
+        self.assertEqual(pid, driver.process.pid)
+        self.assertNotEqual(pid, os.getpid())
+        self.assertEqual(timestamp, 1438701350000000000)
+
+        # Already packed: the observers are notified as is
+        driver.process_pulled_data(packed)
+        self.observer.update.assert_called_once_with(driver, [sample])
+
+    def test_driver_created_in_child_process(self):
+        driver = self._create_driver()
+        driver.behaviour = "error"  # Not seen by the child process
+
+        self.assertNotEqual(self._pull_pid(driver), os.getpid())
+
+    def test_broken_driver(self):
+        driver = self._create_driver("broken")
+
+        self.assertRaises(DriverProcessError, driver.pull_data)
+        self.assertFalse(driver.process.is_alive())
+
+    def test_driver_not_loaded(self):
+        driver = self._create_driver()
+        driver.options = None
+
+        self.assertRaises(DriverProcessError, driver.pull_data)
+
+    def test_child_process_reused(self):
+        driver = self._create_driver()
+
+        self.assertEqual(self._pull_pid(driver), self._pull_pid(driver))
+        self.assertEqual(driver.process.restart_count, 0)
+
+    def test_pull_error(self):
+        driver = self._create_driver("error")
+
+        self.assertRaises(DriverProcessError, driver.pull_data)
+        # An error does not cost the child process
+        self.assertTrue(driver.process.is_alive())
+        self.assertEqual(driver.process.restart_count, 0)
+
+    def test_crashed_process_restarted(self):
+        driver = self._create_driver("crash")
+
+        self.assertRaises(DriverProcessError, driver.pull_data)
+        self.assertFalse(driver.process.is_alive())
+
+        driver.options["behaviour"] = "pid"  # For the next child process
+        pid = self._pull_pid(driver)
+
+        self.assertEqual(pid, driver.process.pid)
+        self.assertEqual(driver.process.restart_count, 1)
+
+    def test_hung_process_killed(self):
+        driver = self._create_driver("hang", pull_timeout=.2)
+
+        self.assertRaises(PullTimeout, driver.pull_data)
+
+        self.assertFalse(driver.process.is_alive())
+        self.assertEqual(driver.process.restart_count, 1)
+
+    def test_process_recycled_after_max_pulls(self):
+        driver = self._create_driver(process_max_pulls=2)
+
+        pids = [self._pull_pid(driver) for _ in range(3)]
+
+        self.assertEqual(pids[0], pids[1])
+        self.assertNotEqual(pids[1], pids[2])
+        self.assertEqual(driver.process.restart_count, 1)
+
+    def test_process_recycled_above_max_memory(self):
+        driver = self._create_driver(process_max_memory=1)
+
+        first_pid = self._pull_pid(driver)
+
+        self.assertFalse(driver.process.is_alive())
+        self.assertNotEqual(self._pull_pid(driver), first_pid)
+
+    def test_stop(self):
+        driver = self._create_driver()
+        driver.pull_once()
+        process = driver.process._process
+
+        driver.stop()
+
+        self.assertFalse(process.is_alive())
+        self.assertEqual(process.exitcode, 0)
@@ -43,13 +43,15 @@ class FakeMetricPuller(MetricPuller):
 
 class TestMetricPuller(TestCase):
 
-    @patch.object(Measurement, "as_dict")
-    def test_puller_send_measurements(self, m_as_dict):
-        data_puller = FakeMetricPuller(
+    def setUp(self):
+        super(TestMetricPuller, self).setUp()
+        self.data_puller = FakeMetricPuller(
             title=FakeMetricPuller.get_entry_name(),
             probe_id=FakeMetricPuller.get_default_probe_id(),
             interval=FakeMetricPuller.get_default_interval(),
         )
+
+    def test_puller_send_measurements(self):
         measurement_dict = OrderedDict(
             name="dummy.data.puller",
             unit="",
@@ -59,14 +61,208 @@ class TestMetricPuller(TestCase):
             host="test_hostname",
             timestamp="2015-08-04T15:15:45.703542",
         )
-        m_as_dict.return_value = measurement_dict
 
         measurement = Measurement(**measurement_dict)
 
         with patch.object(MetricPuller, 'notify') as m_notify:
-            data_puller.send_measurements([measurement])
+            self.data_puller.send_measurements([measurement])
 
-        expected_encoded_msg = msgpack.dumps(measurement_dict)
+        expected_encoded_msg = (
+            msgpack.dumps(["dummy.data.puller", "", "", "test_hostname",
+                           "test_hostname", {}]),
+            "2015-08-04T15:15:45.703542",
+            13.37,
+        )
 
         self.assertTrue(m_notify.called)
-        m_notify.assert_called_once_with(expected_encoded_msg)
+        m_notify.assert_called_once_with([expected_encoded_msg])
+
+    def test_puller_send_measurements_single_notification(self):
+        template = self.data_puller.get_template(
+            name="dummy.data.puller", unit="", type_="",
+            resource_id="test_hostname", host="test_hostname")
+        measurements = [
+            template.create(value=value, timestamp="2015-08-04T15:15:45")
+            for value in range(3)
+        ]
+
+        with patch.object(MetricPuller, 'notify') as m_notify:
+            self.data_puller.send_measurements(measurements)
+
+        packed_static = msgpack.dumps(["dummy.data.puller", "", "",
+                                       "test_hostname", "test_hostname", {}])
+        m_notify.assert_called_once_with([
+            (packed_static, "2015-08-04T15:15:45", value)
+            for value in range(3)
+        ])
+        # The static part is shared by all the measurements of the series
+        packed_measurements = m_notify.call_args[0][0]
+        self.assertIs(packed_measurements[0][0], packed_measurements[1][0])
+
+    def test_puller_get_template(self):
+        template = self.data_puller.get_template(
+            name="dummy.data.puller", unit="", type_="",
+            resource_id="test_hostname", resource_metadata={"state": "ok"})
+
+        self.assertIs(
+            self.data_puller.get_template(
+                name="dummy.data.puller", unit="", type_="",
+                resource_id="test_hostname",
+                resource_metadata={"state": "ok"}),
+            template)
+
+        # Templates are updated whenever the metadata change
+        updated_template = self.data_puller.get_template(
+            name="dummy.data.puller", unit="", type_="",
+            resource_id="test_hostname", resource_metadata={"state": "ko"})
+        self.assertIsNot(updated_template, template)
+        self.assertEqual(updated_template.resource_metadata, {"state": "ko"})
+
+    def test_puller_pull_once(self):
+        measurement = Measurement(
+            name="dummy.data.puller", unit="", type_="", value=13.37,
+            resource_id="test_hostname", host="test_hostname",
+            timestamp="2015-08-04T15:15:45.703542")
+
+        with patch.object(FakeMetricPuller, 'do_pull',
+                          return_value=measurement):
+            with patch.object(MetricPuller, 'notify') as m_notify:
+                self.data_puller.pull_once()
+
+        # A single measurement is sent as a list of one measurement
+        m_notify.assert_called_once_with([measurement.as_sample()])
+
+    def test_puller_pull_once_error(self):
+        with patch.object(FakeMetricPuller, 'do_pull',
+                          side_effect=Exception("Pull error")):
+            with patch.object(MetricPuller, 'notify') as m_notify:
+                # Errors are logged, not raised into the scheduler
+                self.data_puller.pull_once()
+
+        self.assertFalse(m_notify.called)
+
+    def test_puller_pull_once_terminated(self):
+        self.data_puller.stop()
+
+        with patch.object(FakeMetricPuller, 'do_pull') as m_do_pull:
+            self.data_puller.pull_once()
+
+        self.assertFalse(m_do_pull.called)
+
+    def test_puller_pull_once_generator(self):
+        template = self.data_puller.get_template(
+            name="dummy.data.puller", unit="", type_="",
+            resource_id="test_hostname", host="test_hostname")
+        pulled = []
+
+        def _do_pull():
+            for value in range(5):
+                pulled.append(value)
+                yield template.create(value=value, timestamp=1)
+
+        sent = []
+
+        def _notify(packed_measurements):
+            # Measurements are sent before the generator is exhausted
+            sent.append(([value for _, _, value in packed_measurements],
+                         len(pulled)))
+
+        self.data_puller.STREAM_CHUNK_SIZE = 2
+        with patch.object(FakeMetricPuller, 'do_pull', side_effect=_do_pull):
+            with patch.object(MetricPuller, 'notify', side_effect=_notify):
+                self.data_puller.pull_once()
+
+        self.assertEqual(sent, [([0, 1], 2), ([2, 3], 4), ([4], 5)])
+
+    def test_puller_pull_once_generator_terminated(self):
+        template = self.data_puller.get_template(
+            name="dummy.data.puller", unit="", type_="",
+            resource_id="test_hostname", host="test_hostname")
+
+        def _do_pull():
+            yield template.create(value=1, timestamp=1)
+            self.data_puller.stop()
+            yield template.create(value=2, timestamp=1)
+            self.fail("Should have stopped pulling")
+
+        self.data_puller.STREAM_CHUNK_SIZE = 1
+        with patch.object(FakeMetricPuller, 'do_pull', side_effect=_do_pull):
+            with patch.object(MetricPuller, 'notify') as m_notify:
+                self.data_puller.pull_once()
+
+        self.assertEqual(m_notify.call_count, 1)
+
+    def test_puller_process_pulled_data_abandoned(self):
+        template = self.data_puller.get_template(
+            name="dummy.data.puller", unit="", type_="",
+            resource_id="test_hostname", host="test_hostname")
+        abandoned = []
+        closed = []
+
+        def _measurements():
+            try:
+                yield template.create(value=1, timestamp=1)
+                abandoned.append(True)  # Timed out in the meantime
+                yield template.create(value=2, timestamp=1)
+                yield template.create(value=3, timestamp=1)
+            finally:
+                closed.append(True)
+
+        self.data_puller.STREAM_CHUNK_SIZE = 1
+        with patch.object(MetricPuller, 'notify') as m_notify:
+            self.data_puller.process_pulled_data(
+                _measurements(), is_abandoned=lambda: bool(abandoned))
+
+        self.assertEqual(m_notify.call_count, 1)
+        self.assertEqual(closed, [True])
+
+    def test_puller_aggregation(self):
+        data_puller = FakeMetricPuller(
+            title=FakeMetricPuller.get_entry_name(),
+            probe_id=FakeMetricPuller.get_default_probe_id(),
+            interval=FakeMetricPuller.get_default_interval(),
+            aggregation_window=60,
+            aggregation_functions=["max"],
+        )
+        template = data_puller.get_template(
+            name="dummy.data.puller", unit="", type_="",
+            resource_id="test_hostname", host="test_hostname")
+        start = 1438701300 * 10 ** 9
+
+        with patch.object(MetricPuller, 'notify') as m_notify:
+            data_puller.send_measurements(
+                [template.create(value, start + value * 10 ** 9)
+                 for value in range(3)])
+            # Nothing is sent until the window is over
+            self.assertFalse(m_notify.called)
+
+            # The window in progress is sent when stopping
+            data_puller.stop()
+
+        (packed_measurements,), _ = m_notify.call_args
+        self.assertEqual(
+            [(msgpack.loads(static)[0], timestamp, value)
+             for static, timestamp, value in packed_measurements],
+            [("dummy.data.puller.max", start + 60 * 10 ** 9, 2.)])
+
+    def test_puller_send_on_change(self):
+        data_puller = FakeMetricPuller(
+            title=FakeMetricPuller.get_entry_name(),
+            probe_id=FakeMetricPuller.get_default_probe_id(),
+            interval=FakeMetricPuller.get_default_interval(),
+            send_on_change=True,
+            heartbeat_intervals=2,
+        )
+        template = data_puller.get_template(
+            name="dummy.data.puller", unit="", type_="",
+            resource_id="test_hostname", host="test_hostname")
+
+        with patch.object(MetricPuller, 'notify') as m_notify:
+            for value in (8, 8, 8, 16):
+                data_puller.send_measurements(
+                    [template.create(value, timestamp=1)])
+
+        self.assertEqual(
+            [[value for _, _, value in packed_measurements]
+             for (packed_measurements,), _ in m_notify.call_args_list],
+            [[8], [8], [16]])
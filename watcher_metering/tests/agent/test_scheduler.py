@@ -0,0 +1,409 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from threading import active_count
+from threading import Event
+
+from mock import ANY
+from mock import MagicMock
+from mock import patch
+from oslotest.base import BaseTestCase
+from watcher_metering.agent.event_loop import PullTimeout
+from watcher_metering.agent.puller import MetricPuller
+from watcher_metering.agent.scheduler import get_host_phase
+from watcher_metering.agent.scheduler import Scheduler
+
+
+class FakeDriver(object):
+
+    def __init__(self, key, interval, pull_timeout=None):
+        self.key = key
+        self.interval = interval
+        self.pull_timeout = pull_timeout
+        self.is_coroutine = False
+        self.pull_data = MagicMock(return_value=[])
+        self.process_pulled_data = MagicMock()
+        self.log_pull_error = MagicMock()
+
+
+class FakeStreamingPuller(MetricPuller):
+    """Yields a first measurement, then waits for ``released``"""
+
+    STREAM_CHUNK_SIZE = 1
+
+    def __init__(self, released, **kwargs):
+        super(FakeStreamingPuller, self).__init__(**kwargs)
+        self.released = released
+        self.closed = False
+        self.notify = MagicMock()
+
+    @classmethod
+    def get_name(cls):
+        return "streaming"
+
+    @classmethod
+    def get_default_probe_id(cls):
+        return "dummy.data.streaming"
+
+    @classmethod
+    def get_default_interval(cls):
+        return 10
+
+    def do_pull(self):
+        template = self.get_template(
+            name=self.probe_id, unit="", type_="", resource_id="res",
+            host="test_hostname")
+        try:
+            yield template.create(value=1, timestamp=1)
+            self.released.wait(5)
+            yield template.create(value=2, timestamp=1)
+            yield template.create(value=3, timestamp=1)
+        finally:
+            self.closed = True
+
+
+class TestScheduler(BaseTestCase):
+
+    def setUp(self):
+        super(TestScheduler, self).setUp()
+        self.on_tick_done = MagicMock()
+        self.scheduler = Scheduler(max_workers=2,
+                                   on_tick_done=self.on_tick_done,
+                                   align=False)
+
+    def _run_pending_tick(self):
+        """Runs the next due tick synchronously"""
+        interval, tasks, timestamp = self.scheduler._wait_for_tick()
+        with patch.object(self.scheduler.pool, "submit",
+                          side_effect=lambda job, *args: job(*args)):
+            self.scheduler._run_tick(interval, tasks, timestamp)
+        return interval, tasks
+
+    def test_drivers_grouped_by_interval(self):
+        driver1 = FakeDriver("driver1", 10)
+        driver2 = FakeDriver("driver2", 10)
+        driver3 = FakeDriver("driver3", 60)
+        for driver in (driver1, driver2, driver3):
+            self.scheduler.schedule(driver)
+
+        # A single entry per interval
+        self.assertEqual(len(self.scheduler._heap), 2)
+
+        ticks = dict([self._run_pending_tick(), self._run_pending_tick()])
+
+        self.assertEqual([task.driver for task in ticks[10]],
+                         [driver1, driver2])
+        self.assertEqual([task.driver for task in ticks[60]], [driver3])
+        for driver in (driver1, driver2, driver3):
+            driver.pull_data.assert_called_once_with(ANY)
+            self.assertEqual(driver.process_pulled_data.call_count, 1)
+            (measurements,), _ = driver.process_pulled_data.call_args
+            self.assertEqual(measurements, [])
+
+        # Once per tick, not once per driver
+        self.assertEqual(self.on_tick_done.call_count, 2)
+        self.assertEqual(
+            sorted(tick.interval
+                   for (tick,), _ in self.on_tick_done.call_args_list),
+            [10, 60])
+
+        # The next ticks are due an interval later
+        self.assertEqual(sorted(interval for _, _, interval
+                                in self.scheduler._heap), [10, 60])
+
+    def test_skip_when_still_running(self):
+        driver = FakeDriver("driver", 10)
+        self.scheduler.schedule(driver)
+        task = self.scheduler.tasks["driver"]
+        task.running = True
+
+        self._run_pending_tick()
+
+        self.assertFalse(driver.pull_data.called)
+        self.assertEqual(task.stats.skipped_ticks, 1)
+        self.assertFalse(self.on_tick_done.called)
+
+    def test_pull_error(self):
+        driver = FakeDriver("driver", 10)
+        pull_error = Exception("Pull error")
+        driver.pull_data.side_effect = pull_error
+        self.scheduler.schedule(driver)
+        task = self.scheduler.tasks["driver"]
+
+        self._run_pending_tick()
+
+        # The task can be pulled again within the next tick
+        driver.log_pull_error.assert_called_once_with(pull_error)
+        self.assertFalse(task.running)
+        self.assertEqual(task.stats.pulls, 1)
+        self.assertEqual(task.stats.errors, 1)
+        self.assertEqual(self.on_tick_done.call_count, 1)
+
+    def test_pull_timeout(self):
+        driver = FakeDriver("driver", 10)
+        pull_timeout = PullTimeout("Timed out after 10s")
+        driver.pull_data.side_effect = pull_timeout
+        self.scheduler.schedule(driver)
+        task = self.scheduler.tasks["driver"]
+
+        self._run_pending_tick()
+
+        driver.log_pull_error.assert_called_once_with(pull_timeout)
+        self.assertEqual(task.stats.timeouts, 1)
+        self.assertEqual(task.stats.errors, 0)
+
+    def test_late_ticks_are_not_caught_up(self):
+        driver = FakeDriver("driver", 10)
+        with patch("watcher_metering.agent.scheduler._now",
+                   return_value=100.):
+            self.scheduler.schedule(driver)
+        with patch("watcher_metering.agent.scheduler._now",
+                   return_value=135.):
+            self._run_pending_tick()
+
+        next_due, _, _ = self.scheduler._heap[0]
+        self.assertEqual(next_due, 140.)
+        self.assertEqual(driver.pull_data.call_count, 1)
+
+    @patch("watcher_metering.agent.scheduler._epoch",
+           return_value=1438701235.)
+    def test_tick_timestamp_passed_to_pulls(self, m_epoch):
+        driver1 = FakeDriver("driver1", 10)
+        driver2 = FakeDriver("driver2", 10)
+        with patch("watcher_metering.agent.scheduler._now",
+                   return_value=100.):
+            self.scheduler.schedule(driver1)
+            self.scheduler.schedule(driver2)
+        # Run late: stamped with the last grid point, not the missed one
+        with patch("watcher_metering.agent.scheduler._now",
+                   return_value=135.):
+            self._run_pending_tick()
+
+        (tick,), _ = self.on_tick_done.call_args
+        self.assertEqual(tick.timestamp, 1438701230 * 10 ** 9)
+        driver1.pull_data.assert_called_once_with(tick.timestamp)
+        driver2.pull_data.assert_called_once_with(tick.timestamp)
+
+    @patch("watcher_metering.agent.scheduler._epoch",
+           return_value=1438701350.0042)
+    @patch("watcher_metering.agent.scheduler._now", return_value=1000.)
+    def test_tick_timestamp_snapped_to_the_grid(self, m_now, m_epoch):
+        scheduler = Scheduler(align=True, phase_spread=0)
+
+        # The wall clock drifted a few ms away from the monotonic one
+        self.assertEqual(scheduler.get_tick_timestamp(1000., 10),
+                         1438701350 * 10 ** 9)
+        self.assertEqual(scheduler.get_tick_timestamp(990., 10),
+                         1438701340 * 10 ** 9)
+
+    def test_snapshot_cache_expired_on_tick(self):
+        snapshot_cache = MagicMock()
+        scheduler = Scheduler(snapshot_cache=snapshot_cache, align=False)
+        with patch("watcher_metering.agent.scheduler._now",
+                   return_value=100.):
+            scheduler.schedule(FakeDriver("driver", 10))
+            scheduler._wait_for_tick()
+
+        snapshot_cache.start_tick.assert_called_once_with(100.)
+
+    def test_unschedule(self):
+        driver1 = FakeDriver("driver1", 10)
+        driver2 = FakeDriver("driver2", 60)
+        self.scheduler.schedule(driver1)
+        self.scheduler.schedule(driver2)
+        self.scheduler.unschedule("driver1")
+
+        self.assertFalse(self.scheduler.is_scheduled("driver1"))
+        interval, tasks = self._run_pending_tick()
+
+        # The emptied interval group is discarded
+        self.assertEqual(interval, 60)
+        self.assertNotIn(10, self.scheduler._groups)
+        self.assertFalse(driver1.pull_data.called)
+        driver2.pull_data.assert_called_once_with(ANY)
+
+    def test_run_and_stop(self):
+        pulled = Event()
+        driver = FakeDriver("driver", 10)
+        driver.pull_data.side_effect = lambda _: pulled.set()
+        self.scheduler.schedule(driver)
+
+        self.scheduler.start()
+        pulled.wait(5)
+        self.scheduler.stop()
+
+        driver.pull_data.assert_called_once_with(ANY)
+        self.assertFalse(self.scheduler.is_alive())
+
+    def test_pull_stats(self):
+        driver = FakeDriver("driver", 1)
+
+        # Scheduled, due, started and finished
+        with patch("watcher_metering.agent.scheduler._now",
+                   side_effect=[100., 100., 100., 102.]):
+            self.scheduler.schedule(driver)
+            self._run_pending_tick()
+        task = self.scheduler.tasks["driver"]
+
+        stats = task.stats.as_dict()
+        self.assertEqual(stats["pulls"], 1)
+        self.assertEqual(stats["overruns"], 1)
+        self.assertEqual(stats["max_duration"], 2.)
+        self.assertEqual(stats["duration_histogram"]["5"], 1)
+        self.assertEqual(sum(stats["duration_histogram"].values()), 1)
+
+    def test_abandon_overdue_pull(self):
+        released = Event()
+        driver = FakeDriver("driver", 10, pull_timeout=.01)
+        driver.pull_data.side_effect = lambda _: released.wait(5)
+        self.scheduler.schedule(driver)
+        task = self.scheduler.tasks["driver"]
+        self.scheduler.pool.start()
+        self.addCleanup(self.scheduler.pool.stop)
+        worker_count = len(self.scheduler.pool._workers)
+
+        self.scheduler._run_tick(*self.scheduler._wait_for_tick())
+        for _ in range(100):
+            if task.worker is not None:
+                break
+            released.wait(.01)
+        stuck_worker = task.worker
+        # Waits for the deadline of the pull
+        with patch.object(self.scheduler._condition, "wait"):
+            while task.running:
+                with self.scheduler._condition:
+                    self.scheduler._abandon_overdue(
+                        task.last_started_at + 1)
+
+        self.assertEqual(task.stats.timeouts, 1)
+        self.assertEqual(self.on_tick_done.call_count, 1)
+        # The stuck worker got replaced
+        self.assertNotIn(stuck_worker, self.scheduler.pool._workers)
+        self.assertEqual(len(self.scheduler.pool._workers), worker_count)
+
+        released.set()
+        stuck_worker.join(5)
+
+        # What the abandoned pull returned is discarded
+        self.assertFalse(stuck_worker.is_alive())
+        self.assertFalse(driver.process_pulled_data.called)
+        self.assertEqual(self.on_tick_done.call_count, 1)
+
+    def test_hung_pull_costs_a_single_thread(self):
+        released = Event()
+        self.addCleanup(released.set)
+        driver = FakeDriver("driver", 10, pull_timeout=.01)
+        driver.pull_data.side_effect = lambda _: released.wait(30)  # Hung
+        self.scheduler.schedule(driver)
+        task = self.scheduler.tasks["driver"]
+        self.scheduler.pool.start()
+        self.addCleanup(self.scheduler.pool.stop)
+        thread_count = active_count()
+
+        for _ in range(10):
+            self.scheduler._run_tick(10, [task])
+            for _ in range(100):
+                if not task.running or task.worker is not None:
+                    break
+                released.wait(.01)
+            with patch.object(self.scheduler._condition, "wait"):
+                while task.running:
+                    with self.scheduler._condition:
+                        self.scheduler._abandon_overdue(
+                            task.last_started_at + 1)
+
+        # Pulled once, then skipped until the abandoned pull returns
+        self.assertEqual(driver.pull_data.call_count, 1)
+        self.assertEqual(task.stats.timeouts, 1)
+        self.assertEqual(task.stats.skipped_ticks, 9)
+        self.assertLessEqual(active_count(), thread_count + 1)
+
+        stuck_worker = task.stuck_worker
+        released.set()
+        stuck_worker.join(5)
+        self.assertFalse(task.is_stuck)
+
+    def test_abandon_overdue_streaming_pull(self):
+        released = Event()
+        driver = FakeStreamingPuller(
+            released, title="streaming", probe_id="dummy.data.streaming",
+            interval=10, pull_timeout=.01)
+        self.scheduler.schedule(driver)
+        task = self.scheduler.tasks[driver.key]
+        self.scheduler.pool.start()
+        self.addCleanup(self.scheduler.pool.stop)
+
+        self.scheduler._run_tick(*self.scheduler._wait_for_tick())
+        for _ in range(500):
+            if driver.notify.called:
+                break
+            released.wait(.01)
+        stuck_worker = task.worker
+        # The first chunk is sent, then the pull runs past its timeout
+        with patch.object(self.scheduler._condition, "wait"):
+            while task.running:
+                with self.scheduler._condition:
+                    self.scheduler._abandon_overdue(
+                        task.last_started_at + 1)
+        self.assertEqual(task.stats.timeouts, 1)
+
+        released.set()
+        stuck_worker.join(5)
+
+        # No chunk is sent past the timeout and the generator is closed
+        self.assertFalse(stuck_worker.is_alive())
+        self.assertEqual(driver.notify.call_count, 1)
+        self.assertTrue(driver.closed)
+
+    def test_get_host_phase(self):
+        phase = get_host_phase("node-01.example.com")
+
+        self.assertEqual(get_host_phase("node-01.example.com"), phase)
+        self.assertNotEqual(get_host_phase("node-02.example.com"), phase)
+        self.assertTrue(0 <= phase < 1)
+
+    @patch("watcher_metering.agent.scheduler._epoch",
+           return_value=1438701345.5)
+    @patch("watcher_metering.agent.scheduler._now", return_value=1000.)
+    def test_first_due_aligned(self, m_now, m_epoch):
+        scheduler = Scheduler(align=True, phase_spread=0)
+
+        # Next multiple of 10s on the wall clock
+        self.assertEqual(scheduler.get_first_due(10), 1004.5)
+        self.assertEqual(scheduler.get_first_due(60), 1014.5)
+
+    @patch("watcher_metering.agent.scheduler._epoch",
+           return_value=1438701345.5)
+    @patch("watcher_metering.agent.scheduler._now", return_value=1000.)
+    def test_first_due_phase(self, m_now, m_epoch):
+        phase = get_host_phase("node-01.example.com")
+        scheduler = Scheduler(align=True, phase_spread=.5,
+                              host="node-01.example.com")
+
+        first_due = scheduler.get_first_due(60)
+
+        self.assertTrue(1000 <= first_due < 1060)
+        # The pulls of this host are shifted by its phase from the grid
+        wall_due = 1438701345.5 + first_due - 1000
+        self.assertAlmostEqual((wall_due - phase * .5 * 60) % 60, 0,
+                               places=6)
+
+    @patch("watcher_metering.agent.scheduler._now", return_value=1000.)
+    def test_first_due_not_aligned(self, m_now):
+        self.assertEqual(self.scheduler.get_first_due(60), 1000.)
@@ -0,0 +1,199 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from mock import MagicMock
+from oslotest.base import BaseTestCase
+from watcher_metering.agent.sender import MeasurementSender
+from watcher_metering.protocol.frame import pack_static
+from watcher_metering.protocol.frame import unpack_frame
+from watcher_metering.protocol.series import SeriesRegistry
+from watcher_metering.protocol.series import SeriesSessions
+
+
+class TestMeasurementSender(BaseTestCase):
+
+    def setUp(self):
+        super(TestMeasurementSender, self).setUp()
+        self.sent_frames = []
+        self.sessions = SeriesSessions()
+
+        def _fake_send_frame(frame):
+            self.sent_frames.append(
+                [{"value": msg["value"]}
+                 for msg in unpack_frame(frame, self.sessions)])
+            return True
+
+        self.m_send_frame = MagicMock(side_effect=_fake_send_frame)
+
+    def _packed(self, *values):
+        packed_static = pack_static("name", "unit", "gauge", "resource_id",
+                                    "host", {})
+        return [(packed_static, "2015-08-04T15:15:45", value)
+                for value in values]
+
+    def test_put_does_not_send(self):
+        sender = MeasurementSender(self.m_send_frame)
+        sender.put(self._packed(1, 2))
+
+        self.assertFalse(self.m_send_frame.called)
+        self.assertEqual(sender.outbox_length, 2)
+        self.assertEqual(sender.stats.measurements_queued, 2)
+
+    def test_flush_coalesces_measurements(self):
+        sender = MeasurementSender(self.m_send_frame,
+                                   frame_max_measurements=3)
+        # Measurements coming from 2 different drivers
+        sender.put(self._packed(1, 2))
+        sender.put(self._packed(3, 4))
+        sender.flush()
+
+        self.assertEqual(self.sent_frames, [
+            [{"value": 1}, {"value": 2}, {"value": 3}],
+            [{"value": 4}],
+        ])
+        self.assertEqual(sender.stats.frames_sent, 2)
+        self.assertEqual(sender.stats.measurements_sent, 4)
+        self.assertEqual(sender.outbox_length, 0)
+
+    def test_overflow_drop_oldest(self):
+        sender = MeasurementSender(self.m_send_frame, outbox_size=2,
+                                   overflow_policy="drop_oldest")
+        sender.put(self._packed(1, 2, 3))
+        sender.flush()
+
+        self.assertEqual(self.sent_frames, [[{"value": 2}, {"value": 3}]])
+        self.assertEqual(sender.stats.measurements_dropped, 1)
+
+    def test_overflow_drop_newest(self):
+        sender = MeasurementSender(self.m_send_frame, outbox_size=2,
+                                   overflow_policy="drop_newest")
+        sender.put(self._packed(1, 2, 3))
+        sender.flush()
+
+        self.assertEqual(self.sent_frames, [[{"value": 1}, {"value": 2}]])
+        self.assertEqual(sender.stats.measurements_dropped, 1)
+
+    def test_invalid_overflow_policy(self):
+        self.assertRaises(ValueError, MeasurementSender, self.m_send_frame,
+                          overflow_policy="block")
+
+    def test_send_not_ready_keeps_frame(self):
+        self.m_send_frame.side_effect = [False, True]
+        sender = MeasurementSender(self.m_send_frame)
+        sender.put(self._packed(1))
+
+        sender.flush()  # The socket is not ready
+        self.assertEqual(sender.stats.frames_sent, 0)
+        sender.flush()  # The socket is now ready
+
+        self.assertEqual(self.m_send_frame.call_count, 2)
+        self.assertEqual(self.m_send_frame.call_args_list[0],
+                         self.m_send_frame.call_args_list[1])
+        self.assertEqual(sender.stats.frames_sent, 1)
+        self.assertEqual(sender.stats.measurements_dropped, 0)
+
+    def test_send_error_drops_frame(self):
+        self.m_send_frame.side_effect = [Exception("Fake fail!")]
+        sender = MeasurementSender(self.m_send_frame)
+        sender.put(self._packed(1, 2))
+        sender.flush()
+
+        self.assertEqual(sender.stats.send_errors, 1)
+        self.assertEqual(sender.stats.measurements_dropped, 2)
+        self.assertEqual(sender.outbox_length, 0)
+
+    def test_thread_flushes_on_max_delay(self):
+        sender = MeasurementSender(self.m_send_frame,
+                                   frame_max_measurements=100,
+                                   frame_max_delay=.01)
+        sender.start()
+        sender.put(self._packed(1))
+        for _ in range(100):
+            if self.sent_frames:
+                break
+            sender.join(.01)
+        sender.stop()
+
+        self.assertEqual(self.sent_frames, [[{"value": 1}]])
+        self.assertFalse(sender.is_alive())
+
+    def test_kick_sends_without_waiting(self):
+        sender = MeasurementSender(self.m_send_frame,
+                                   frame_max_measurements=100,
+                                   frame_max_delay=60)
+        sender.start()
+        sender.put(self._packed(1, 2))
+        sender.kick()
+        for _ in range(100):
+            if self.sent_frames:
+                break
+            sender.join(.01)
+
+        self.assertEqual(self.sent_frames, [[{"value": 1}, {"value": 2}]])
+        sender.stop()
+
+    def test_stop_flushes_outbox(self):
+        sender = MeasurementSender(self.m_send_frame, frame_max_delay=60)
+        sender.start()
+        sender.put(self._packed(1))
+        sender.stop()
+
+        self.assertEqual(self.sent_frames, [[{"value": 1}]])
+
+    def test_flush_series_frames(self):
+        registry = SeriesRegistry()
+        sender = MeasurementSender(self.m_send_frame, registry=registry,
+                                   frame_max_measurements=2)
+        sender.put(self._packed(1, 2, 3))
+        sender.flush()
+
+        self.assertEqual(self.sent_frames, [
+            [{"value": 1}, {"value": 2}],
+            [{"value": 3}],
+        ])
+        # The series is only registered within the first frame
+        self.assertEqual(sender.stats.series_registered, 1)
+        self.assertEqual(len(registry), 1)
+
+    def test_send_error_registers_series_again(self):
+        self.m_send_frame.side_effect = [Exception("Fake fail!"), True]
+        sender = MeasurementSender(self.m_send_frame,
+                                   registry=SeriesRegistry())
+        sender.put(self._packed(1))
+        sender.flush()
+        sender.put(self._packed(2))
+        sender.flush()
+
+        self.assertEqual(sender.stats.series_registered, 2)
+
+    def test_flush_compressed_frames(self):
+        sender = MeasurementSender(self.m_send_frame,
+                                   registry=SeriesRegistry(), codec="gorilla")
+        packed_static = pack_static("name", "unit", "gauge", "resource_id",
+                                    "host", {})
+        sender.put([(packed_static, 1438701345703542000 + i * 10 ** 9, .5 * i)
+                    for i in range(3)])
+        sender.flush()
+
+        self.assertEqual(self.sent_frames,
+                         [[{"value": 0.}, {"value": .5}, {"value": 1.}]])
+
+    def test_invalid_codec(self):
+        self.assertRaises(ValueError, MeasurementSender, self.m_send_frame,
+                          codec="zip")
@@ -0,0 +1,111 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from threading import Event
+from threading import Thread
+
+from mock import MagicMock
+from oslotest.base import BaseTestCase
+from watcher_metering.agent.snapshot import SnapshotCache
+
+
+class TestSnapshotCache(BaseTestCase):
+
+    def setUp(self):
+        super(TestSnapshotCache, self).setUp()
+        self.cache = SnapshotCache(tolerance=.05)
+
+    def test_read_once_per_tick(self):
+        load = MagicMock(side_effect=[b"first", b"second"])
+        self.cache.start_tick(100.)
+
+        self.assertEqual(self.cache.get("/proc/stat", load), b"first")
+        self.assertEqual(self.cache.get("/proc/stat", load), b"first")
+        self.assertEqual(load.call_count, 1)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+        self.cache.start_tick(110.)
+
+        self.assertEqual(self.cache.get("/proc/stat", load), b"second")
+        self.assertEqual(load.call_count, 2)
+
+    def test_ticks_due_together_share_snapshots(self):
+        load = MagicMock(return_value=b"content")
+        self.cache.start_tick(100.)
+        self.cache.get("/proc/stat", load)
+
+        # e.g. the tick of another interval, due at the same time
+        self.cache.start_tick(100.01)
+        self.cache.get("/proc/stat", load)
+
+        self.assertEqual(load.call_count, 1)
+
+    def test_nothing_kept_out_of_a_tick(self):
+        load = MagicMock(return_value=b"content")
+
+        self.cache.get("/proc/stat", load)
+        self.cache.get("/proc/stat", load)
+
+        self.assertEqual(load.call_count, 2)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_load_error_not_kept(self):
+        load = MagicMock(side_effect=[IOError("No such file"), b"content"])
+        self.cache.start_tick(100.)
+
+        self.assertRaises(IOError, self.cache.get, "/proc/stat", load)
+        self.assertEqual(self.cache.get("/proc/stat", load), b"content")
+
+    def test_concurrent_requests_read_once(self):
+        self.cache.start_tick(100.)
+        loading = Event()
+        release = Event()
+
+        def slow_load():
+            loading.set()
+            release.wait(5)
+            return b"content"
+
+        results = []
+        first = Thread(target=lambda: results.append(
+            self.cache.get("/proc/stat", slow_load)))
+        first.start()
+        loading.wait(5)
+        load = MagicMock(return_value=b"other")
+        second = Thread(target=lambda: results.append(
+            self.cache.get("/proc/stat", load)))
+        second.start()
+        release.set()
+        first.join(5)
+        second.join(5)
+
+        # The second request waited for the first read
+        self.assertFalse(load.called)
+        self.assertEqual(results, [b"content", b"content"])
+
+    def test_snapshot_of_expired_tick_not_kept(self):
+        self.cache.start_tick(100.)
+
+        def load():
+            # The next tick starts while reading
+            self.cache.start_tick(110.)
+            return b"old"
+
+        self.assertEqual(self.cache.get("/proc/stat", load), b"old")
+        self.assertEqual(len(self.cache), 0)
@@ -0,0 +1,62 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals
+
+import os
+
+import fixtures
+from mock import patch
+from oslotest.base import BaseTestCase
+
+
+class ProcfsTestCase(BaseTestCase):
+    """Runs the drivers against a fake procfs"""
+
+    def setUp(self):
+        super(ProcfsTestCase, self).setUp()
+        self.procfs_path = self.useFixture(fixtures.TempDir()).path
+        self.now = 1000.
+        patcher = patch("watcher_metering.drivers.linux.procfs._now",
+                        side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write_proc_file(self, relative_path, content):
+        """Rewrites the file in place, as the kernel would"""
+        path = os.path.join(self.procfs_path, relative_path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "wb") as proc_file:
+            proc_file.write(content)
+
+    def create_driver(self, driver_cls, **kwargs):
+        """Instantiates the driver like the loader does, out of its opts"""
+        opts = {opt.dest: opt.default for opt in driver_cls.get_config_opts()}
+        opts.update(procfs_path=self.procfs_path, **kwargs)
+        driver = driver_cls(**opts)
+        self.addCleanup(driver.stop)
+        return driver
+
+    def pull(self, driver, elapsed=0):
+        """Pulls the driver ``elapsed`` seconds after the last pull
+
+        :return: The values pulled, by (name, resource_id)
+        :rtype: dict
+        """
+        self.now += elapsed
+        return {(measurement.name, measurement.resource_id): measurement.value
+                for measurement in driver.do_pull()}
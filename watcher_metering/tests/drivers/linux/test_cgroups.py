@@ -0,0 +1,239 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import errno
+import os
+import shutil
+
+from mock import patch
+from watcher_metering.agent.measurement import HOSTNAME
+from watcher_metering.drivers.linux import cgroups
+from watcher_metering.drivers.linux.cgroups import CgroupPuller
+from watcher_metering.drivers.linux.cgroups import CgroupTree
+from watcher_metering.drivers.linux.cgroups import parse_blkio_bytes
+from watcher_metering.drivers.linux.cgroups import parse_io_stat
+from watcher_metering.tests.drivers.linux.procfs_fixtures import (
+    ProcfsTestCase)
+
+CPU_STAT = b"usage_usec %d\nuser_usec 0\nsystem_usec 0\n"
+IO_STAT = (b"8:0 rbytes=%d wbytes=%d rios=1 wios=1 dbytes=0 dios=0\n"
+           b"8:16 rbytes=0 wbytes=1000 rios=0 wios=1 dbytes=0 dios=0\n")
+BLKIO_BYTES = (b"8:0 Read %d\n8:0 Write %d\n8:0 Sync 0\n8:0 Async 0\n"
+               b"8:0 Total 0\nTotal 0\n")
+
+VM = "machine.slice/machine-qemu\\x2d1\\x2dinstance.scope"
+
+
+class TestCgroupTree(ProcfsTestCase):
+
+    def _mkdir(self, path):
+        os.makedirs(os.path.join(self.procfs_path, path))
+
+    def test_refresh(self):
+        self._mkdir("system.slice/sshd.service")
+        self._mkdir("machine.slice")
+        tree = CgroupTree(self.procfs_path, max_depth=4)
+
+        self.assertEqual(tree.refresh(), ({"system.slice",
+                                           "system.slice/sshd.service",
+                                           "machine.slice"}, set()))
+
+        self._mkdir(VM)
+        shutil.rmtree(os.path.join(self.procfs_path, "system.slice"))
+        self.assertEqual(tree.refresh(), ({VM}, {
+            "system.slice", "system.slice/sshd.service"}))
+        self.assertEqual(sorted(tree), ["machine.slice", VM])
+
+    def test_unchanged_directories_not_listed(self):
+        self._mkdir("system.slice/sshd.service")
+        self._mkdir("machine.slice")
+        tree = CgroupTree(self.procfs_path, max_depth=4)
+        tree.refresh()
+
+        with patch("os.listdir", side_effect=os.listdir) as m_listdir:
+            self.assertEqual(tree.refresh(), (set(), set()))
+            self.assertFalse(m_listdir.called)
+
+            self._mkdir(VM)
+            tree.refresh()
+
+        self.assertEqual(
+            [args for (args,), _ in m_listdir.call_args_list],
+            [os.path.join(self.procfs_path, "machine.slice"),
+             os.path.join(self.procfs_path, VM)])
+
+    def test_max_depth(self):
+        self._mkdir(VM + "/libvirt/vcpu0")
+        tree = CgroupTree(self.procfs_path, max_depth=2)
+
+        self.assertEqual(tree.refresh()[0], {"machine.slice", VM})
+
+
+class TestCgroupPuller(ProcfsTestCase):
+
+    def setUp(self):
+        super(TestCgroupPuller, self).setUp()
+        self.write_proc_file("cgroup.controllers", b"cpu io memory pids\n")
+
+    def _write_cgroup(self, path, usage_usec=0, memory=0, read_bytes=0,
+                      write_bytes=0):
+        self.write_proc_file(os.path.join(path, "cpu.stat"),
+                             CPU_STAT % usage_usec)
+        self.write_proc_file(os.path.join(path, "memory.current"),
+                             b"%d\n" % memory)
+        self.write_proc_file(os.path.join(path, "io.stat"),
+                             IO_STAT % (read_bytes, write_bytes))
+
+    def _create_driver(self, **kwargs):
+        return self.create_driver(CgroupPuller,
+                                  cgroup_path=self.procfs_path, **kwargs)
+
+    def test_usage(self):
+        driver = self._create_driver()
+        self._write_cgroup(VM, usage_usec=1000000, memory=4096,
+                           read_bytes=0, write_bytes=0)
+        self._write_cgroup("system.slice/sshd.service")
+        resource_id = "%s_%s" % (HOSTNAME, VM)
+        self.assertEqual(self.pull(driver), {
+            ("compute.cgroup.memory.usage", resource_id): 4096,
+        })
+
+        self._write_cgroup(VM, usage_usec=2000000, memory=8192,
+                           read_bytes=4096, write_bytes=2048)
+        values = self.pull(driver, elapsed=2)
+
+        # The services are not monitored by default
+        self.assertEqual(values, {
+            ("compute.cgroup.cpu.percent", resource_id): 50.,
+            ("compute.cgroup.memory.usage", resource_id): 8192,
+            ("compute.cgroup.io.read.bytes.rate", resource_id): 2048.,
+            ("compute.cgroup.io.write.bytes.rate", resource_id): 1024.,
+        })
+
+    def test_metadata(self):
+        driver = self._create_driver()
+        self._write_cgroup(VM)
+
+        measurement, = driver.do_pull()
+
+        self.assertEqual(measurement.resource_metadata,
+                         {"cgroup": "/" + VM})
+
+    def test_single_batch(self):
+        driver = self._create_driver()
+        self._write_cgroup(VM)
+        self._write_cgroup("machine.slice/machine-lxc.scope")
+
+        with patch.object(driver, "send_measurements") as m_send:
+            driver.pull_once()
+
+        (measurements,), _ = m_send.call_args
+        self.assertEqual(m_send.call_count, 1)
+        self.assertEqual(len(measurements), 2)
+
+    def test_controller_not_enabled(self):
+        driver = self._create_driver()
+        self._write_cgroup(VM)
+        os.remove(os.path.join(self.procfs_path, VM, "io.stat"))
+        self.pull(driver)
+
+        values = self.pull(driver, elapsed=1)
+
+        self.assertEqual(sorted(name for name, _ in values),
+                         ["compute.cgroup.cpu.percent",
+                          "compute.cgroup.memory.usage"])
+
+    def test_removed_cgroup_forgotten(self):
+        driver = self._create_driver()
+        self._write_cgroup(VM)
+        self.pull(driver)
+
+        shutil.rmtree(os.path.join(self.procfs_path, VM))
+        self.assertEqual(self.pull(driver, elapsed=1), {})
+
+        self.assertEqual(driver._cgroups, {})
+        self.assertEqual(len(driver.rates), 0)
+
+    def test_max_cgroups(self):
+        driver = self._create_driver(max_cgroups=1)
+        self._write_cgroup(VM)
+        self._write_cgroup("machine.slice/machine-lxc.scope")
+
+        values = self.pull(driver)
+
+        self.assertEqual(len(values), 1)
+
+    @patch.object(cgroups, "get_fd_capacity", return_value=1)
+    def test_max_cgroups_capped_by_fd_limit(self, m_get_fd_capacity):
+        driver = self._create_driver(max_cgroups=2)
+
+        m_get_fd_capacity.assert_called_once_with(3)
+        self.assertEqual(driver.max_cgroups, 1)
+
+    def test_fd_exhausted(self):
+        driver = self._create_driver()
+        self._write_cgroup(VM)
+        self._write_cgroup("machine.slice/machine-lxc.scope")
+
+        with patch.object(driver, "_track", side_effect=OSError(
+                errno.EMFILE, "Too many open files")) as m_track:
+            self.assertEqual(self.pull(driver), {})
+
+        # No other cgroup tracked during this pull, but all of them later
+        self.assertEqual(m_track.call_count, 1)
+        self.assertEqual(len(self.pull(driver, elapsed=1)), 2)
+
+    def test_read_error_not_forgotten(self):
+        driver = self._create_driver()
+        self._write_cgroup(VM)
+        self.pull(driver)
+        cgroup = driver._cgroups[VM]
+
+        with patch.object(driver, "_add_usage", side_effect=OSError(
+                errno.EIO, "Input/output error")):
+            self.assertEqual(self.pull(driver, elapsed=1), {})
+
+        # Its files are kept open rather than reopened
+        self.assertIs(driver._cgroups[VM], cgroup)
+
+    def test_cgroup_v1(self):
+        os.remove(os.path.join(self.procfs_path, "cgroup.controllers"))
+        driver = self._create_driver()
+        for usage, memory, read_bytes in ((10 ** 9, 4096, 0),
+                                          (3 * 10 ** 9, 8192, 512)):
+            self.write_proc_file("cpuacct/docker/abc/cpuacct.usage",
+                                 b"%d\n" % usage)
+            self.write_proc_file("memory/docker/abc/memory.usage_in_bytes",
+                                 b"%d\n" % memory)
+            self.write_proc_file(
+                "blkio/docker/abc/blkio.throttle.io_service_bytes",
+                BLKIO_BYTES % (read_bytes, 0))
+            values = self.pull(driver, elapsed=1)
+
+        resource_id = "%s_docker/abc" % HOSTNAME
+        self.assertEqual(values, {
+            ("compute.cgroup.cpu.percent", resource_id): 200.,
+            ("compute.cgroup.memory.usage", resource_id): 8192,
+            ("compute.cgroup.io.read.bytes.rate", resource_id): 512.,
+            ("compute.cgroup.io.write.bytes.rate", resource_id): 0.,
+        })
+
+    def test_parse_io(self):
+        self.assertEqual(parse_io_stat(IO_STAT % (1, 2)), (1, 1002))
+        self.assertEqual(parse_blkio_bytes(BLKIO_BYTES % (1, 2)), (1, 2))
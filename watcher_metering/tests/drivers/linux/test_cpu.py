@@ -0,0 +1,78 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from watcher_metering.agent.measurement import HOSTNAME
+from watcher_metering.drivers.linux.cpu import CpuPuller
+from watcher_metering.tests.drivers.linux.procfs_fixtures import (
+    ProcfsTestCase)
+
+STAT = (b"cpu  %d 0 %d %d %d 0 0 0 0 0\n"
+        b"cpu0 %d 0 %d %d %d 0 0 0 0 0\n"
+        b"cpu1 %d 0 %d %d %d 0 0 0 0 0\n"
+        b"intr 204351 0 0\n"
+        b"ctxt %d\n"
+        b"btime 1438701345\n"
+        b"processes %d\n")
+
+
+class TestCpuPuller(ProcfsTestCase):
+
+    def test_usage(self):
+        driver = self.create_driver(CpuPuller)
+        self.write_proc_file("stat", STAT % (
+            100, 100, 700, 100, 50, 50, 350, 50, 50, 50, 350, 50,
+            1000, 10))
+
+        # Rates need a previous pull
+        self.assertEqual(self.pull(driver), {})
+
+        # user system idle iowait
+        self.write_proc_file("stat", STAT % (
+            160, 120, 710, 110, 80, 60, 355, 55, 80, 60, 355, 55,
+            1500, 12))
+        values = self.pull(driver, elapsed=.5)
+
+        self.assertEqual(values, {
+            ("compute.node.cpu.percent", HOSTNAME): 80.,
+            ("compute.node.cpu.user.percent", HOSTNAME): 60.,
+            ("compute.node.cpu.system.percent", HOSTNAME): 20.,
+            ("compute.node.cpu.iowait.percent", HOSTNAME): 10.,
+            ("compute.node.cpu.steal.percent", HOSTNAME): 0.,
+            ("compute.node.context_switches.rate", HOSTNAME): 1000.,
+            ("compute.node.forks.rate", HOSTNAME): 4.,
+        })
+
+    def test_per_cpu(self):
+        driver = self.create_driver(CpuPuller, per_cpu=True)
+        self.write_proc_file("stat", STAT % (
+            100, 100, 700, 100, 50, 50, 350, 50, 50, 50, 350, 50,
+            1000, 10))
+        self.pull(driver)
+        self.write_proc_file("stat", STAT % (
+            160, 120, 710, 110, 80, 60, 355, 55, 80, 60, 355, 55,
+            1500, 12))
+
+        values = self.pull(driver, elapsed=1)
+
+        cpu0 = "%s_cpu0" % HOSTNAME
+        self.assertEqual(values[("compute.node.cpu.percent", cpu0)], 80.)
+        self.assertEqual(
+            values[("compute.node.cpu.user.percent", "%s_cpu1" % HOSTNAME)],
+            60.)
+        self.assertEqual(len(values), 3 * 5 + 2)
@@ -0,0 +1,78 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from watcher_metering.agent.measurement import HOSTNAME
+from watcher_metering.drivers.linux.disk import DiskPuller
+from watcher_metering.tests.drivers.linux.procfs_fixtures import (
+    ProcfsTestCase)
+
+DISKSTATS_LINE = (b"   8       0 %s %d 0 %d 0 %d 0 %d 0 0 %d 0 "
+                  b"0 0 0 0\n")
+
+
+class TestDiskPuller(ProcfsTestCase):
+
+    def _write_diskstats(self, *devices):
+        self.write_proc_file("diskstats", b"".join(
+            DISKSTATS_LINE % device for device in devices))
+
+    def test_rates(self):
+        driver = self.create_driver(DiskPuller)
+        # reads, sectors read, writes, sectors written, ms doing I/Os
+        self._write_diskstats((b"sda", 100, 800, 50, 400, 1000),
+                              (b"loop0", 0, 0, 0, 0, 0))
+        self.assertEqual(self.pull(driver), {})
+
+        self._write_diskstats((b"sda", 120, 1000, 60, 2400, 1500),
+                              (b"loop0", 0, 0, 0, 0, 0))
+        values = self.pull(driver, elapsed=2)
+
+        # Loop devices are excluded by default
+        sda = "%s_sda" % HOSTNAME
+        self.assertEqual(values, {
+            ("compute.node.disk.read.bytes.rate", sda): 51200.,
+            ("compute.node.disk.write.bytes.rate", sda): 512000.,
+            ("compute.node.disk.read.requests.rate", sda): 10.,
+            ("compute.node.disk.write.requests.rate", sda): 5.,
+            ("compute.node.disk.busy.percent", sda): 25.,
+        })
+
+    def test_devices(self):
+        driver = self.create_driver(DiskPuller, devices=["sdb"])
+        self._write_diskstats((b"sda", 1, 1, 1, 1, 1),
+                              (b"sdb", 1, 1, 1, 1, 1))
+        self.pull(driver)
+
+        values = self.pull(driver, elapsed=1)
+
+        self.assertEqual(set(resource_id for _, resource_id in values),
+                         {"%s_sdb" % HOSTNAME})
+
+    def test_removed_device_forgotten(self):
+        driver = self.create_driver(DiskPuller)
+        self._write_diskstats((b"sda", 1, 1, 1, 1, 1),
+                              (b"sdb", 1, 1, 1, 1, 1))
+        self.pull(driver)
+        self._write_diskstats((b"sda", 1, 1, 1, 1, 1))
+
+        self.pull(driver, elapsed=1)
+
+        self.assertEqual(len(driver.rates), 5)
+        self.assertEqual(set(driver._resource_templates), {"sda"})
+        self.assertEqual(set(driver._names), {b"sda"})
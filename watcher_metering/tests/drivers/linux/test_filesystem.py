@@ -0,0 +1,94 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+
+from mock import patch
+from watcher_metering.agent.measurement import HOSTNAME
+from watcher_metering.drivers.linux.filesystem import FilesystemPuller
+from watcher_metering.drivers.linux.filesystem import unescape_mount_point
+from watcher_metering.tests.drivers.linux.procfs_fixtures import (
+    ProcfsTestCase)
+
+StatVFS = collections.namedtuple(
+    "StatVFS", "f_frsize f_blocks f_bfree f_bavail f_files f_ffree")
+
+MOUNTS = (b"proc /proc proc rw,relatime 0 0\n"
+          b"/dev/sda1 / ext4 rw,relatime 0 0\n"
+          b"tmpfs /run tmpfs rw,relatime 0 0\n"
+          b"/dev/sdb1 /srv/my\\040data xfs rw,relatime 0 0\n"
+          b"/dev/sda1 /var/lib/docker ext4 rw,relatime 0 0\n")
+
+
+class TestFilesystemPuller(ProcfsTestCase):
+
+    def setUp(self):
+        super(TestFilesystemPuller, self).setUp()
+        self.write_proc_file("self/mounts", MOUNTS)
+        patcher = patch("os.statvfs", return_value=StatVFS(
+            f_frsize=4096, f_blocks=1000, f_bfree=300, f_bavail=100,
+            f_files=200, f_ffree=150))
+        self.m_statvfs = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_usage(self):
+        driver = self.create_driver(FilesystemPuller)
+
+        values = self.pull(driver)
+
+        # Once per device
+        self.assertEqual([args for (args,), _ in
+                          self.m_statvfs.call_args_list],
+                         ["/", "/srv/my data"])
+        root = "%s_/" % HOSTNAME
+        self.assertEqual(values[("compute.node.filesystem.total", root)],
+                         4096000)
+        self.assertEqual(values[("compute.node.filesystem.used", root)],
+                         2867200)
+        self.assertEqual(
+            values[("compute.node.filesystem.available", root)], 409600)
+        self.assertEqual(values[("compute.node.filesystem.percent", root)],
+                         87.5)
+        self.assertEqual(
+            values[("compute.node.filesystem.inodes.percent", root)], 25.)
+
+    def test_mount_points(self):
+        driver = self.create_driver(FilesystemPuller, mount_points=["/run"])
+
+        values = self.pull(driver)
+
+        self.assertEqual(set(resource_id for _, resource_id in values),
+                         {"%s_/run" % HOSTNAME})
+
+    def test_mounts_parsed_on_change_only(self):
+        driver = self.create_driver(FilesystemPuller)
+        self.pull(driver)
+
+        with patch.object(driver, "_parse_mounts") as m_parse_mounts:
+            self.pull(driver)
+            self.assertFalse(m_parse_mounts.called)
+
+            self.write_proc_file("self/mounts", MOUNTS.replace(
+                b"tmpfs /run tmpfs rw,relatime 0 0\n", b""))
+            self.pull(driver)
+            self.assertTrue(m_parse_mounts.called)
+
+    def test_unescape_mount_point(self):
+        self.assertEqual(unescape_mount_point(b"/srv/my\\040data\\011"),
+                         "/srv/my data\t")
@@ -0,0 +1,48 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from watcher_metering.agent.measurement import HOSTNAME
+from watcher_metering.drivers.linux.load import LoadPuller
+from watcher_metering.tests.drivers.linux.procfs_fixtures import (
+    ProcfsTestCase)
+
+
+class TestLoadPuller(ProcfsTestCase):
+
+    def test_load(self):
+        driver = self.create_driver(LoadPuller)
+        self.write_proc_file("loadavg", b"0.52 0.58 0.59 2/1289 12345\n")
+
+        self.assertEqual(self.pull(driver), {
+            ("compute.node.load.1min", HOSTNAME): .52,
+            ("compute.node.load.5min", HOSTNAME): .58,
+            ("compute.node.load.15min", HOSTNAME): .59,
+            ("compute.node.tasks.runnable", HOSTNAME): 2,
+            ("compute.node.tasks.total", HOSTNAME): 1289,
+        })
+
+    def test_measurements_stamped_with_the_tick(self):
+        driver = self.create_driver(LoadPuller)
+        self.write_proc_file("loadavg", b"0.52 0.58 0.59 2/1289 12345\n")
+
+        measurements = driver.pull_data(1438701350000000000)
+
+        self.assertEqual({measurement.timestamp
+                          for measurement in measurements},
+                         {1438701350000000000})
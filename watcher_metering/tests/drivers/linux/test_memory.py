@@ -0,0 +1,95 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from watcher_metering.agent.measurement import HOSTNAME
+from watcher_metering.agent.snapshot import SnapshotCache
+from watcher_metering.drivers.linux.memory import MemoryPuller
+from watcher_metering.drivers.linux.memory import PAGE_SIZE
+from watcher_metering.tests.drivers.linux.procfs_fixtures import (
+    ProcfsTestCase)
+
+MEMINFO = (b"MemTotal:        4000 kB\n"
+           b"MemFree:          500 kB\n"
+           b"MemAvailable:    1000 kB\n"
+           b"Buffers:          100 kB\n"
+           b"Cached:           300 kB\n"
+           b"SwapTotal:       2000 kB\n"
+           b"SwapFree:        1500 kB\n")
+VMSTAT = b"nr_free_pages 125\npswpin %d\npswpout %d\npgmajfault %d\n"
+
+
+class TestMemoryPuller(ProcfsTestCase):
+
+    def setUp(self):
+        super(TestMemoryPuller, self).setUp()
+        self.write_proc_file("meminfo", MEMINFO)
+        self.write_proc_file("vmstat", VMSTAT % (0, 0, 0))
+
+    def test_usage(self):
+        driver = self.create_driver(MemoryPuller)
+        self.write_proc_file("vmstat", VMSTAT % (0, 0, 0))
+
+        self.assertEqual(self.pull(driver), {
+            ("compute.node.memory.total", HOSTNAME): 4096000,
+            ("compute.node.memory.available", HOSTNAME): 1024000,
+            ("compute.node.memory.used", HOSTNAME): 3072000,
+            ("compute.node.memory.percent", HOSTNAME): 75.,
+            ("compute.node.swap.used", HOSTNAME): 512000,
+            ("compute.node.swap.percent", HOSTNAME): 25.,
+        })
+
+    def test_paging_rates(self):
+        driver = self.create_driver(MemoryPuller)
+        self.pull(driver)
+        self.write_proc_file("vmstat", VMSTAT % (10, 20, 30))
+
+        values = self.pull(driver, elapsed=10)
+
+        self.assertEqual(values[("compute.node.swap.in.rate", HOSTNAME)],
+                         PAGE_SIZE)
+        self.assertEqual(values[("compute.node.swap.out.rate", HOSTNAME)],
+                         2 * PAGE_SIZE)
+        self.assertEqual(
+            values[("compute.node.memory.major_faults.rate", HOSTNAME)], 3.)
+
+    def test_without_mem_available(self):
+        driver = self.create_driver(MemoryPuller)
+        self.write_proc_file("meminfo", MEMINFO.replace(
+            b"MemAvailable:    1000 kB\n", b""))
+
+        values = self.pull(driver)
+
+        # Free, buffers and cache
+        self.assertEqual(
+            values[("compute.node.memory.available", HOSTNAME)], 921600)
+
+    def test_snapshot_shared_between_drivers(self):
+        snapshot_cache = SnapshotCache()
+        drivers = [self.create_driver(MemoryPuller, title="memory%d" % index)
+                   for index in range(2)]
+        for driver in drivers:
+            driver.snapshot_cache = snapshot_cache
+        snapshot_cache.start_tick(100.)
+
+        values = [self.pull(driver) for driver in drivers]
+
+        # /proc/meminfo and /proc/vmstat read and parsed once
+        self.assertEqual(values[0], values[1])
+        self.assertEqual((snapshot_cache.hits, snapshot_cache.misses),
+                         (2, 4))
@@ -0,0 +1,93 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from watcher_metering.agent.measurement import HOSTNAME
+from watcher_metering.drivers.linux.network import NetworkPuller
+from watcher_metering.tests.drivers.linux.procfs_fixtures import (
+    ProcfsTestCase)
+
+NET_DEV_HEADER = (
+    b"Inter-|   Receive                                                |  "
+    b"Transmit\n"
+    b" face |bytes    packets errs drop fifo frame compressed multicast|"
+    b"bytes    packets errs drop fifo colls carrier compressed\n")
+NET_DEV_LINE = b"%6s:%d %d %d %d 0 0 0 0 %d %d %d %d 0 0 0 0\n"
+
+
+class TestNetworkPuller(ProcfsTestCase):
+
+    def _write_net_dev(self, *interfaces):
+        self.write_proc_file("net/dev", NET_DEV_HEADER + b"".join(
+            NET_DEV_LINE % interface for interface in interfaces))
+
+    def test_rates(self):
+        driver = self.create_driver(NetworkPuller)
+        self._write_net_dev((b"lo", 500, 5, 0, 0, 500, 5, 0, 0),
+                            (b"eth0", 1000, 10, 0, 0, 2000, 20, 0, 0))
+        self.assertEqual(self.pull(driver), {})
+
+        self._write_net_dev((b"lo", 900, 9, 0, 0, 900, 9, 0, 0),
+                            (b"eth0", 5000, 50, 2, 4, 3000, 30, 0, 2))
+        values = self.pull(driver, elapsed=4)
+
+        # The loopback interface is excluded by default
+        eth0 = "%s_eth0" % HOSTNAME
+        self.assertEqual(values, {
+            ("compute.node.network.incoming.bytes.rate", eth0): 1000.,
+            ("compute.node.network.incoming.packets.rate", eth0): 10.,
+            ("compute.node.network.incoming.errors.rate", eth0): .5,
+            ("compute.node.network.incoming.drops.rate", eth0): 1.,
+            ("compute.node.network.outgoing.bytes.rate", eth0): 250.,
+            ("compute.node.network.outgoing.packets.rate", eth0): 2.5,
+            ("compute.node.network.outgoing.errors.rate", eth0): 0.,
+            ("compute.node.network.outgoing.drops.rate", eth0): .5,
+        })
+
+    def test_counter_reset(self):
+        driver = self.create_driver(NetworkPuller)
+        self._write_net_dev((b"eth0", 1000, 10, 0, 0, 2000, 20, 0, 0))
+        self.pull(driver)
+        self._write_net_dev((b"eth0", 10, 1, 0, 0, 2000, 20, 0, 0))
+
+        values = self.pull(driver, elapsed=1)
+
+        # No rate out of the counters which went backwards
+        eth0 = "%s_eth0" % HOSTNAME
+        self.assertNotIn(("compute.node.network.incoming.bytes.rate", eth0),
+                         values)
+        self.assertEqual(
+            values[("compute.node.network.outgoing.bytes.rate", eth0)], 0.)
+
+    def test_removed_interface_forgotten(self):
+        driver = self.create_driver(NetworkPuller)
+        self._write_net_dev((b"lo", 500, 5, 0, 0, 500, 5, 0, 0),
+                            (b"eth0", 1000, 10, 0, 0, 2000, 20, 0, 0),
+                            (b"veth1", 1000, 10, 0, 0, 2000, 20, 0, 0))
+        self.pull(driver)
+        self.pull(driver, elapsed=1)
+        self._write_net_dev((b"eth0", 1000, 10, 0, 0, 2000, 20, 0, 0))
+
+        values = self.pull(driver, elapsed=1)
+
+        self.assertEqual(set(resource_id for _, resource_id in values),
+                         {"%s_eth0" % HOSTNAME})
+        self.assertEqual(len(driver.rates), 8)
+        self.assertEqual(set(driver._resource_templates), {"eth0"})
+        # Along with the excluded ones
+        self.assertEqual(set(driver._names), {b"eth0"})
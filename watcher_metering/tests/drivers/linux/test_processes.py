@@ -0,0 +1,218 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import errno
+import os
+import shutil
+
+from mock import patch
+from watcher_metering.agent.measurement import HOSTNAME
+from watcher_metering.drivers.linux import processes
+from watcher_metering.drivers.linux.processes import parse_stat
+from watcher_metering.drivers.linux.processes import ProcessPuller
+from watcher_metering.tests.drivers.linux.procfs_fixtures import (
+    ProcfsTestCase)
+
+STAT = (b"%d (%s) S 1 1 1 0 -1 4194560 100 0 0 0 %d %d 0 0 20 0 1 0 "
+        b"4242 10485760 %d 0 0 0\n")
+IO = (b"rchar: 0\nwchar: 0\nsyscr: 0\nsyscw: 0\n"
+      b"read_bytes: %d\nwrite_bytes: %d\ncancelled_write_bytes: 0\n")
+
+
+@patch.object(processes, "CLOCK_TICKS", 100)
+@patch.object(processes, "PAGE_SIZE", 4096)
+class TestProcessPuller(ProcfsTestCase):
+
+    def _write_process(self, pid, name=b"nova-compute", utime=0, stime=0,
+                       rss=0, read_bytes=0, write_bytes=0,
+                       cgroup=b"0::/system.slice/nova.service\n"):
+        self.write_proc_file("%d/stat" % pid,
+                             STAT % (pid, name, utime, stime, rss))
+        self.write_proc_file("%d/io" % pid, IO % (read_bytes, write_bytes))
+        self.write_proc_file("%d/cgroup" % pid, cgroup)
+
+    def _remove_process(self, pid):
+        shutil.rmtree(os.path.join(self.procfs_path, str(pid)))
+
+    def test_usage(self):
+        driver = self.create_driver(ProcessPuller)
+        self._write_process(42, utime=100, stime=50, rss=10,
+                            read_bytes=1000, write_bytes=0)
+        resource_id = "%s_42" % HOSTNAME
+        self.assertEqual(self.pull(driver), {
+            ("compute.process.memory.rss", resource_id): 40960,
+        })
+
+        self._write_process(42, utime=250, stime=100, rss=20,
+                            read_bytes=5000, write_bytes=2000)
+        values = self.pull(driver, elapsed=2)
+
+        self.assertEqual(values, {
+            ("compute.process.cpu.percent", resource_id): 100.,
+            ("compute.process.memory.rss", resource_id): 81920,
+            ("compute.process.io.read.bytes.rate", resource_id): 2000.,
+            ("compute.process.io.write.bytes.rate", resource_id): 1000.,
+        })
+
+    def test_metadata(self):
+        driver = self.create_driver(ProcessPuller)
+        self._write_process(42)
+
+        measurement, = driver.do_pull()
+
+        self.assertEqual(measurement.resource_metadata, {
+            "pid": 42, "name": "nova-compute", "uid": os.getuid(),
+            "cgroup": "0::/system.slice/nova.service"})
+
+    def test_name_pattern(self):
+        driver = self.create_driver(ProcessPuller,
+                                    name_pattern="^nova-")
+        self._write_process(42)
+        self._write_process(43, name=b"bash")
+
+        self.assertEqual(set(resource_id for _, resource_id in
+                             self.pull(driver)),
+                         {"%s_42" % HOSTNAME})
+
+    def test_cgroup_pattern(self):
+        driver = self.create_driver(ProcessPuller,
+                                    cgroup_pattern=r"^0::/machine\.slice/")
+        self._write_process(42)
+        self._write_process(43, cgroup=b"1:cpu:/\n"
+                                       b"0::/machine.slice/qemu-1.scope\n")
+
+        self.assertEqual(set(resource_id for _, resource_id in
+                             self.pull(driver)),
+                         {"%s_43" % HOSTNAME})
+
+    def test_uids(self):
+        driver = self.create_driver(ProcessPuller,
+                                    uids=[str(os.getuid() + 1)])
+        self._write_process(42)
+
+        self.assertEqual(self.pull(driver), {})
+
+    def test_new_pids_examined_only(self):
+        driver = self.create_driver(ProcessPuller, name_pattern="^nova-")
+        self._write_process(42)
+        self._write_process(43, name=b"bash")
+        self.pull(driver)
+
+        with patch.object(driver, "_track", return_value=None) as m_track:
+            self._write_process(44)
+            self.pull(driver, elapsed=1)
+
+        m_track.assert_called_once_with(44)
+
+    def test_gone_process_forgotten(self):
+        driver = self.create_driver(ProcessPuller)
+        self._write_process(42)
+        self._write_process(43)
+        self.pull(driver)
+
+        self._remove_process(43)
+        values = self.pull(driver, elapsed=1)
+
+        self.assertEqual(set(resource_id for _, resource_id in values),
+                         {"%s_42" % HOSTNAME})
+        self.assertEqual(sorted(driver._processes), [42])
+
+        # Reused PID
+        self._write_process(43, name=b"bash")
+        self.pull(driver, elapsed=1)
+        self.assertEqual(driver._processes[43].name, "bash")
+
+    def test_max_processes(self):
+        driver = self.create_driver(ProcessPuller, max_processes=2)
+        for pid in (42, 43, 44):
+            self._write_process(pid)
+
+        values = self.pull(driver)
+
+        self.assertEqual(len(values), 2)
+
+    def test_turned_away_process_monitored_once_room_freed(self):
+        driver = self.create_driver(ProcessPuller, max_processes=2,
+                                    name_pattern="^nova-")
+        for pid in (42, 43, 44):
+            self._write_process(pid)
+        self._write_process(45, name=b"bash")
+        self.pull(driver)
+        turned_away, = set([42, 43, 44]) - set(driver._processes)
+
+        # Not examined again as long as there is no room
+        with patch.object(driver, "_track", return_value=None) as m_track:
+            self.pull(driver, elapsed=1)
+        self.assertFalse(m_track.called)
+
+        monitored = sorted(driver._processes)
+        self._remove_process(monitored[0])
+        values = self.pull(driver, elapsed=1)
+
+        self.assertEqual(set(resource_id for _, resource_id in values),
+                         {"%s_%d" % (HOSTNAME, pid)
+                          for pid in (monitored[1], turned_away)})
+        # The PIDs filtered out are not examined again
+        with patch.object(driver, "_track", return_value=None) as m_track:
+            self._remove_process(monitored[1])
+            self.pull(driver, elapsed=1)
+        self.assertFalse(m_track.called)
+
+    @patch.object(processes, "get_fd_capacity", return_value=1)
+    def test_max_processes_capped_by_fd_limit(self, m_get_fd_capacity):
+        driver = self.create_driver(ProcessPuller, max_processes=2)
+
+        m_get_fd_capacity.assert_called_once_with(2)
+        self.assertEqual(driver.max_processes, 1)
+
+    def test_fd_exhausted(self):
+        driver = self.create_driver(ProcessPuller)
+        self._write_process(42)
+
+        with patch.object(driver, "_track", side_effect=OSError(
+                errno.EMFILE, "Too many open files")):
+            self.assertEqual(self.pull(driver), {})
+
+        # Not taken for a process which exited: examined again
+        self.assertEqual(set(resource_id for _, resource_id in
+                             self.pull(driver, elapsed=1)),
+                         {"%s_42" % HOSTNAME})
+
+    def test_unreadable_io(self):
+        driver = self.create_driver(ProcessPuller)
+        self._write_process(42, utime=100)
+        os.remove(os.path.join(self.procfs_path, "42", "io"))
+        self.pull(driver)
+
+        self._write_process(42, utime=200)
+        values = self.pull(driver, elapsed=1)
+
+        resource_id = "%s_42" % HOSTNAME
+        self.assertEqual(sorted(name for name, _ in values),
+                         ["compute.process.cpu.percent",
+                          "compute.process.memory.rss"])
+        self.assertEqual(
+            values[("compute.process.cpu.percent", resource_id)], 100.)
+
+    def test_parse_stat(self):
+        name, fields = parse_stat(STAT % (42, b"my (odd) name", 1, 2, 3))
+
+        self.assertEqual(name, b"my (odd) name")
+        self.assertEqual(fields[processes.UTIME], b"1")
+        self.assertEqual(fields[processes.RSS], b"3")
@@ -0,0 +1,93 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import os
+
+from watcher_metering.drivers.linux.procfs import CounterRates
+from watcher_metering.drivers.linux.procfs import get_field
+from watcher_metering.drivers.linux.procfs import ProcFile
+from watcher_metering.tests.drivers.linux.procfs_fixtures import (
+    ProcfsTestCase)
+
+
+class TestProcFile(ProcfsTestCase):
+
+    def test_read_again_from_the_start(self):
+        self.write_proc_file("loadavg", b"0.52 0.58 0.59 2/1289 12345\n")
+        proc_file = ProcFile(os.path.join(self.procfs_path, "loadavg"))
+        self.addCleanup(proc_file.close)
+
+        self.assertEqual(proc_file.read(), b"0.52 0.58 0.59 2/1289 12345\n")
+        fd = proc_file._fd
+        self.write_proc_file("loadavg", b"1.00 0.60 0.59 1/1290 12346\n")
+
+        self.assertEqual(proc_file.read(), b"1.00 0.60 0.59 1/1290 12346\n")
+        # Still the same file descriptor
+        self.assertEqual(proc_file._fd, fd)
+
+    def test_buffer_grows(self):
+        content = b"x" * 100
+        self.write_proc_file("big", content)
+        proc_file = ProcFile(os.path.join(self.procfs_path, "big"),
+                             buffer_size=16)
+        self.addCleanup(proc_file.close)
+
+        self.assertEqual(proc_file.read(), content)
+        self.assertEqual(proc_file.buffer_size, 128)
+
+    def test_close(self):
+        self.write_proc_file("stat", b"cpu  1 2 3 4\n")
+        proc_file = ProcFile(os.path.join(self.procfs_path, "stat"))
+        proc_file.read()
+        fd = proc_file._fd
+
+        proc_file.close()
+
+        self.assertIsNone(proc_file._fd)
+        self.assertRaises(OSError, os.fstat, fd)
+
+
+class TestProcfsHelpers(ProcfsTestCase):
+
+    def test_get_field(self):
+        data = b"MemTotal:  16318784 kB\nMemFree:  1024 kB\nctxt 42"
+
+        self.assertEqual(get_field(data, b"MemTotal:"), 16318784)
+        self.assertEqual(get_field(data, b"MemFree:"), 1024)
+        self.assertEqual(get_field(data, b"ctxt "), 42)
+        self.assertIsNone(get_field(data, b"MemAvailable:"))
+
+    def test_counter_rates(self):
+        rates = CounterRates()
+
+        # No rate out of a single value
+        self.assertIsNone(rates.update("eth0", 1000, 10.))
+        self.assertEqual(rates.update("eth0", 3000, 12.), 1000.)
+        self.assertEqual(rates.update("eth0", 3000, 13.), 0.)
+
+    def test_counter_rates_reset(self):
+        rates = CounterRates()
+        rates.update("eth0", 1000, 10.)
+
+        # The counter wrapped around: no rate until the next update
+        self.assertIsNone(rates.update("eth0", 10, 11.))
+        self.assertEqual(rates.update("eth0", 20, 12.), 10.)
+
+        rates.forget(["eth0"])
+        self.assertEqual(len(rates), 0)
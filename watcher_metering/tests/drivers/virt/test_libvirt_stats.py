@@ -0,0 +1,168 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from mock import MagicMock
+from mock import patch
+from oslotest.base import BaseTestCase
+from watcher_metering.drivers.virt import libvirt_stats
+from watcher_metering.drivers.virt.libvirt_stats import LibvirtStatsPuller
+from watcher_metering.drivers.virt.libvirt_stats import sum_devices
+
+UUID = "0c5ee7d8-5ae3-4f2c-9f2a-1c6d4e0c4a3b"
+
+
+class FakeLibvirtError(Exception):
+    pass
+
+
+def create_domain(uuid, name):
+    domain = MagicMock()
+    domain.UUIDString.return_value = uuid
+    domain.name.return_value = name
+    return domain
+
+
+def create_stats(cpu_time=0, read_bytes=0, rx_bytes=0):
+    return {
+        "cpu.time": cpu_time,
+        "vcpu.current": 2,
+        "balloon.current": 2097152,
+        "balloon.available": 2000000,
+        "balloon.unused": 1000000,
+        "balloon.rss": 1048576,
+        "block.count": 2,
+        "block.0.name": "vda",
+        "block.0.rd.bytes": read_bytes,
+        "block.0.wr.bytes": 0,
+        "block.0.rd.reqs": 0,
+        "block.0.wr.reqs": 0,
+        "block.1.name": "vdb",
+        "block.1.rd.bytes": read_bytes,
+        "block.1.wr.bytes": 0,
+        "block.1.rd.reqs": 0,
+        "block.1.wr.reqs": 0,
+        "net.count": 1,
+        "net.0.name": "tap0",
+        "net.0.rx.bytes": rx_bytes,
+        "net.0.tx.bytes": 0,
+        "net.0.rx.pkts": 0,
+        "net.0.tx.pkts": 0,
+    }
+
+
+class TestLibvirtStatsPuller(BaseTestCase):
+
+    def setUp(self):
+        super(TestLibvirtStatsPuller, self).setUp()
+        self.m_libvirt = MagicMock(libvirtError=FakeLibvirtError)
+        self.m_connection = self.m_libvirt.openReadOnly.return_value
+        self.now = 1000.
+        for target, kwargs in (("libvirt", dict(new=self.m_libvirt)),
+                               ("_now", dict(side_effect=self._now))):
+            patcher = patch.object(libvirt_stats, target, **kwargs)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        opts = {opt.dest: opt.default
+                for opt in LibvirtStatsPuller.get_config_opts()}
+        self.driver = LibvirtStatsPuller(**opts)
+
+    def _now(self):
+        return self.now
+
+    def _pull(self, elapsed=0, *all_stats):
+        self.now += elapsed
+        self.m_connection.getAllDomainStats.return_value = list(all_stats)
+        return {(measurement.name, measurement.resource_id): measurement.value
+                for measurement in self.driver.do_pull()}
+
+    def test_usage(self):
+        domain = create_domain(UUID, "instance-00000001")
+        values = self._pull(0, (domain, create_stats()))
+        self.assertEqual(values, {
+            ("compute.instance.memory.total", UUID): 2147483648,
+            ("compute.instance.memory.usage", UUID): 1024000000,
+            ("compute.instance.memory.resident", UUID): 1073741824,
+        })
+
+        values = self._pull(2, (domain, create_stats(
+            cpu_time=2 * 10 ** 9, read_bytes=1024, rx_bytes=512)))
+
+        self.assertEqual(values[("compute.instance.cpu.percent", UUID)],
+                         50.)
+        self.assertEqual(
+            values[("compute.instance.disk.read.bytes.rate", UUID)], 1024.)
+        self.assertEqual(
+            values[("compute.instance.network.incoming.bytes.rate", UUID)],
+            256.)
+        self.assertEqual(len(values), 12)
+
+    def test_single_call_per_pull(self):
+        domains = [(create_domain("uuid-%d" % index, "instance-%d" % index),
+                    create_stats()) for index in range(50)]
+
+        self._pull(0, *domains)
+
+        self.m_libvirt.openReadOnly.assert_called_once_with(
+            "qemu:///system")
+        self.assertEqual(self.m_connection.getAllDomainStats.call_count, 1)
+        # No call to libvirtd per domain
+        for domain, _ in domains:
+            self.assertEqual(sorted(name for name, _, _ in
+                                    domain.method_calls),
+                             ["UUIDString", "name"])
+
+    def test_metadata(self):
+        domain = create_domain(UUID, "instance-00000001")
+        self.m_connection.getAllDomainStats.return_value = [
+            (domain, {"balloon.current": 1})]
+        measurement, = self.driver.do_pull()
+
+        self.assertEqual(measurement.resource_metadata,
+                         {"domain": "instance-00000001"})
+
+    def test_gone_domain_forgotten(self):
+        domain = create_domain(UUID, "instance-00000001")
+        self._pull(0, (domain, create_stats()))
+
+        self.assertEqual(self._pull(1), {})
+
+        self.assertEqual(len(self.driver.rates), 0)
+        self.assertEqual(self.driver._domain_templates, {})
+
+    def test_reconnect_on_error(self):
+        self.m_connection.getAllDomainStats.side_effect = FakeLibvirtError(
+            "Connection reset by peer")
+        self.assertRaises(FakeLibvirtError, self.driver.do_pull)
+        self.m_connection.close.assert_called_once_with()
+
+        self.m_connection.getAllDomainStats.side_effect = None
+        self._pull(1)
+
+        self.assertEqual(self.m_libvirt.openReadOnly.call_count, 2)
+
+    def test_libvirt_not_installed(self):
+        with patch.object(libvirt_stats, "libvirt", None):
+            self.assertRaises(ImportError, self.driver.do_pull)
+
+    def test_sum_devices(self):
+        stats = create_stats(read_bytes=10)
+
+        self.assertEqual(sum_devices(stats, "block", "rd.bytes"), 20)
+        self.assertEqual(sum_devices({}, "net", "rx.bytes"), 0)
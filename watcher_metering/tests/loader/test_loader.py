@@ -16,11 +16,17 @@
 
 from __future__ import unicode_literals
 
+import os
+import sys
+
+import fixtures
 from mock import patch
 from oslo_config import cfg
 from oslotest.base import BaseTestCase
 from stevedore.driver import DriverManager
 from stevedore.extension import Extension
+from watcher_metering.agent.loader import MetricsDriverLoader
+from watcher_metering.agent.puller import MetricPuller
 from watcher_metering.load.loader import DriverLoader
 from watcher_metering.tests.loader._fixtures import ConfFixture
 from watcher_metering.tests.loader._fixtures import FakeDriverNoGroup
@@ -28,6 +34,10 @@ from watcher_metering.tests.loader._fixtures import FakeDriverNoOpt
 from watcher_metering.tests.loader._fixtures import FakeDriverWithExternalOpts
 from watcher_metering.tests.loader._fixtures import FakeDriverWithOpts
 
+EXAMPLES_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+    "drivers", "examples")
+
 
 class TestDriverLoader(BaseTestCase):
 
@@ -181,3 +191,35 @@ class TestDriverLoader(BaseTestCase):
             loaded_driver.fake__test_external_opt,
             "fake_with_ext_opts"
         )
+
+    @patch("watcher_metering.load.loader.DriverManager")
+    def test_load_example_driver(self, m_driver_manager):
+        self.useFixture(fixtures.MonkeyPatch(
+            "sys.path",
+            [os.path.join(EXAMPLES_PATH, "random-puller")] + sys.path))
+        from random_puller.puller import RandomDataPuller
+
+        m_driver_manager.return_value = DriverManager.make_test_instance(
+            extension=Extension(
+                name=RandomDataPuller.get_name(),
+                entry_point="%s:%s" % (RandomDataPuller.__module__,
+                                       RandomDataPuller.__name__),
+                plugin=RandomDataPuller,
+                obj=None,
+            ),
+            namespace=RandomDataPuller.namespace(),
+        )
+
+        loader_manager = MetricsDriverLoader(conf=cfg.CONF,
+                                             driver_name='random')
+        loaded_driver = loader_manager.load()
+
+        # The base options are all handled by MetricPuller
+        self.assertIsInstance(loaded_driver, MetricPuller)
+        self.assertEqual(loaded_driver.static_data, "static_data")
+        self.assertEqual(loaded_driver.probe_id, "data.puller.random")
+        self.assertEqual(loaded_driver.pull_timeout, 5)
+        self.assertIsNone(loaded_driver.aggregator)
+        # Out of which a driver process creates its own driver
+        self.assertEqual(loaded_driver.options["static_data"], "static_data")
+        self.assertEqual(loaded_driver.options["execution_mode"], "thread")
@@ -0,0 +1,144 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+
+import msgpack
+from oslotest.base import BaseTestCase
+from watcher_metering.protocol.frame import FrameError
+from watcher_metering.protocol.frame import FrameUnpacker
+from watcher_metering.protocol.frame import pack_frame
+from watcher_metering.protocol.frame import pack_measurement
+from watcher_metering.protocol.frame import pack_record
+from watcher_metering.protocol.frame import pack_static
+from watcher_metering.protocol.frame import unpack_frame
+
+
+class TestFrame(BaseTestCase):
+
+    def setUp(self):
+        super(TestFrame, self).setUp()
+        self.fake_metric = OrderedDict([
+            ("name", "compute.node.cpu.percent"),
+            ("timestamp", "2015-08-04T15:15:45.703542"),
+            ("unit", "%"),
+            ("type", "gauge"),
+            ("value", 97.9),
+            ("resource_id", "test_node"),
+            ("host", "test_node"),
+            ("resource_metadata", OrderedDict([
+                ("host", "test_node"),
+                ("title", "compute.node.cpu.percent")]))
+        ])
+
+    def _pack_record(self, metric):
+        packed_static = pack_static(
+            metric["name"], metric["unit"], metric["type"],
+            metric["resource_id"], metric["host"],
+            metric["resource_metadata"])
+        return pack_record(packed_static, metric["timestamp"],
+                           metric["value"])
+
+    def test_pack_record(self):
+        self.assertEqual(
+            msgpack.unpackb(self._pack_record(self.fake_metric), raw=False),
+            [["compute.node.cpu.percent", "%", "gauge", "test_node",
+              "test_node", {"host": "test_node",
+                            "title": "compute.node.cpu.percent"}],
+             "2015-08-04T15:15:45.703542", 97.9],
+        )
+
+    def test_unpack_records_frame(self):
+        frame = pack_frame([self._pack_record(self.fake_metric)] * 2)
+
+        self.assertEqual(unpack_frame(frame), [self.fake_metric] * 2)
+
+    def test_records_frame_epoch_ns_timestamp(self):
+        self.fake_metric["timestamp"] = 1438701345703542123
+        packed_record = self._pack_record(self.fake_metric)
+
+        self.assertIsInstance(msgpack.unpackb(packed_record)[1],
+                              msgpack.Timestamp)
+        self.assertEqual(unpack_frame(pack_frame([packed_record])),
+                         [self.fake_metric])
+
+    def test_unpack_invalid_record(self):
+        frame = pack_frame([msgpack.packb([["name"], 1, 2])])
+
+        self.assertRaises(FrameError, unpack_frame, frame)
+
+    def test_pack_frame(self):
+        frame = pack_frame([pack_measurement(self.fake_metric)] * 3,
+                           version=1)
+
+        self.assertEqual(
+            msgpack.unpackb(frame, raw=False),
+            [1, [self.fake_metric] * 3],
+        )
+
+    def test_unpack_batch_frame(self):
+        frame = pack_frame([pack_measurement(self.fake_metric)] * 2,
+                           version=1)
+
+        self.assertEqual(unpack_frame(frame), [self.fake_metric] * 2)
+
+    def test_unpack_empty_batch_frame(self):
+        self.assertEqual(unpack_frame(pack_frame([])), [])
+
+    def test_unpack_legacy_message(self):
+        legacy_msg = msgpack.packb(self.fake_metric)
+
+        self.assertEqual(unpack_frame(legacy_msg), [self.fake_metric])
+
+    def test_unpack_unsupported_version(self):
+        self.assertRaises(FrameError, unpack_frame,
+                          msgpack.packb([1337, [self.fake_metric]]))
+
+    def test_unpack_invalid_frame(self):
+        self.assertRaises(FrameError, unpack_frame, msgpack.packb(42))
+        self.assertRaises(FrameError, unpack_frame, msgpack.packb([]))
+        self.assertRaises(ValueError, unpack_frame, b"\xc1")
+
+    def test_frame_unpacker(self):
+        unpacker = FrameUnpacker()
+        buf = bytearray(1024)
+        view = memoryview(buf)
+
+        for values in ([1, 2], [3]):
+            frame = pack_frame(
+                [self._pack_record(dict(self.fake_metric, value=value))
+                 for value in values])
+            # Messages are received into the very same buffer
+            buf[:len(frame)] = frame
+
+            measurements = unpacker.unpack(view[:len(frame)])
+
+            self.assertEqual([msg["value"] for msg in measurements], values)
+            self.assertEqual(measurements[0]["resource_metadata"],
+                             self.fake_metric["resource_metadata"])
+
+    def test_frame_unpacker_invalid_messages(self):
+        unpacker = FrameUnpacker()
+        frame = pack_frame([self._pack_record(self.fake_metric)])
+
+        self.assertRaises(FrameError, unpacker.unpack, frame[:-1])
+        self.assertRaises(FrameError, unpacker.unpack, frame + b"\x01")
+        self.assertRaises(FrameError, unpacker.unpack, b"\xc1")
+        # The unpacker recovers from the previous errors
+        self.assertEqual(unpacker.unpack(frame), [self.fake_metric])
@@ -0,0 +1,95 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from oslotest.base import BaseTestCase
+from watcher_metering.protocol import gorilla
+
+START = 1438701345703542000
+SECOND = 10 ** 9
+
+
+class TestGorilla(BaseTestCase):
+
+    def _check_round_trip(self, timestamps, values):
+        chunk = gorilla.encode(timestamps, values)
+        self.assertEqual(gorilla.decode(chunk), (timestamps, values))
+        return chunk
+
+    def test_bit_writer_reader(self):
+        writer = gorilla.BitWriter()
+        writer.write(0b1, 1)
+        writer.write(0b0110, 4)
+        writer.write(0x1FF, 9)
+
+        data = writer.getvalue()
+        self.assertEqual(data, b"\xb7\xfc")
+
+        reader = gorilla.BitReader(data)
+        self.assertEqual(reader.read(1), 0b1)
+        self.assertEqual(reader.read(4), 0b0110)
+        self.assertEqual(reader.read(9), 0x1FF)
+        self.assertRaises(gorilla.GorillaError, reader.read, 8)
+
+    def test_regular_series(self):
+        timestamps = [START + i * SECOND for i in range(100)]
+        chunk = self._check_round_trip(timestamps, [42.5] * 100)
+
+        # Header, 1st timestamp and delta, then 1 bit per timestamp
+        timestamps_bits = 40 + 64 + 40 + 98
+        # 1st value, then 1 bit per value
+        values_bits = 64 + 99
+        self.assertEqual(len(chunk), (timestamps_bits + values_bits + 7) // 8)
+
+    def test_jittered_series(self):
+        timestamps = [START + i * SECOND + (-1) ** i * 1234 * i
+                      for i in range(100)]
+        values = [50 + (i % 7) * .25 for i in range(100)]
+
+        self._check_round_trip(timestamps, values)
+
+    def test_special_floats(self):
+        values = [0., -0., float("inf"), float("-inf"), 1e-300, 1e300, .1]
+        timestamps = [START + i for i in range(len(values))]
+
+        self._check_round_trip(timestamps, values)
+
+    def test_int_series(self):
+        values = [0, 1, 1000, 1000, -2 ** 63, 2 ** 63 - 1, 0]
+        timestamps = [START, 0, 2 ** 63 - 1, START, START, 1, 2]
+
+        self._check_round_trip(timestamps, values)
+
+    def test_single_sample(self):
+        self._check_round_trip([START], [1.5])
+
+    def test_can_encode(self):
+        self.assertTrue(gorilla.can_encode([START, START], [1., 2.]))
+        self.assertTrue(gorilla.can_encode([START, START], [1, 2]))
+        self.assertFalse(gorilla.can_encode([START, START], [1., 2]))
+        self.assertFalse(gorilla.can_encode([START], [True]))
+        self.assertFalse(gorilla.can_encode([START], ["1"]))
+        self.assertFalse(gorilla.can_encode([START], [2 ** 64]))
+        self.assertFalse(gorilla.can_encode(["2015-08-04T15:15:45"], [1.]))
+
+    def test_decode_invalid_chunk(self):
+        chunk = gorilla.encode([START, START + SECOND], [1., 2.])
+
+        self.assertRaises(gorilla.GorillaError, gorilla.decode, chunk[:-2])
+        self.assertRaises(gorilla.GorillaError, gorilla.decode,
+                          b"\x07" + chunk[1:])
@@ -0,0 +1,166 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from mock import patch
+import msgpack
+from oslotest.base import BaseTestCase
+from watcher_metering.protocol.frame import FrameError
+from watcher_metering.protocol.frame import pack_compressed_frame
+from watcher_metering.protocol.frame import pack_series_frame
+from watcher_metering.protocol.frame import pack_static
+from watcher_metering.protocol.frame import unpack_frame
+from watcher_metering.protocol import series
+from watcher_metering.protocol.series import SeriesRegistry
+from watcher_metering.protocol.series import SeriesSessions
+
+
+class TestSeries(BaseTestCase):
+
+    def setUp(self):
+        super(TestSeries, self).setUp()
+        self.static_a = pack_static("cpu.percent", "%", "gauge", "node",
+                                    "node", {"title": "cpu.percent"})
+        self.static_b = pack_static("mem.percent", "%", "gauge", "node",
+                                    "node", {})
+        self.registry = SeriesRegistry(registration_interval=60)
+        self.sessions = SeriesSessions(session_ttl=600)
+
+    def _frame(self, *samples):
+        packed_samples = [
+            (static, 1438701345703542000, value) for static, value in samples
+        ]
+        registrations, samples = self.registry.encode(packed_samples)
+        return pack_series_frame(self.registry.session_id,
+                                 registrations, samples)
+
+    def test_register_once(self):
+        registrations, samples = self.registry.encode([
+            (self.static_a, 1, 1), (self.static_b, 2, 2),
+            (self.static_a, 3, 3),
+        ])
+
+        self.assertEqual(registrations,
+                         [(0, self.static_a), (1, self.static_b)])
+        self.assertEqual(samples, [(0, 1, 1), (1, 2, 2), (0, 3, 3)])
+
+        registrations, samples = self.registry.encode([(self.static_a, 4, 4)])
+        self.assertEqual(registrations, [])
+        self.assertEqual(samples, [(0, 4, 4)])
+
+    @patch.object(series, "_now")
+    def test_register_again_after_interval(self, m_now):
+        m_now.return_value = 0
+        registry = SeriesRegistry(registration_interval=60)
+        registry.encode([(self.static_a, 1, 1)])
+
+        m_now.return_value = 59
+        self.assertEqual(registry.encode([(self.static_a, 2, 2)])[0], [])
+        m_now.return_value = 60
+        self.assertEqual(registry.encode([(self.static_a, 3, 3)])[0],
+                         [(0, self.static_a)])
+
+    def test_new_session_when_full(self):
+        registry = SeriesRegistry(max_series=1)
+        registry.encode([(self.static_a, 1, 1)])
+        session_id = registry.session_id
+
+        registrations, samples = registry.encode([
+            (self.static_b, 2, 2), (self.static_a, 3, 3),
+        ])
+
+        self.assertNotEqual(registry.session_id, session_id)
+        self.assertEqual(registrations,
+                         [(0, self.static_b), (1, self.static_a)])
+        self.assertEqual(samples, [(0, 2, 2), (1, 3, 3)])
+
+    def test_expand_samples(self):
+        measurements = unpack_frame(
+            self._frame((self.static_a, 97.9), (self.static_b, 42)),
+            self.sessions)
+        measurements += unpack_frame(
+            self._frame((self.static_a, 98.1)), self.sessions)
+
+        self.assertEqual(measurements, [
+            {"name": "cpu.percent", "timestamp": 1438701345703542000,
+             "unit": "%", "type": "gauge", "value": 97.9,
+             "resource_id": "node", "host": "node",
+             "resource_metadata": {"title": "cpu.percent"}},
+            {"name": "mem.percent", "timestamp": 1438701345703542000,
+             "unit": "%", "type": "gauge", "value": 42,
+             "resource_id": "node", "host": "node",
+             "resource_metadata": {}},
+            {"name": "cpu.percent", "timestamp": 1438701345703542000,
+             "unit": "%", "type": "gauge", "value": 98.1,
+             "resource_id": "node", "host": "node",
+             "resource_metadata": {"title": "cpu.percent"}},
+        ])
+
+    def test_expand_unknown_series(self):
+        self._frame((self.static_a, 97.9))  # Lost on its way
+        measurements = unpack_frame(
+            self._frame((self.static_a, 98.1)), self.sessions)
+
+        self.assertEqual(measurements, [])
+        self.assertEqual(self.sessions.unknown_samples, 1)
+
+        # Until the agent registers its series again
+        self.registry.forget()
+        measurements = unpack_frame(
+            self._frame((self.static_a, 98.1)), self.sessions)
+        self.assertEqual([msg["value"] for msg in measurements], [98.1])
+
+    @patch.object(series, "_now")
+    def test_sessions_expire(self, m_now):
+        m_now.return_value = 0
+        sessions = SeriesSessions(session_ttl=600)
+        sessions.expand(1, [[0, list("abcdef")]], [])
+        m_now.return_value = 300
+        sessions.expand(2, [[0, list("abcdef")]], [])
+
+        m_now.return_value = 600
+        sessions.expand(2, [], [])
+
+        self.assertEqual(len(sessions), 1)
+
+    def test_expand_compressed_samples(self):
+        registrations, samples = self.registry.encode([
+            (self.static_a, 1438701345703542000, 97.9),
+            (self.static_b, 1438701345703542000, "N/A"),
+            (self.static_a, 1438701346703542000, 98.1),
+        ])
+        frame = pack_compressed_frame(self.registry.session_id,
+                                      registrations, samples)
+
+        measurements = unpack_frame(frame, self.sessions)
+
+        self.assertEqual(
+            [(msg["name"], msg["timestamp"], msg["value"])
+             for msg in measurements],
+            [("mem.percent", 1438701345703542000, "N/A"),
+             ("cpu.percent", 1438701345703542000, 97.9),
+             ("cpu.percent", 1438701346703542000, 98.1)])
+
+    def test_series_frame_without_sessions(self):
+        self.assertRaises(FrameError, unpack_frame,
+                          self._frame((self.static_a, 97.9)))
+
+    def test_invalid_registration(self):
+        frame = pack_series_frame(42, [(0, msgpack.packb(["name"]))], [])
+
+        self.assertRaises(FrameError, unpack_frame, frame, self.sessions)
@@ -20,6 +20,7 @@ from __future__ import unicode_literals
 from collections import OrderedDict
 import os
 
+from mock import call
 from mock import MagicMock
 from mock import patch
 from mock import PropertyMock
@@ -29,6 +30,7 @@ from oslo_config import cfg
 from oslotest.base import BaseTestCase
 from six.moves.queue import Queue
 from watcher_metering.publisher.publisher import Publisher
+from watcher_metering.publisher.supervisor import PoolSupervisor
 from watcher_metering.publisher.worker import Worker
 from watcher_metering.store.loader import StoreClientLoader
 from watcher_metering.tests.publisher.publisher_fixtures import ConfFixture
@@ -82,6 +84,22 @@ class TestPublisher(BaseTestCase):
         for _patch in self.patches:
             _patch.stop()
 
+    def _patch_recv(self, *messages):
+        """Emulates the reception of the given messages"""
+        messages = iter(messages)
+
+        def _fake_nn_recv(fd, buf, flags):
+            data = next(messages)
+            size = min(len(data), len(buf))
+            buf[:size] = data[:size]
+            return len(data), buf
+
+        _patch = patch("watcher_metering.publisher.base.nanomsg.wrapper."
+                       "nn_recv", side_effect=_fake_nn_recv)
+        _patch.start()
+        self.addCleanup(_patch.stop)
+
+    @patch.object(PoolSupervisor, "start", MagicMock())
     @patch.object(Worker, "start", MagicMock())
     @patch.object(Queue, "put")
     @patch.object(Publisher, "terminated", new_callable=PropertyMock)
@@ -89,8 +107,6 @@ class TestPublisher(BaseTestCase):
         # mock the termination condition to finish after 1 iteration
         # Last value to mock out the stop() call
         m_terminated.side_effect = [False, True, True]
-        # mock the recv
-        m_recv = self.m_publisher_socket.recv
         fake_metric = OrderedDict(
             name="compute.node.cpu.percent",
             timestamp="2015-08-04T15:15:45.703542",
@@ -104,12 +120,12 @@ class TestPublisher(BaseTestCase):
                 title="compute.node.cpu.percent",
             )
         )
-        m_recv.return_value = msgpack.dumps(fake_metric)
+        self._patch_recv(msgpack.dumps(fake_metric))
         # start publisher
         self.publisher.run()
 
         self.assertEqual(self.m_publisher_socket.bind.call_count, 1)
-        m_put.assert_called_once_with({
+        m_put.assert_called_once_with([{
             'value': 97.9,
             'name': 'compute.node.cpu.percent',
             'host': 'test_node',
@@ -121,68 +137,69 @@ class TestPublisher(BaseTestCase):
             },
             'unit': '%',
             'type': 'gauge'
-        })
-
-    @patch.object(Publisher, "start_worker")
-    def test_adjust_pool_size_expand_pool(self, m_start_worker):
-        self.publisher.max_queue_size = 5
-        self.publisher.max_worker = 5
-        self.publisher.min_worker = 1
+        }])
 
-        def _fake_start_worker():
-            fake_worker = MagicMock(spec=Worker)
-            self.publisher.workers.append(fake_worker)
-
-        m_start_worker.side_effect = _fake_start_worker
+    @patch.object(PoolSupervisor, "start", MagicMock())
+    @patch.object(Worker, "start", MagicMock())
+    @patch.object(Queue, "put")
+    @patch.object(Publisher, "terminated", new_callable=PropertyMock)
+    def test_on_receive_batch_frame(self, m_terminated, m_put):
+        # mock the termination condition to finish after 1 iteration
+        # Last value to mock out the stop() call
+        m_terminated.side_effect = [False, True, True]
+        fake_metrics = [
+            {"name": "compute.node.cpu.percent", "value": 97.9},
+            {"name": "compute.node.cpu.percent", "value": 13.37},
+        ]
+        self._patch_recv(msgpack.dumps([1, fake_metrics]))
+        self.publisher.run()
 
-        self.publisher.start_worker()  # Add a fake worker
-        self.publisher.msg_queue.put("Dummy1")  # Add a fake job in the queue
-        self.publisher.msg_queue.put("Dummy2")
-        self.publisher.msg_queue.put("Dummy3")
-        self.publisher.adjust_pool_size()
+        # The whole frame is queued as one unit
+        m_put.assert_called_once_with(fake_metrics)
 
-        self.assertEqual(self.publisher.num_workers, 4)
+    @patch.object(PoolSupervisor, "start", MagicMock())
+    @patch.object(Worker, "start", MagicMock())
+    @patch.object(Queue, "put")
+    @patch.object(Publisher, "terminated", new_callable=PropertyMock)
+    def test_on_receive_reuses_buffer(self, m_terminated, m_put):
+        m_terminated.side_effect = [False, False, False, False, True, True]
+        self.publisher.receive_buffer_size = 1024
+        self._patch_recv(
+            msgpack.dumps([1, [{"value": 1}, {"value": 2}]]),
+            msgpack.dumps([1, [{"value": 3}]]) + b"\xc1",  # Invalid
+            msgpack.dumps([1, [{"value": 4} for _ in range(1024)]]),  # Big
+            msgpack.dumps([1, [{"value": 5}]]),
+        )
+        self.publisher.run()
 
-    @patch.object(Publisher, "start_worker")
-    def test_adjust_pool_size_shrink_pool(self, m_start_worker):
-        self.publisher.max_queue_size = 5
-        self.publisher.max_worker = 5
-        self.publisher.min_worker = 1
+        self.assertEqual(m_put.call_args_list, [
+            call([{"value": 1}, {"value": 2}]),
+            call([{"value": 5}]),
+        ])
+        self.assertEqual(self.publisher.truncated_messages, 1)
 
-        def _fake_start_worker():
-            fake_worker = MagicMock(spec=Worker)
-            self.publisher.workers.append(fake_worker)
+    @patch.object(Publisher, "check_workers_alive")
+    @patch.object(Queue, "put")
+    def test_on_receive_only_queues(self, m_put, m_check_workers_alive):
+        self.publisher.on_receive([{"value": 1}])
 
-        m_start_worker.side_effect = _fake_start_worker
+        (frame,), _ = m_put.call_args
+        self.assertEqual(frame, [{"value": 1}])
+        self.assertIsNotNone(frame.enqueued_at)
+        self.assertFalse(m_check_workers_alive.called)
+        self.assertEqual(self.publisher.num_workers, 0)
 
-        self.publisher.start_worker()  # Add a fake worker
-        self.publisher.start_worker()
-        self.publisher.start_worker()
-        self.publisher.start_worker()
-        self.publisher.start_worker()
+    @patch.object(PoolSupervisor, "start")
+    @patch.object(Worker, "start", MagicMock())
+    @patch.object(Publisher, "terminated", new_callable=PropertyMock)
+    def test_run_starts_pool(self, m_terminated, m_supervisor_start):
+        m_terminated.side_effect = [True, True]
+        self.publisher.min_worker = 2
 
-        self.publisher.msg_queue.put("Dummy1")  # Add a fake job in the queue
-        self.publisher.adjust_pool_size()
+        self.publisher.run()
 
         self.assertEqual(self.publisher.num_workers, 2)
-
-    @patch.object(Publisher, "start_worker")
-    def test_adjust_pool_size_keep_same_size(self, m_start_worker):
-        self.publisher.max_queue_size = 5
-        self.publisher.max_worker = 5
-        self.publisher.min_worker = 1
-
-        def _fake_start_worker():
-            fake_worker = MagicMock(spec=Worker)
-            self.publisher.workers.append(fake_worker)
-
-        m_start_worker.side_effect = _fake_start_worker
-
-        self.publisher.start_worker()  # Add a fake worker
-        self.publisher.msg_queue.put("Dummy1")  # Add a fake job in the queue
-        self.publisher.adjust_pool_size()
-
-        self.assertEqual(self.publisher.num_workers, 1)
+        m_supervisor_start.assert_called_once_with()
 
     @patch.object(Publisher, "start_worker")
     def test_check_workers_alive(self, m_start_worker):
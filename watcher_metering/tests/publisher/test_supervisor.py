@@ -0,0 +1,152 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals
+
+from mock import MagicMock
+from mock import patch
+from oslotest.base import BaseTestCase
+from six.moves.queue import Queue
+from watcher_metering.publisher import supervisor
+from watcher_metering.publisher.supervisor import PoolStats
+from watcher_metering.publisher.supervisor import PoolSupervisor
+from watcher_metering.publisher.supervisor import QueuedFrame
+
+
+class FakePublisher(object):
+    """Worker pool whose workers are plain placeholders"""
+
+    def __init__(self, min_worker=1, max_worker=10):
+        self.min_worker = min_worker
+        self.max_worker = max_worker
+        self.msg_queue = Queue()
+        self.pool_stats = PoolStats()
+        self.workers = [object()] * min_worker
+
+    @property
+    def num_workers(self):
+        return len(self.workers)
+
+    def check_workers_alive(self):
+        pass
+
+    def start_worker(self):
+        self.workers.append(object())
+
+    def stop_worker(self):
+        self.workers.pop()
+
+
+class TestPoolSupervisor(BaseTestCase):
+
+    def setUp(self):
+        super(TestPoolSupervisor, self).setUp()
+        self.publisher = FakePublisher()
+        self.supervisor = PoolSupervisor(self.publisher, check_interval=1.,
+                                         target_wait=.05,
+                                         scale_down_delay=10.)
+        self.now = 1000.
+        self.supervisor.check(self.now)
+
+    def _check(self, frames=0, wait_time=0., service_time=0., queued=0):
+        """Emulates what happened over the last second"""
+        for _ in range(frames):
+            self.publisher.pool_stats.record(wait_time, service_time)
+        for _ in range(queued):
+            self.publisher.msg_queue.put([])
+        self.now += 1
+        self.supervisor.check(self.now)
+        return self.publisher.num_workers
+
+    def test_grows_on_little_law(self):
+        # 40 frames/s taking 100ms each need 4 busy workers
+        for _ in range(10):
+            size = self._check(frames=40, service_time=.1)
+
+        self.assertEqual(size, 5)  # With some headroom
+
+    def test_grows_ahead_of_burst(self):
+        for _ in range(10):
+            self._check(frames=10, service_time=.1)
+        self.assertEqual(self.publisher.num_workers, 2)
+
+        # The frames do not wait yet, but arrive faster than on average
+        size = self._check(frames=10, service_time=.1, queued=40)
+
+        self.assertEqual(size, 7)
+
+    def test_grows_when_frames_wait(self):
+        size = self._check(frames=1, wait_time=1., service_time=.001)
+
+        self.assertEqual(size, 2)
+
+    def test_max_worker(self):
+        size = self._check(frames=1000, service_time=1.)
+
+        self.assertEqual(size, 10)
+
+    def test_shrinks_with_hysteresis(self):
+        for _ in range(10):
+            self._check(frames=40, service_time=.1)
+        self.assertEqual(self.publisher.num_workers, 5)
+
+        sizes = [self._check() for _ in range(30)]
+
+        # Nothing before the delay, then one worker per delay
+        self.assertEqual(sizes, [5] * 10 + [4] * 10 + [3] * 10)
+
+    def test_no_thrashing(self):
+        sizes = []
+        for index in range(60):
+            # Alternates busy and idle seconds
+            sizes.append(self._check(frames=40 if index % 2 else 0,
+                                     service_time=.1))
+
+        self.assertEqual(set(sizes[10:]), {5})
+
+    def test_dead_workers_replaced(self):
+        with patch.object(self.publisher, "check_workers_alive") as m_check:
+            self._check()
+
+        m_check.assert_called_once_with()
+
+    def test_run_stops(self):
+        self.supervisor.check_interval = .01
+        self.supervisor.check = MagicMock()
+
+        self.supervisor.start()
+        self.supervisor.stop()
+        self.supervisor.join(1)
+
+        self.assertFalse(self.supervisor.is_alive())
+
+
+class TestPoolStats(BaseTestCase):
+
+    def test_collect(self):
+        stats = PoolStats()
+        stats.record(.5, .1)
+        stats.record(.5, .3)
+
+        self.assertEqual(stats.collect(), (2, 1., .4))
+        self.assertEqual(stats.collect(), (0, 0., 0.))
+
+    @patch.object(supervisor, "_now", return_value=42.)
+    def test_queued_frame(self, m_now):
+        frame = QueuedFrame([{"value": 1}])
+
+        self.assertEqual(frame, [{"value": 1}])
+        self.assertEqual(frame.enqueued_at, 42.)
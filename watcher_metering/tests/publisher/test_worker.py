@@ -23,7 +23,10 @@ from mock import patch
 from mock import PropertyMock
 from oslo_config import cfg
 from oslotest.base import BaseTestCase
+from six.moves.queue import Empty
 from six.moves.queue import Queue
+from watcher_metering.publisher.supervisor import PoolStats
+from watcher_metering.publisher.supervisor import QueuedFrame
 from watcher_metering.publisher.worker import Worker
 from watcher_metering.store.base import MetricsStoreClientBase
 from watcher_metering.store.loader import StoreClientLoader
@@ -85,4 +88,74 @@ class TestWorker(BaseTestCase):
         worker.run()
 
         # Should check that the data send over via the Riemann client are OK
-        self.m_client.send.assert_called_once_with(fake_metric)
+        self.m_client.send_batch.assert_called_once_with([fake_metric])
+
+    @patch.object(Worker, "terminated", new_callable=PropertyMock)
+    def test_send_metric_batch(self, m_terminated):
+        # mock the termination condition to finish after 1 iteration
+        m_terminated.side_effect = [False, True]
+
+        fake_metrics = [
+            OrderedDict([("name", "compute.node.cpu.percent"),
+                         ("value", 97.9)]),
+            OrderedDict([("name", "compute.node.cpu.percent"),
+                         ("value", 13.37)]),
+        ]
+
+        queue = Queue()
+        queue.put(fake_metrics[:1])
+        queue.put(fake_metrics[1:])
+        worker = Worker(queue, client_name="riemann")
+        worker.run()
+
+        # The frames queued are sent in one go
+        self.m_client.send_batch.assert_called_once_with(fake_metrics)
+
+    def test_get_batch(self):
+        queue = Queue()
+        for index in range(4):
+            queue.put([{"value": index}, {"value": index}])
+        worker = Worker(queue, client_name="riemann")
+        worker.batch_size = 3
+        worker.batch_linger = 0
+
+        # The frames are not split
+        self.assertEqual(worker.get_batch(), [
+            [{"value": 0}, {"value": 0}], [{"value": 1}, {"value": 1}]])
+        self.assertEqual(queue.qsize(), 2)
+
+    @patch.object(Queue, "get")
+    def test_get_batch_linger(self, m_get):
+        m_get.side_effect = [[{"value": 1}], Empty()]
+        worker = Worker(Queue(), client_name="riemann")
+        worker.batch_linger = .05
+
+        self.assertEqual(worker.get_batch(), [[{"value": 1}]])
+
+        self.assertEqual(m_get.call_count, 2)
+        _, kwargs = m_get.call_args
+        self.assertGreater(kwargs["timeout"], 0)
+        self.assertLessEqual(kwargs["timeout"], .05)
+
+    def test_batch_opts(self):
+        self.assertEqual(Worker(Queue(), client_name="riemann").batch_size,
+                         100)
+
+    @patch("watcher_metering.publisher.supervisor._now")
+    @patch("watcher_metering.publisher.worker._now")
+    @patch.object(Worker, "terminated", new_callable=PropertyMock)
+    def test_send_records_stats(self, m_terminated, m_now, m_frame_now):
+        m_terminated.side_effect = [False, True]
+        m_frame_now.return_value = 10.
+        # Waits for another frame, then sends the batch
+        m_now.side_effect = [11., 11., 12., 12.5]
+        stats = PoolStats()
+
+        queue = Queue()
+        queue.put(QueuedFrame([{"value": 1}]))
+        worker = Worker(queue, client_name="riemann", stats=stats)
+        worker.batch_linger = 0
+        worker.run()
+
+        # Waited for 2s in the queue then took 0.5s to be sent
+        self.assertEqual(stats.collect(), (1, 2., .5))
@@ -145,3 +145,15 @@ class TestCeilometerClient(BaseTestCase):
         # No assertion (done on purpose)
         # This means that something went wrong but the program didn't crash,
         # though it could not send the metrics to Ceilometer
+
+    @patch.object(CeilometerClient, "send")
+    def test_ceilometer_send_batch(self, m_send):
+        m_send.side_effect = [Exception("Fake fail!"), None]
+        fake_metrics = [{"name": "compute.node.cpu.percent", "value": 97.9},
+                        {"name": "compute.node.cpu.percent", "value": 13.37}]
+
+        self.client.send_batch(fake_metrics)
+
+        # The 1st failure must not prevent the 2nd metric from being sent
+        self.assertEqual(m_send.call_count, 2)
+        m_send.assert_called_with(fake_metrics[1])
@@ -18,11 +18,14 @@ from __future__ import absolute_import
 from __future__ import unicode_literals
 
 from collections import OrderedDict
-from influxdb import InfluxDBClient
+import socket
+import zlib
 
+from mock import MagicMock
 from mock import patch
 from oslo_config import cfg
 from oslotest.base import BaseTestCase
+import requests
 from watcher_metering.store.base import MetricsStoreError
 from watcher_metering.store.influxdb import InfluxClient
 from watcher_metering.tests.publisher.publisher_fixtures import ConfFixture
@@ -80,9 +83,9 @@ class TestInfluxDBClient(BaseTestCase):
         assert self.client.store_endpoint
         m_query.assert_called_with('CREATE DATABASE %s' % default_database)
 
-    @patch.object(InfluxDBClient, "write_points", autopec=True)
-    def test_influxdb_send_metric(self, m_write_points):
-        m_write_points.return_value = True
+    @patch.object(requests.Session, "post")
+    def test_influxdb_send_metric(self, m_post):
+        m_post.return_value = MagicMock(status_code=204)
 
         fake_metric = OrderedDict([
             ("name", "compute.node.cpu.percent"),
@@ -98,11 +101,262 @@ class TestInfluxDBClient(BaseTestCase):
         ])
 
         self.client.send(fake_metric)
-        self.assertEqual(m_write_points.call_count, 1)
+        self.assertEqual(m_post.call_count, 1)
+        args, kwargs = m_post.call_args
+        self.assertEqual(args, ("http://192.168.1.40:8087/write",))
+        self.assertEqual(kwargs["params"], {"db": "my_db", "precision": "n"})
+        self.assertEqual(kwargs["headers"]["Content-Encoding"], "gzip")
+        self.assertEqual(
+            zlib.decompress(kwargs["data"], 31),
+            b"compute.node.cpu.percent,counter_name=compute.node.cpu.percent,"
+            b"counter_type=gauge,counter_unit=%,host=test_node "
+            b"value=97.9 1438701345703542000\n")
 
-    @patch.object(InfluxDBClient, "write_points", autopec=True)
-    def test_influxdb_send_invalid_metric(self, m_write_points):
-        m_write_points.return_value = True
+    @patch.object(requests.Session, "post")
+    def test_influxdb_send_batch(self, m_post):
+        m_post.return_value = MagicMock(status_code=204)
+        fake_metrics = [OrderedDict([
+            ("name", "compute.node.cpu.percent"),
+            ("timestamp", "2015-08-04T15:15:45.703542"),
+            ("unit", "%"),
+            ("type", "gauge"),
+            ("value", value),
+            ("resource_id", ""),
+            ("host", "test_node"),
+            ("resource_metadata", {}),
+        ]) for value in (97.9, 13)]
+        fake_metrics.append({"name": "compute.node.cpu.percent"})  # Invalid
+
+        self.client.send_batch(fake_metrics)
+
+        # Written within a single request
+        self.assertEqual(m_post.call_count, 1)
+        _, kwargs = m_post.call_args
+        lines = zlib.decompress(kwargs["data"], 31).splitlines()
+        self.assertEqual([line.split(b" ")[1] for line in lines],
+                         [b"value=97.9", b"value=13i"])
+
+    @patch.object(requests.Session, "post")
+    def test_influxdb_send_batch_precision(self, m_post):
+        m_post.return_value = MagicMock(status_code=204)
+        self.client = InfluxClient(
+            default_host="192.168.1.40",
+            default_port=8087,
+            default_database="my_db",
+            default_username="user",
+            default_password="password",
+            create_database=False,
+            time_precision="s",
+            use_gzip=False,
+        )
+        fake_metric = OrderedDict([
+            ("name", "compute.node.cpu.percent"),
+            ("timestamp", 1438701345703542000),
+            ("unit", "%"),
+            ("type", "gauge"),
+            ("value", 97.9),
+            ("resource_id", "my node"),
+            ("host", "test_node"),
+            ("resource_metadata", {}),
+        ])
+
+        self.client.send_batch([fake_metric])
+
+        _, kwargs = m_post.call_args
+        self.assertEqual(kwargs["params"]["precision"], "s")
+        self.assertNotIn("Content-Encoding", kwargs["headers"])
+        self.assertTrue(kwargs["data"].endswith(
+            b",resource_id=my\\ node value=97.9 1438701345\n"))
+
+    @patch.object(requests.Session, "post")
+    def test_influxdb_send_batch_legacy_schema(self, m_post):
+        m_post.return_value = MagicMock(status_code=204)
+        self.client = InfluxClient(
+            default_host="192.168.1.40",
+            default_port=8087,
+            default_database="my_db",
+            default_username="user",
+            default_password="password",
+            create_database=False,
+            use_gzip=False,
+            legacy_schema=True,
+        )
+        fake_metrics = [OrderedDict([
+            ("name", "compute.node.cpu.percent"),
+            ("timestamp", 1438701345703542000),
+            ("unit", "%"),
+            ("type", "gauge"),
+            ("value", value),
+            ("resource_id", ""),
+            ("host", "test_node"),
+            ("resource_metadata", {}),
+        ]) for value in (97.9, 13.37)]
+
+        self.client.send_batch(fake_metrics)
+
+        _, kwargs = m_post.call_args
+        lines = kwargs["data"].splitlines()
+        self.assertEqual([line.split(b" ")[0].rsplit(b",", 1)[1]
+                          for line in lines],
+                         [b"counter_volume=97.9", b"counter_volume=13.37"])
+
+    @patch.object(requests.Session, "post")
+    def test_influxdb_send_batch_custom_schema(self, m_post):
+        m_post.return_value = MagicMock(status_code=204)
+        self.client = InfluxClient(
+            default_host="192.168.1.40",
+            default_port=8087,
+            default_database="my_db",
+            default_username="user",
+            default_password="password",
+            create_database=False,
+            use_gzip=False,
+            tags={"host": "host", "title": "resource_metadata.title"},
+            fields={"value": "value", "resource": "resource_id"},
+        )
+        fake_metric = OrderedDict([
+            ("name", "compute.node.cpu.percent"),
+            ("timestamp", 1438701345703542000),
+            ("unit", "%"),
+            ("type", "gauge"),
+            ("value", 97.9),
+            ("resource_id", "node_1"),
+            ("host", "test_node"),
+            ("resource_metadata", {"title": "CPU"}),
+        ])
+
+        self.client.send_batch([fake_metric])
+
+        _, kwargs = m_post.call_args
+        self.assertEqual(
+            kwargs["data"],
+            b"compute.node.cpu.percent,host=test_node,title=CPU "
+            b'resource="node_1",value=97.9 1438701345703542000\n')
+
+    def test_influxdb_invalid_schema(self):
+        for kwargs in ({"fields": {}},
+                       {"tags": {"value": "value"}},
+                       {"tags": {"counter_volume": "value"},
+                        "legacy_schema": True}):
+            self.assertRaises(ValueError, InfluxClient,
+                              default_host="192.168.1.40",
+                              default_port=8087,
+                              default_database="my_db",
+                              default_username="user",
+                              default_password="password",
+                              create_database=False, **kwargs)
+
+    @patch.object(requests.Session, "post")
+    def test_influxdb_send_batch_retried(self, m_post):
+        m_post.side_effect = [MagicMock(status_code=500, text="error"),
+                              MagicMock(status_code=204)]
+        fake_metric = OrderedDict([
+            ("name", "compute.node.cpu.percent"),
+            ("timestamp", 1438701345703542000),
+            ("unit", "%"),
+            ("type", "gauge"),
+            ("value", 97.9),
+            ("resource_id", ""),
+            ("host", "test_node"),
+            ("resource_metadata", {}),
+        ])
+
+        self.client.send_batch([fake_metric])
+
+        self.assertEqual(m_post.call_count, 2)
+        self.assertEqual(m_post.call_args_list[0], m_post.call_args_list[1])
+
+    @patch.object(requests.Session, "post")
+    def test_influxdb_send_batch_udp(self, m_post):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        listener.bind(("127.0.0.1", 0))
+        listener.settimeout(5)
+        self.addCleanup(listener.close)
+
+        self.client = InfluxClient(
+            default_host="127.0.0.1",
+            default_port=8087,
+            default_database="my_db",
+            default_username="user",
+            default_password="password",
+            create_database=False,
+            transport="udp",
+            udp_port=listener.getsockname()[1],
+            udp_payload_size=100,
+        )
+        fake_metrics = [OrderedDict([
+            ("name", "compute.node.cpu.percent"),
+            ("timestamp", 1438701345703542000),
+            ("unit", "%"),
+            ("type", "gauge"),
+            ("value", value),
+            ("resource_id", ""),
+            ("host", "test_node"),
+            ("resource_metadata", {}),
+        ]) for value in (97.9, 13.37)]
+
+        self.client.connect()
+        self.client.send_batch(fake_metrics)
+        udp_sender = self.client.udp_sender
+        self.client.disconnect()
+
+        self.assertFalse(m_post.called)
+        lines = [listener.recv(65535) for _ in range(2)]
+        self.assertEqual([line.split(b" ")[1] for line in lines],
+                         [b"value=97.9", b"value=13.37"])
+        self.assertEqual(udp_sender.stats.datagrams_sent, 2)
+        self.assertEqual(udp_sender.stats.bytes_sent,
+                         sum(len(line) for line in lines))
+
+    def test_influxdb_send_batch_udp_not_connected(self):
+        self.client = InfluxClient(
+            default_host="127.0.0.1",
+            default_port=8087,
+            default_database="my_db",
+            default_username="user",
+            default_password="password",
+            create_database=False,
+            transport="udp",
+        )
+        fake_metric = OrderedDict([
+            ("name", "compute.node.cpu.percent"),
+            ("timestamp", 1438701345703542000),
+            ("unit", "%"),
+            ("type", "gauge"),
+            ("value", 97.9),
+            ("resource_id", ""),
+            ("host", "test_node"),
+            ("resource_metadata", {}),
+        ])
+
+        self.assertRaises(MetricsStoreError,
+                          self.client.send_batch, [fake_metric])
+
+    def test_influxdb_create_point_timestamp(self):
+        fake_metric = OrderedDict([
+            ("name", "compute.node.cpu.percent"),
+            ("timestamp", 1438701345703542000),
+            ("unit", "%"),
+            ("type", "gauge"),
+            ("value", 97.9),
+            ("resource_id", ""),
+            ("host", "test_node"),
+            ("resource_metadata", OrderedDict()),
+        ])
+
+        point = self.client.create_point(fake_metric)
+        self.assertEqual(point["time"], 1438701345703542000)
+        self.assertEqual(point["fields"], {"value": 97.9})
+        self.assertNotIn("counter_volume", point["tags"])
+
+        # Legacy timestamp
+        fake_metric["timestamp"] = "2015-08-04T15:15:45.703542"
+        point = self.client.create_point(fake_metric)
+        self.assertEqual(point["time"], 1438701345703542000)
+
+    @patch.object(requests.Session, "post")
+    def test_influxdb_send_invalid_metric(self, m_post):
+        m_post.return_value = MagicMock(status_code=204)
 
         fake_metric = OrderedDict([
             ("name", "compute.node.cpu.percent"),
@@ -119,3 +373,4 @@ class TestInfluxDBClient(BaseTestCase):
 
         # This raises an error if the send did not succeed
         self.assertRaises(MetricsStoreError, self.client.send, fake_metric)
+        self.assertFalse(m_post.called)
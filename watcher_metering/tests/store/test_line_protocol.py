@@ -0,0 +1,91 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from oslotest.base import BaseTestCase
+from watcher_metering.store.utils.line_protocol import escape
+from watcher_metering.store.utils.line_protocol import escape_measurement
+from watcher_metering.store.utils.line_protocol import format_field_value
+from watcher_metering.store.utils.line_protocol import LineProtocolBuffer
+
+
+class TestLineProtocol(BaseTestCase):
+
+    def test_escape(self):
+        self.assertEqual(escape("a b,c=d\\e"), "a\\ b\\,c\\=d\\\\e")
+        self.assertEqual(escape(42), "42")
+
+    def test_escape_measurement(self):
+        # Only the commas and spaces are unescaped in measurement names
+        self.assertEqual(escape_measurement("a b,c=d\\e"), "a\\ b\\,c=d\\e")
+
+    def test_format_field_value(self):
+        self.assertEqual(format_field_value(True), "true")
+        self.assertEqual(format_field_value(42), "42i")
+        self.assertEqual(format_field_value(97.9), "97.9")
+        self.assertEqual(format_field_value('say "hi"'), '"say \\"hi\\""')
+        # Newlines are only allowed as is within string fields
+        self.assertEqual(format_field_value("a\\b\nc"), '"a\\\\b\nc"')
+        self.assertRaises(TypeError, format_field_value, None)
+
+    def test_series_key_cached(self):
+        lines = LineProtocolBuffer()
+        tags = (("host", "node 1"), ("counter_unit", "%"),
+                ("resource_id", ""))
+
+        series_key = lines.get_series_key("cpu=1", tags)
+
+        self.assertEqual(series_key,
+                         b"cpu=1,counter_unit=%,host=node\\ 1")
+        self.assertIs(lines.get_series_key("cpu=1", tags), series_key)
+
+    def test_append(self):
+        lines = LineProtocolBuffer(precision="ms")
+        series_key = lines.get_series_key("cpu", (("host", "node"),))
+
+        lines.append(series_key, (("value", 1.5),), 1438701345703542000)
+        lines.append(series_key, (("value", 2),), 1438701345803542000,
+                     extra_tags=(("counter_volume", 2),))
+
+        self.assertEqual(lines.count, 2)
+        self.assertEqual(
+            lines.getvalue(),
+            b"cpu,host=node value=1.5 1438701345703\n"
+            b"cpu,host=node,counter_volume=2 value=2i 1438701345803\n")
+
+    def test_get_lines(self):
+        lines = LineProtocolBuffer()
+        series_key = lines.get_series_key("cpu", ())
+        lines.append(series_key, (("state", "a\nb"),), 1)
+        lines.append(series_key, (("value", 1.5),), 2)
+
+        self.assertEqual(lines.get_lines(), [b'cpu state="a\nb" 1\n',
+                                             b"cpu value=1.5 2\n"])
+
+    def test_clear(self):
+        lines = LineProtocolBuffer()
+        series_key = lines.get_series_key("cpu", ())
+        lines.append(series_key, (("value", 1.5),), 1)
+
+        lines.clear()
+
+        self.assertEqual(lines.count, 0)
+        self.assertEqual(lines.getvalue(), b"")
+        self.assertEqual(len(lines), 0)
+        self.assertEqual(lines.get_lines(), [])
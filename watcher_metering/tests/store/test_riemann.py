@@ -119,6 +119,28 @@ class TestRiemannClient(BaseTestCase):
         # This raises an error if the send did not succeed
         self.assertRaises(MetricsStoreError, self.client.send, fake_metric)
 
+    @patch.object(Client, "send_events", autopec=True)
+    def test_riemann_send_batch(self, m_send_events):
+        fake_metrics = [OrderedDict([
+            ("name", "compute.node.cpu.percent"),
+            ("timestamp", "2015-08-04T15:15:45.703542"),
+            ("unit", "%"),
+            ("type", "gauge"),
+            ("value", value),
+            ("resource_id", ""),
+            ("host", "test_node"),
+            ("resource_metadata", OrderedDict([
+                ("host", "test_node"),
+                ("title", "compute.node.cpu.percent")]))
+        ]) for value in (.5, "13.37", 42.)]  # The 2nd one is invalid
+
+        self.client.send_batch(fake_metrics)
+
+        # Sent within a single message
+        self.assertEqual(m_send_events.call_count, 1)
+        (events,), _ = m_send_events.call_args
+        self.assertEqual([event.metric_f for event in events], [.5, 42.])
+
     def test_riemann_create_invalid_metric(self):
         fake_metric = OrderedDict([
             ("name", "compute.node.cpu.percent"),
@@ -0,0 +1,51 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from oslotest.base import BaseTestCase
+from watcher_metering.store.utils.timestamp import to_epoch_ns
+from watcher_metering.store.utils.timestamp import to_epoch_seconds
+from watcher_metering.store.utils.timestamp import to_isoformat
+
+
+class TestTimestamp(BaseTestCase):
+
+    def test_to_epoch_ns(self):
+        self.assertEqual(to_epoch_ns(1438701345703542000),
+                         1438701345703542000)
+
+    def test_to_epoch_ns_legacy_isoformat(self):
+        self.assertEqual(to_epoch_ns("2015-08-04T15:15:45.703542"),
+                         1438701345703542000)
+        self.assertEqual(to_epoch_ns("2015-08-04T17:15:45.703542+02:00"),
+                         1438701345703542000)
+
+    def test_to_epoch_ns_invalid(self):
+        self.assertRaises(ValueError, to_epoch_ns, "not a timestamp")
+        self.assertRaises(ValueError, to_epoch_ns, None)
+
+    def test_to_epoch_seconds(self):
+        self.assertEqual(to_epoch_seconds(1438701345703542000), 1438701345)
+        self.assertEqual(to_epoch_seconds("2015-08-04T15:15:45.703542"),
+                         1438701345)
+
+    def test_to_isoformat(self):
+        self.assertEqual(to_isoformat(1438701345703542000),
+                         "2015-08-04T15:15:45.703542+00:00")
+        self.assertEqual(to_isoformat("2015-08-04T15:15:45.703542"),
+                         "2015-08-04T15:15:45.703542")
@@ -0,0 +1,91 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2015 b<>com
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import socket
+
+from oslotest.base import BaseTestCase
+from watcher_metering.store.utils.udp import UdpLineSender
+
+
+class TestUdpLineSender(BaseTestCase):
+
+    def setUp(self):
+        super(TestUdpLineSender, self).setUp()
+        # Stands in for the UDP listener of InfluxDB
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.settimeout(5)
+        self.addCleanup(self.listener.close)
+        self.port = self.listener.getsockname()[1]
+
+    def _receive(self):
+        return self.listener.recv(65535)
+
+    def test_write_packs_datagrams(self):
+        sender = UdpLineSender("127.0.0.1", self.port, payload_size=30)
+        self.addCleanup(sender.stop)
+
+        sender.write([b"cpu value=1 1\n", b"cpu value=2 2\n",
+                      b"cpu value=3 3\n"])
+
+        # Sent as soon as the next line does not fit any more
+        self.assertEqual(self._receive(), b"cpu value=1 1\ncpu value=2 2\n")
+        self.assertEqual(sender.stats.datagrams_sent, 1)
+
+        sender.flush()
+        self.assertEqual(self._receive(), b"cpu value=3 3\n")
+        self.assertEqual(sender.stats.as_dict(), {
+            "lines_sent": 3,
+            "datagrams_sent": 2,
+            "bytes_sent": 42,
+            "send_errors": 0,
+        })
+
+    def test_write_oversized_line(self):
+        sender = UdpLineSender("127.0.0.1", self.port, payload_size=10)
+        self.addCleanup(sender.stop)
+
+        sender.write([b"cpu value=1 1\n", b"cpu value=2 2\n"])
+        sender.flush()
+
+        self.assertEqual(self._receive(), b"cpu value=1 1\n")
+        self.assertEqual(self._receive(), b"cpu value=2 2\n")
+        self.assertEqual(sender.stats.datagrams_sent, 2)
+
+    def test_flush_interval(self):
+        sender = UdpLineSender("127.0.0.1", self.port, flush_interval=.01)
+        sender.start()
+
+        sender.write([b"cpu value=1 1\n"])
+
+        self.assertEqual(self._receive(), b"cpu value=1 1\n")
+        sender.stop()
+        sender.join(1)
+        self.assertFalse(sender.is_alive())
+
+    def test_stop_flushes(self):
+        sender = UdpLineSender("127.0.0.1", self.port)
+
+        sender.write([b"cpu value=1 1\n"])
+        self.assertEqual(sender.stats.datagrams_sent, 0)
+        sender.stop()
+
+        self.assertEqual(self._receive(), b"cpu value=1 1\n")
+        self.assertEqual(sender.stats.datagrams_sent, 1)